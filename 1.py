@@ -1,36 +1,4 @@
-from dataclasses import dataclass
-
-@dataclass
-class TimeConfig:
-    hours: int = 0
-    minutes: int = 0
-    seconds: int = 0
-
-    def total_seconds(self) -> int:
-        """Calculate total time in seconds."""
-        return self.hours * 3600 + self.minutes * 60 + self.seconds
-
-    def to_x_message_ttl(self) -> int:
-        """Convert to x-message-ttl format (in milliseconds)."""
-        return self.total_seconds() * 1000
-
-    def to_expiration(self) -> str:
-        """Convert to expiration format (as a string in milliseconds)."""
-        return str(self.to_x_message_ttl())
-
-    @classmethod
-    def from_string(cls, time_str: str):
-        """Create a TimeConfig from a string in the format 'HH:MM:SS'."""
-        parts = time_str.split(':')
-        if len(parts) != 3:
-            raise ValueError("Time string must be in 'HH:MM:SS' format.")
-        
-        hours, minutes, seconds = map(int, parts)
-        return cls(hours, minutes, seconds)
-
-    def __str__(self) -> str:
-        """Return a string representation of the time in 'HH:MM:SS' format."""
-        return f"{self.hours:02}:{self.minutes:02}:{self.seconds:02}"
+from mongo_cache.time_config import TimeConfig
 
 # Usage examples
 time_config = TimeConfig(hours=1, minutes=30, seconds=45)
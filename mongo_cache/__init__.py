@@ -0,0 +1,17 @@
+"""
+MongoDB 缓存后端，Django 配置：
+
+    CACHES = {
+        "default": {
+            "BACKEND": "mongo_cache.MongoDBCacheBackend",
+            "LOCATION": "mongodb://localhost:27017/",
+            "options": {...},
+        }
+    }
+"""
+from .backend import MongoDBCacheBackend
+from .factory import MongoDBConnectionFactory
+from .lock import LockTimeout, MongoLock
+from .refresh import RefreshScheduler
+from .request_memo import request_memo, request_memo_middleware
+from .tracing import replay_trace
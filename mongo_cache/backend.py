@@ -0,0 +1,1452 @@
+import hashlib
+import queue
+import random
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, wait
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import pymongo
+from bson import Binary, ObjectId
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from gridfs import GridFSBucket
+from gridfs.errors import CorruptGridFile, NoFile
+from pymongo import ASCENDING, DESCENDING, DeleteMany, MongoClient, ReadPreference, ReturnDocument, UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError, DuplicateKeyError, PyMongoError
+
+from .capacity import CapacityManager
+from .dedup import BlobStore
+from .durability import DurabilityPolicy
+from .factory import MongoDBConnectionFactory
+from .file_cache import LocalFileCache
+from .generation import GenerationRebuild
+from .gridfs_store import GridFSStore
+from .hot_keys import HotKeyDetector
+from .local_cache import ChangeStreamInvalidator, LocalMemoryCache
+from .lock import MongoLock
+from .namespaces import NamespaceVersions
+from .negative_filter import NegativeLookupFilter
+from .pipeline import CachePipeline
+from .profiling import CommandProfiler
+from .refresh import RefreshScheduler
+from .request_memo import _memo_scope
+from .resilience import CircuitBreaker, LatencyTracker
+from .serializers import SERIALIZERS
+from .time_config import TimeConfig
+from .tracing import TraceRecorder
+from .ttl_policy import TTLPolicy
+from .warm_start import WarmStartSnapshot
+
+
+class MongoDBCacheBackend(BaseCache):
+    _breakers: Dict[str, "CircuitBreaker"] = {}
+    _latencies: Dict[str, "LatencyTracker"] = {}
+    _hedge_executor = None  # 进程级线程池，对冲读时才创建
+    _chunk_executor = None  # 进程级线程池，多块大值并行拉取时才创建
+    _local_caches: Dict[str, "LocalMemoryCache"] = {}
+    _refresh_schedulers: Dict[str, "RefreshScheduler"] = {}
+    _active_generations: Dict[str, tuple] = {}  # health_key -> (代编号, 读取时刻)
+
+    def __init__(self, server: str, params: Dict[str, Any]):
+        super().__init__(params)
+        self._server = server  # 外部的 LOCATION 'mongodb://localhost:27017/'
+        self._params = params
+        self._client = None  # TODO： django-redis 提供了多个 [None] * len(self._server) 防止redis报错，支持多路由配置
+        self._collection = None
+        self._lock_collection = None
+        self._namespace_collection = None
+
+        options = params.get('options', {})
+        self._database_name = options.get('DATABASE_NAME', "django_cache_db")
+        self._collection_name = options.get('COLLECTION_NAME', "django_cache_collection")
+
+        self.connection_factory = MongoDBConnectionFactory(params)
+        self._read_timeout = self.connection_factory.read_timeout  # 读取预算，只作用于读路径
+
+        # 值序列化："fast"（默认）或 "json"，类型码记录在头文档的 encoding 字段中
+        self._serializer = SERIALIZERS[options.get('SERIALIZER', 'fast')]()
+
+        # 块大小：默认 1MB，按 benchmark_chunk_sizes 的结果选定（1MB、16MB 的值读写都明显快于 GridFS 的 255KB），
+        # 可按实际部署重新测定；
+        # 块文档还要容纳 _id 等字段，单块不能超过 MAX_CHUNK_SIZE，否则达到上限的块无法写入
+        self._chunk_size = options.get('CHUNK_SIZE', self.CHUNK_SIZE)
+        if not 0 < self._chunk_size <= self.MAX_CHUNK_SIZE:
+            raise RuntimeError(f"CHUNK_SIZE must be between 1 and {self.MAX_CHUNK_SIZE} bytes.")
+
+        # 按过期时间分桶存储：每 BUCKET_HOURS 小时一个集合，整桶过期后直接 drop，不再依赖 TTL 逐条删除
+        self._bucket_seconds = int(options['BUCKET_HOURS'] * 3600) if options.get('BUCKET_HOURS') else None
+        self._bucket_route_refresh = options.get('BUCKET_ROUTE_REFRESH', 30)  # 秒，存活桶列表的进程内缓存时间
+        self._buckets: List[int] = []  # 存活桶编号，新桶在前
+        self._buckets_loaded_at = None
+
+        # 代际模式：全量重建写入新一代集合，完成后原子切换指针文档，读者在进程内缓存当前代编号
+        self._generations = options.get('GENERATIONS', False)
+        self._generation_refresh = options.get('GENERATION_REFRESH', 5)  # 秒，当前代编号的进程内缓存时间
+        self._generation_drop_delay = options.get('GENERATION_DROP_DELAY', 60)  # 秒，切换后延迟删除旧代
+        self._generation_build_timeout = options.get('GENERATION_BUILD_TIMEOUT', 3600)  # 秒，重建超过此时长无写入视为已崩溃
+        if self._generations and self._bucket_seconds is not None:
+            raise RuntimeError("GENERATIONS and BUCKET_HOURS cannot be enabled together.")
+
+        # 写入持久性分级：命名的 write concern / read concern 组合，按调用参数或键模式规则选择，
+        # 如 DURABILITY_RULES={"lock:*": "lock", "branch:*": "fast"}，未匹配时使用客户端默认
+        self._durability = DurabilityPolicy(
+            profiles=options.get('DURABILITY_PROFILES'),
+            rules=options.get('DURABILITY_RULES'),
+            default=options.get('DURABILITY_DEFAULT'),
+            logical_key=NamespaceVersions.logical if options.get('NAMESPACES') else None,
+        )
+
+        # 按键模式配置的 TTL，调用方未显式传 timeout 时生效，如 {"lock:*": "00:05:00", "branch:*": "48:00:00"}
+        self._ttl_policy = TTLPolicy(options['TTL_POLICIES']) if options.get('TTL_POLICIES') else None
+
+        # 本机磁盘二级缓存（L2），未配置目录时不启用
+        self._l2 = None
+        l2_dir = options.get('L2_CACHE_DIR')
+        if l2_dir:
+            self._l2 = LocalFileCache(l2_dir, max_bytes=options.get('L2_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+        self._l2_min_bytes = options.get('L2_CACHE_MIN_BYTES', 1024 * 1024)  # 仅缓存大值，小值直接走 MongoDB
+
+        # 对冲读：主读超过 p95 延迟仍未返回时，向其他副本集成员再发一次相同的读
+        self._hedged_reads = options.get('HEDGED_READS', False)
+        self._hedge_delay = options.get('HEDGE_DELAY')  # 秒，未配置时使用实时统计的 p95
+        self._hedge_min_delay = options.get('HEDGE_MIN_DELAY', 0.005)
+
+        # 多块大值按块序号切分后并发拉取，并发度不超过连接池大小
+        self._chunk_fetch_parallelism = max(1, min(options.get('CHUNK_FETCH_PARALLELISM', 4),
+                                                   self.connection_factory.max_pool_size))
+        self._chunk_fetch_retries = options.get('CHUNK_FETCH_RETRIES', 2)  # 单块遇到网络瞬断时的重试次数
+
+        # 熔断器与延迟统计在进程内按 LOCATION + 集合共享
+        health_key = f"{server}/{self._database_name}.{self._collection_name}"
+        if health_key not in self._breakers:
+            self._breakers[health_key] = CircuitBreaker(
+                failure_threshold=options.get('CIRCUIT_BREAKER_THRESHOLD', 5),
+                reset_timeout=options.get('CIRCUIT_BREAKER_RESET', 10),
+            )
+            self._latencies[health_key] = LatencyTracker()
+        self._breaker = self._breakers[health_key]
+        self._latency = self._latencies[health_key]
+
+        # 进程内一级缓存（L1），由 change stream 监听其他进程的写入并及时淘汰；
+        # change stream 不可用（如单机 mongod）时退化为较短的 TTL
+        self._health_key = health_key
+        self._l1 = None
+        if options.get('LOCAL_CACHE_MAX_ENTRIES', 0):
+            if health_key not in self._local_caches:
+                self._local_caches[health_key] = LocalMemoryCache(
+                    max_entries=options['LOCAL_CACHE_MAX_ENTRIES'],
+                    ttl=options.get('LOCAL_CACHE_TTL', 300),
+                    fallback_ttl=options.get('LOCAL_CACHE_FALLBACK_TTL', 5),
+                )
+            self._l1 = self._local_caches[health_key]
+
+        # 不存在过滤器（Bloom filter）：确定不存在的键直接按未命中返回，不访问 MongoDB
+        self._negative_filter = None
+        if options.get('NEGATIVE_FILTER', False):
+            self._negative_filter = NegativeLookupFilter.for_backend(
+                health_key,
+                fp_rate=options.get('NEGATIVE_FILTER_FP_RATE', 0.01),
+                rebuild_interval=options.get('NEGATIVE_FILTER_REBUILD', 600),
+                min_capacity=options.get('NEGATIVE_FILTER_MIN_CAPACITY', 100000),
+            )
+
+        # 内容寻址去重：不小于 DEDUP_MIN_BYTES 的值按内容哈希只在 blob 集合中存一份，缓存条目只记哈希
+        self._blob_store = None
+        if options.get('DEDUP_MIN_BYTES'):
+            self._blob_store = BlobStore.for_backend(
+                health_key,
+                min_bytes=options['DEDUP_MIN_BYTES'],
+                cache_bytes=options.get('DEDUP_CACHE_BYTES', 64 * 1024 * 1024),
+                gc_interval=options.get('DEDUP_GC_INTERVAL', 300),
+                grace=options.get('DEDUP_GC_GRACE', 3600),
+            )
+
+        # GridFS 存储模式：不小于 GRIDFS_MIN_BYTES 的值写入 GridFS bucket，头文档仍在主集合，只记文件 _id
+        self._gridfs = None
+        if options.get('GRIDFS_MIN_BYTES'):
+            self._gridfs = GridFSStore.for_backend(
+                health_key,
+                bucket_name=self.gridfs_bucket_name,
+                min_bytes=options['GRIDFS_MIN_BYTES'],
+                chunk_size=self._chunk_size,
+                gc_interval=options.get('GRIDFS_GC_INTERVAL', 300),
+                grace=options.get('GRIDFS_GC_GRACE', 600),
+            )
+
+        # 热点键：Space-Saving 统计近期 get，热点键在进程内钉住（pin），或复制成多个带后缀的副本分散读取（replicate）
+        self._hot_keys = None
+        if options.get('HOT_KEYS', False):
+            self._hot_keys = HotKeyDetector.for_backend(
+                health_key,
+                mode=options.get('HOT_KEY_MODE', 'pin'),
+                sample_rate=options.get('HOT_KEY_SAMPLE_RATE', 0.1),
+                window=options.get('HOT_KEY_WINDOW', 10),
+                threshold=options.get('HOT_KEY_THRESHOLD', 0.01),
+                replicas=options.get('HOT_KEY_REPLICAS', 4),
+                replica_ttl=options.get('HOT_KEY_REPLICA_TTL', 30),
+                pin_ttl=options.get('HOT_KEY_PIN_TTL', 5),
+            )
+
+        # 命名空间版本：NAMESPACES 为命名空间前缀列表，如 ["repo:"] 时 "repo:42:branch:main" 属于命名空间 "repo:42"
+        self._namespaces = None
+        if options.get('NAMESPACES'):
+            self._namespaces = NamespaceVersions.for_backend(
+                health_key,
+                prefixes=options['NAMESPACES'],
+                separator=options.get('NAMESPACE_SEPARATOR', ':'),
+                cache_ttl=options.get('NAMESPACE_CACHE_TTL', 5),
+            )
+
+        # 访问轨迹抽样记录，配合 replay_trace 回放；未配置 TRACE_FILE 时不记录
+        self._tracer = None
+        if options.get('TRACE_FILE'):
+            self._tracer = TraceRecorder.for_path(
+                options['TRACE_FILE'],
+                sample_rate=options.get('TRACE_SAMPLE_RATE', 0.01),
+                flush_interval=options.get('TRACE_FLUSH_INTERVAL', 5),
+            )
+
+        # 容量上限：EVICTION_POLICY 为 "lru" 或 "lfu" 时才启用，条目数沿用 Django 的 MAX_ENTRIES / CULL_FREQUENCY；
+        # 只有 OPTIONS 中显式配置 MAX_ENTRIES 才限制条目数，不套用 Django 默认的 300
+        self._eviction_policy = options.get('EVICTION_POLICY')
+        self._capacity = None
+        if self._eviction_policy:
+            if not options.get('MAX_ENTRIES') and not options.get('MAX_BYTES'):
+                raise RuntimeError("EVICTION_POLICY requires MAX_ENTRIES or MAX_BYTES in OPTIONS.")
+            self._capacity = CapacityManager.for_backend(
+                health_key,
+                policy=self._eviction_policy,
+                max_entries=options.get('MAX_ENTRIES'),
+                max_bytes=options.get('MAX_BYTES'),
+                cull_frequency=options.get('CULL_FREQUENCY', self._cull_frequency),
+                sample_rate=options.get('ACCESS_SAMPLE_RATE', 0.05),
+                access_interval=options.get('ACCESS_UPDATE_INTERVAL', 60),
+                eviction_interval=options.get('EVICTION_INTERVAL', 10),
+            )
+
+        # 预热快照：定期把 L1 中最近使用的条目写入本地文件，重启后由后台线程按快照批量预取，启动时不阻塞请求
+        self._warm_start = None
+        if options.get('WARM_START_FILE'):
+            if self._l1 is None:
+                raise RuntimeError("WARM_START_FILE requires LOCAL_CACHE_MAX_ENTRIES.")
+            self._warm_start = WarmStartSnapshot.for_backend(
+                health_key,
+                path=options['WARM_START_FILE'],
+                local_cache=self._l1,
+                hot_keys=self._hot_keys,
+                interval=options.get('WARM_START_INTERVAL', 60),
+                max_keys=options.get('WARM_START_MAX_KEYS', 1000),
+                values=options.get('WARM_START_VALUES', False),
+            )
+            self._warm_start.attach(self)  # 放在最后：后台线程会立即使用本实例
+
+    CHUNK_SIZE = 1024 * 1024
+    MAX_CHUNK_SIZE = 16 * 1024 * 1024 - 64 * 1024  # BSON 文档上限 16MB，留出块文档其他字段的空间
+
+    @staticmethod
+    def _split_value(value, chunk_size=CHUNK_SIZE):
+        """将值拆分为多个块"""
+        if isinstance(value, bytes) and len(value) > chunk_size:
+            return [value[i:i + chunk_size] for i in range(0, len(value), chunk_size)]
+        return [value]  # 返回一个单块的列表
+
+    @staticmethod
+    def _generate_shard_key(key):
+        """生成哈希分片键"""
+        return hashlib.sha256(key.encode()).hexdigest()[:10]  # 使用哈希前10个字符作为分片键
+
+    @property
+    def client(self) -> MongoClient:
+        # TODO: django-redis 对应的 get_client 方法，是否需要改为 get_client方法，每次都需要调用才对？
+        #       目的是为了在项目启动后，多个请求的 cache 共用连接池，将连接池的给到 每个请求
+        # TODO: 如果使用 django-redis的_client多配置，此处不能设置 property
+        if self._client is None:
+            # self._client = MongoClient(self._server)
+            self._client = self.connect()
+        return self._client
+
+    @property
+    def collection(self):
+        # 代际模式下集合随当前代切换
+        name = self._collection_name
+        if self._generations:
+            name = self._generation_name(self._active_generation())
+
+        if self._collection is None or self._collection.name != name:
+            if self._collection is not None:  # 已切换到新一代，旧代的监听与本地缓存作废
+                ChangeStreamInvalidator.stop_listening(f"{self._health_key}:{self._collection.name}")
+                if self._l1 is not None:
+                    self._l1.clear()
+            # TODO：考虑下是在连接池就导入，还是此处，此处好。
+            self._collection = self.client[self._database_name][name]
+            self._initialize_sharding(name)  # 分片检查创建
+            self._create_indexes(self._collection)
+            if self._l1 is not None or self._negative_filter is not None:
+                # 分桶模式下其他进程的写入落在桶集合中，主集合和各桶集合一起监听
+                collections = f"^{re.escape(name)}(_b\\d+)?$" if self._bucket_seconds is not None else None
+                ChangeStreamInvalidator.ensure_started(f"{self._health_key}:{name}", self._collection,
+                                                       self._l1, self._negative_filter, collections)
+            if self._negative_filter is not None:
+                self._negative_filter.attach(self, name)  # 新一代集合需要重新扫描建立
+            if self._capacity is not None:
+                self._capacity.attach(self)
+            if self._blob_store is not None:
+                self._blob_store.attach(self, self.blob_collection)
+            if self._gridfs is not None:
+                self._gridfs.attach(self)
+            if self._hot_keys is not None:
+                self._hot_keys.attach(self)
+        return self._collection
+
+    @property
+    def gridfs_bucket_name(self) -> str:
+        """GridFS 模式的 bucket 名，各代、各桶共用"""
+        return f"{self._collection_name}_fs"
+
+    @property
+    def blob_collection(self):
+        """去重模式下的 blob 集合，各代共用：_id 为内容哈希的头文档加 {哈希}_chunk_{i} 块文档"""
+        return self.client[self._database_name][f"{self._collection_name}_blobs"]
+
+    def _create_indexes(self, collection):
+        try:
+            collection.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+            collection.create_index([("shard_key", ASCENDING)])  # TODO： 和下面的保持一致，添加分片键索引
+            if self._capacity is not None:
+                # 只有头文档带 last_access，稀疏索引可直接用于统计条目数
+                collection.create_index([("last_access", ASCENDING)], sparse=True)
+            if self._blob_store is not None:
+                collection.create_index([("blob", ASCENDING)], sparse=True)  # blob 回收时统计引用
+            if self._gridfs is not None:
+                collection.create_index([("gridfs", ASCENDING)], sparse=True)  # GridFS 文件回收时查找引用
+        except DuplicateKeyError:
+            pass
+
+    @property
+    def generation_registry(self):
+        """
+        {_id: "active", generation: N} 为当前代指针，{_id: "counter", value: N} 用于分配新代编号；
+        {_id: "building:N", heartbeat} 为进行中的重建，{_id: "drop:N", collection, drop_after} 为待删除的旧代
+        """
+        return self.client[self._database_name][f"{self._collection_name}_generations"]
+
+    def _generation_name(self, generation: int) -> str:
+        # 第 0 代沿用原集合名，开启代际模式时无需迁移已有数据
+        return self._collection_name if generation == 0 else f"{self._collection_name}_g{generation}"
+
+    def _active_generation(self, refresh=False) -> int:
+        cached = self._active_generations.get(self._health_key)
+        now = time.monotonic()
+        if cached is not None and not refresh and now - cached[1] < self._generation_refresh:
+            return cached[0]
+        pointer = self.generation_registry.find_one({"_id": "active"})
+        generation = pointer["generation"] if pointer else 0
+        self._active_generations[self._health_key] = (generation, now)
+        self._drop_pending_generations()
+        return generation
+
+    def _drop_pending_generations(self):
+        """删除已过延迟期的旧代，由刷新当前代编号的读者顺带执行；findOneAndDelete 认领，多个进程不会重复删除"""
+        registry = self.generation_registry
+        database = self.client[self._database_name]
+        while True:
+            pending = registry.find_one_and_delete({"_id": {"$regex": "^drop:"}, "drop_after": {"$lte": datetime.utcnow()}})
+            if pending is None:
+                return
+            database.drop_collection(pending["collection"])
+
+    def _drop_stale_generations(self, active: int):
+        """
+        清理既不是当前代、也不在重建或待删除中的 _gN 集合：崩溃的重建留下的新一代，
+        以及认领删除后未来得及 drop 的旧代。由下一次 rebuild() 执行。
+        """
+        registry = self.generation_registry
+        database = self.client[self._database_name]
+        heartbeat_after = datetime.utcnow() - timedelta(seconds=self._generation_build_timeout)
+        kept = {active}
+        for record in registry.find({"_id": {"$regex": "^(building|drop):"}}):
+            if record["_id"].startswith("drop:") or record["heartbeat"] > heartbeat_after:
+                kept.add(int(record["_id"].split(":", 1)[1]))
+        pattern = re.compile(f"^{re.escape(self._collection_name)}_g(\\d+)$")
+        for name in database.list_collection_names():
+            match = pattern.match(name)
+            if match and int(match.group(1)) not in kept:
+                database.drop_collection(name)
+                registry.delete_one({"_id": f"building:{match.group(1)}"})
+
+    def rebuild(self, batch_size: int = 1000) -> "GenerationRebuild":
+        """
+        全量重建：
+
+            with cache.rebuild() as rebuild:
+                rebuild.set_many(chunk_of_data)  # 可多次调用，写入新一代集合，读者不可见
+            # 正常退出时原子切换到新一代，旧代记入待删除，延迟期过后由读者删除；异常退出时丢弃新一代
+        """
+        if not self._generations:
+            raise RuntimeError("rebuild() requires the GENERATIONS option.")
+        current = self._active_generation(refresh=True)
+        self._drop_stale_generations(current)
+        counter = self.generation_registry.find_one_and_update(
+            {"_id": "counter"}, {"$inc": {"value": 1}}, upsert=True, return_document=ReturnDocument.AFTER)
+        return GenerationRebuild(self, current, counter["value"], batch_size)
+
+    @property
+    def lock_collection(self):
+        """
+        分布式锁单独使用一个集合：锁文档不建 TTL 索引，释放后保留，以保证 fencing token 单调递增。
+        固定使用 "lock" 持久性档位（默认 majority 写入与读取、读主节点），w=1 的写入在主节点切换时可能回滚，
+        同一把锁会被两个持有者拿到。
+        """
+        if self._lock_collection is None:
+            collection = self.client[self._database_name][f"{self._collection_name}_locks"]
+            self._lock_collection = self._durability.apply(collection, "lock")
+        return self._lock_collection
+
+    def lock(self, name, lease=None, blocking=True, timeout=None):
+        """
+        获取分布式锁，用法：
+
+            with cache.lock("lock:branch:42", lease=TimeConfig(minutes=5)) as lock:
+                ...  # lock.token 为 fencing token，写下游时携带以拒绝过期持有者的写入
+
+        lease 为租约时长，持有期间由后台心跳线程续约；blocking=False 时获取失败立即抛出 LockTimeout。
+        """
+        return MongoLock(self.lock_collection, name, lease or TimeConfig(minutes=5), blocking, timeout)
+
+    def _initialize_sharding(self, collection_name=None):  # TODO： 待商榷
+        """检查并启用分片功能"""
+
+        # 检查数据库是否已启用分片
+        if not self.client[self._database_name].command("getCmdLineOpts").get("sharding"):
+            raise RuntimeError("Sharding is not enabled on the MongoDB server.")
+
+        # 检查集合是否已设置为分片
+        shard_status = self.client[self._database_name].command("listShards")
+        if not shard_status.get("sharded"):
+            try:
+                # 启用数据库的分片功能
+                self._client.admin.command("enableSharding", self._database_name)
+                # 将集合设置为分片集合，以 `_id` 为分片键
+                self._client.admin.command("shardCollection",
+                                           f"{self._database_name}.{collection_name or self._collection_name}",
+                                           key={"_id": "hashed"})
+            except PyMongoError as e:
+                raise RuntimeError(f"Failed to initialize sharding: {e}")
+
+    def connect(self):
+        return self.connection_factory.connect(self._server)
+
+    def make_key(self, key, version=None):
+        """
+        本后端不使用 Django 的 KEY_PREFIX / version 拼接，键原样存储；
+        键属于 NAMESPACES 中的命名空间且该命名空间被失效过时，追加版本后缀 @ns{版本}。
+        """
+        if self._namespaces is None:
+            return key
+        return self._namespaces.versioned(key, self.namespace_collection)
+
+    @property
+    def namespace_collection(self):
+        """命名空间版本号集合，_id 为命名空间，version 为当前版本"""
+        if self._namespace_collection is None:
+            self._namespace_collection = self.client[self._database_name][f"{self._collection_name}_namespaces"]
+        return self._namespace_collection
+
+    def _logical_key(self, key: str) -> str:
+        """存储键去掉命名空间版本后缀，即调用方使用的键"""
+        return key if self._namespaces is None else NamespaceVersions.logical(key)
+
+    def _read_keys(self, keys: List[str], version=None) -> Optional[Dict[str, str]]:
+        """
+        读路径上的 make_key，返回 {键: 存储键}。命名空间版本号需要查询 MongoDB 时与读取一样经过熔断器和读取预算，
+        熔断或查询失败时返回 None，由调用方按未命中处理。
+        """
+        if self._namespaces is None or not self._namespaces.stale(keys):
+            return {key: self.make_key(key, version) for key in keys}
+        if not self._breaker.allow():
+            return None
+        try:
+            with self._read_budget():
+                self._namespaces.prefetch(keys, self.namespace_collection)  # 一次 $in 取回各命名空间的版本号
+                physical = {key: self.make_key(key, version) for key in keys}
+        except PyMongoError as e:
+            self._breaker.record_failure()
+            print(f"Error reading namespace versions: {e}")
+            return None
+        finally:
+            self._breaker.release()
+        self._breaker.record_success()
+        return physical
+
+    def _active_collection_name(self) -> Optional[str]:
+        """
+        不存在过滤器按集合名区分各代；代际模式下确定当前代可能需要查询 MongoDB，同样经过熔断器和读取预算，
+        熔断或查询失败时返回 None，过滤器不作判断，键交给读路径，由熔断器按未命中处理。
+        """
+        if not self._generations and self._collection is not None:
+            return self._collection.name
+        if not self._breaker.allow():
+            return None
+        try:
+            with self._read_budget():
+                name = self.collection.name
+        except PyMongoError as e:
+            self._breaker.record_failure()
+            print(f"Error resolving the active collection: {e}")
+            return None
+        finally:
+            self._breaker.release()
+        self._breaker.record_success()
+        return name
+
+    def invalidate_namespace(self, namespace: str) -> int:
+        """
+        使命名空间（如 "repo:42"）下的所有键立即失效：一次 $inc 版本号，旧键不再可达，随 expires_at 的 TTL 索引自然清理。
+        其他进程在 NAMESPACE_CACHE_TTL 秒内看到新版本。返回新版本号。
+        """
+        if self._namespaces is None:
+            raise RuntimeError("NAMESPACES is not configured.")
+        return self._namespaces.bump(namespace, self.namespace_collection)
+
+    @property
+    def profiler(self) -> Optional["CommandProfiler"]:
+        """CLIENT_KWARGS 中开启 PROFILE_COMMANDS 后可用，stats() 返回按查询形状汇总的命令耗时"""
+        self.client  # 剖析器随连接池一起创建
+        return self.connection_factory.get_profiler(self._server)
+
+    def _assemble_value(self, key, head, collection=None, zero_copy=False):
+        """
+        根据头文档记录的总长度组装值：预分配一块缓冲区，游标每返回一个块就按块序号直接写入对应偏移，
+        不再构造块列表再 join。zero_copy=True 时返回缓冲区的 memoryview，不再额外拷贝成 bytes。
+        块不完整或混入了其他写入的块（读取期间被并发重写，块 _id 相同但 write_id 与头文档不一致）时返回 None。
+        """
+        if head.get("blob") is not None:
+            return self._read_blob(head, zero_copy)
+
+        collection = self.collection if collection is None else collection
+        if head.get("gridfs") is not None:
+            return self._read_gridfs(head, collection, zero_copy)
+        chunk_ids = [f"{key}_chunk_{i}" for i in range(head["chunks"])]
+
+        if len(chunk_ids) == 1:  # 单块直接返回，无需拼接
+            chunk = collection.find_one({"_id": chunk_ids[0]}, {"value": 1, "write_id": 1})
+            if (chunk is None or len(chunk["value"]) != head["length"]
+                    or chunk.get("write_id") != head.get("write_id")):
+                return None
+            return memoryview(chunk["value"]) if zero_copy else chunk["value"]
+
+        buffer = bytearray(head["length"])
+        view = memoryview(buffer)
+
+        # 按块序号连续切分给多个线程，各自占用连接池中的一个连接
+        parallelism = min(self._chunk_fetch_parallelism, len(chunk_ids))
+        step = -(-len(chunk_ids) // parallelism)
+        groups = [chunk_ids[i:i + step] for i in range(0, len(chunk_ids), step)]
+        if len(groups) == 1:
+            filled = self._fetch_chunks(collection, groups[0], view, head["chunk_size"], head.get("write_id"))
+        else:
+            executor = self._get_chunk_executor()
+            futures = [executor.submit(self._within_budget, self._fetch_chunks, collection, ids, view,
+                                       head["chunk_size"], head.get("write_id"))
+                       for ids in groups]
+            filled = sum(future.result() for future in futures)
+
+        if filled != len(buffer):
+            return None
+        return view if zero_copy else bytes(buffer)
+
+    def _read_blob(self, head, zero_copy=False):
+        """去重条目：先查进程内 blob LRU，未命中再按条目头记录的长度从 blob 集合组装"""
+        digest = head["blob"]
+        data = self._blob_store.get(digest) if self._blob_store is not None else None
+        if data is None:
+            data = self._assemble_value(digest, {"chunks": -(-head["length"] // head["chunk_size"]),
+                                                 "length": head["length"], "chunk_size": head["chunk_size"]},
+                                        self.blob_collection)
+            if self._blob_store is not None:  # 未开启去重的进程也能读其他进程写入的去重条目
+                if data is None:
+                    self._blob_store.discard(digest)  # blob 已损坏（如被回收后又被引用），让下次写入重新上传
+                    return None
+                self._blob_store.put(digest, data)
+            elif data is None:
+                return None
+        return memoryview(data) if zero_copy else data
+
+    def _read_gridfs(self, head, collection, zero_copy=False):
+        """GridFS 条目：按头文档记录的文件 _id 读取，沿用 collection 的读偏好；未开启 GridFS 模式的进程也能读"""
+        bucket = GridFSBucket(collection.database, bucket_name=self.gridfs_bucket_name,
+                              read_preference=collection.read_preference)
+        try:
+            with bucket.open_download_stream(head["gridfs"]) as stream:
+                data = stream.read()
+        except (NoFile, CorruptGridFile):
+            return None  # 文件已被回收或正在被删除
+        if len(data) != head["length"]:
+            return None
+        return memoryview(data) if zero_copy else data
+
+    def _fetch_chunks(self, collection, chunk_ids, view, chunk_size, write_id=None):
+        """
+        拉取一组块并按块序号写入缓冲区，返回写入的字节数（越界写入或块不属于 write_id 这次写入时返回 -1）。
+        网络瞬断时只重试尚未拿到的块，不必从头拉取整个值。
+        """
+        pending = set(chunk_ids)
+        filled = 0
+        attempts = 0
+        while pending:
+            try:
+                for chunk in collection.find({"_id": {"$in": list(pending)}}, {"value": 1, "n": 1, "write_id": 1}):
+                    if chunk.get("write_id") != write_id:
+                        return -1  # 读取期间被重写，已拿到的块可能混有新旧两次写入
+                    data = chunk["value"]
+                    start = chunk["n"] * chunk_size
+                    if start + len(data) > len(view):
+                        return -1
+                    view[start:start + len(data)] = data
+                    filled += len(data)
+                    pending.discard(chunk["_id"])
+                    del data, chunk  # 尽早释放块，峰值内存约为缓冲区加一个游标批次
+                break  # 查询结束后仍缺失的块说明值不完整，由调用方按长度判断
+            except AutoReconnect:
+                attempts += 1
+                if attempts > self._chunk_fetch_retries:
+                    raise
+        return filled
+
+    @classmethod
+    def _get_chunk_executor(cls) -> ThreadPoolExecutor:
+        if cls._chunk_executor is None:
+            cls._chunk_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="mongo-cache-chunk")
+        return cls._chunk_executor
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, durability=None):
+        # 不存在过滤器可能漏掉其他进程刚写入的键，add 据此判断会覆盖已有值，因此绕过过滤器
+        if self._lookup(key, None, version, durability, None) is None:
+            return self.set(key, value, timeout, version, durability=durability)
+        return False
+
+    def get(self, key, default=None, version=None, durability=None):
+        return self._lookup(key, default, version, durability, self._negative_filter)
+
+    def _lookup(self, key, default, version, durability, negative_filter):
+        physical = self._read_keys([key], version)
+        if physical is None:
+            return default
+        key = physical[key]
+        profile = self._durability.resolve(key, durability)
+        if self._durability.reads_own_writes(profile):
+            negative_filter = None  # 过滤器不保证包含刚写入的键
+        # 请求级记忆：同一请求内重复读取同一键只访问一次 MongoDB；需要读自己写入的档位不使用
+        memo = self._memo() if not self._durability.reads_own_writes(profile) else None
+        if memo is not None and key in memo:
+            hit = memo[key]
+            if self._tracer is not None:
+                self._tracer.record(TraceRecorder.GET, key, len(hit[0]) if hit is not None else 0)
+            if hit is None:
+                return default
+            self._record_read(key)
+            return self._decode(*hit)
+
+        if self._hot_keys is not None and not self._durability.reads_own_writes(profile):
+            self._hot_keys.record(key)
+            pinned = self._hot_keys.pinned(key)
+            if pinned is not None:
+                self._record_read(key)
+                if self._tracer is not None:
+                    self._tracer.record(TraceRecorder.GET, key, len(pinned[0]))
+                return self._decode(*pinned)
+
+        if self._l1 is not None and not self._durability.reads_own_writes(profile):
+            hit = self._l1.get(key)
+            if hit is not None:
+                self._record_read(key)
+                if self._tracer is not None:
+                    self._tracer.record(TraceRecorder.GET, key, len(hit[0]))
+                return self._decode(*hit)
+
+        if negative_filter is not None and not negative_filter.might_contain(key, self._active_collection_name()):
+            if self._tracer is not None:
+                self._tracer.record(TraceRecorder.GET, key, 0)
+            return default
+
+        if not self._breaker.allow():
+            return default  # 后端不健康时直接按未命中处理，不等待超时
+        try:
+            return self._get(key, default, profile, memo, negative_filter)
+        finally:
+            self._breaker.release()  # 解码失败等未记录结果的退出，不能一直占着半开的探测名额
+
+    def _get(self, key, default, profile, memo, negative_filter=None):
+        try:
+            if self._durability.reads_own_writes(profile):
+                # 读自己的写：固定读主节点并使用 majority read concern，不走对冲读
+                value = self._within_budget(self._read_value, key, self._durability.apply(self.collection, profile))
+            else:
+                # 热点副本只在未开启 L1 时使用，开启 L1 时热点键本就由 L1 应答
+                read_key = self._hot_keys.pick_replica(key) if self._hot_keys is not None and self._l1 is None else key
+                value = self._hedged_read(lambda collection: self._read_value(read_key, collection, memo=memo))
+                if value is None and read_key != key:  # 副本已过期或尚未建立，回退读原键
+                    value = self._hedged_read(lambda collection: self._read_value(key, collection, memo=memo))
+                elif memo is not None and read_key != key:
+                    memo[key] = memo.pop(read_key, None)
+        except PyMongoError as e:
+            self._breaker.record_failure()
+            print(f"Error during get: {e}")
+            return default
+        self._breaker.record_success()
+        if value is None:
+            if memo is not None:
+                memo[key] = None  # 未命中同样记住
+            if negative_filter is not None:
+                negative_filter.record_false_positive()
+            if self._tracer is not None:
+                self._tracer.record(TraceRecorder.GET, key, 0)
+            return default
+        self._record_read(key)
+        return value
+
+    def hot_keys(self) -> List[tuple]:
+        """当前热点键 [(键, 占本窗口抽样读取的比例)]，未开启 HOT_KEYS 时为空列表"""
+        return self._hot_keys.hot_keys() if self._hot_keys is not None else []
+
+    @property
+    def refresh_scheduler(self) -> Optional["RefreshScheduler"]:
+        return self._refresh_schedulers.get(self._health_key)
+
+    def _record_read(self, key):
+        scheduler = self.refresh_scheduler
+        if scheduler is not None:
+            scheduler.mark_read(key)
+        if self._capacity is not None:
+            self._capacity.record_access(key)
+
+    def get_view(self, key, default=None, version=None):
+        """
+        与 get 相同，但原始字节值以 memoryview 返回（来自 L2 的 mmap 或组装缓冲区），不做额外拷贝；
+        调用方需在使用完毕后释放视图。
+        """
+        physical = self._read_keys([key], version)
+        if physical is None:
+            return default
+        key = physical[key]
+        if not self._breaker.allow():
+            return default
+
+        try:
+            value = self._hedged_read(lambda collection: self._read_value(key, collection, zero_copy=True))
+        except PyMongoError as e:
+            self._breaker.record_failure()
+            print(f"Error during get: {e}")
+            return default
+        finally:
+            self._breaker.release()
+        self._breaker.record_success()
+        return default if value is None else value
+
+    def _read_value(self, key, collection, zero_copy=False, memo=None):
+        # 读取前记下 L1 的失效序号，读取期间若有失效事件到达，则不把可能已过期的结果放入 L1
+        # memo 为调用方所在请求作用域的记忆字典，对冲读在线程池中执行，拿不到调用方的 contextvars，需显式传入
+        sequence = self._l1.sequence if self._l1 is not None else None
+        pin_sequence = self._hot_keys.sequence if self._hot_keys is not None else None
+
+        # 头文档记录总长度、块数及过期时间，过期时间同时用于校验本机 L2 中的副本是否仍是最新写入
+        for candidate in self._candidate_collections(collection):
+            head = candidate.find_one({"_id": key})
+            if head is not None:
+                collection = candidate
+                break
+        else:
+            return None
+        if head.get("expires_at") is not None and head["expires_at"] <= datetime.utcnow():
+            return None  # TTL 线程尚未删除，或分桶集合没有 TTL 索引、所在桶尚未 drop
+
+        data = None
+        if self._l2 is not None:
+            data = self._l2.get(key, head.get("expires_at"), head.get("write_id"))
+            if data is not None and not zero_copy:
+                data = bytes(data)
+
+        if data is None:
+            data = self._assemble_value(key, head, collection, zero_copy=zero_copy)
+            if data is None:
+                return None
+            if self._l2 is not None and head["length"] >= self._l2_min_bytes:
+                self._l2.set(key, data, head.get("expires_at"), head.get("write_id"))
+
+        if self._l1 is not None and not zero_copy:
+            self._l1.set(key, (data, head.get("encoding")), head.get("expires_at"), sequence)
+        if self._hot_keys is not None and not zero_copy:
+            self._hot_keys.pin(key, (data, head.get("encoding")), head.get("expires_at"), pin_sequence)
+        if memo is not None:
+            memo[key] = (bytes(data) if zero_copy else data, head.get("encoding"))
+        if self._tracer is not None:
+            self._tracer.record(TraceRecorder.GET, key, head["length"])
+        return self._decode(data, head.get("encoding"))
+
+    def _candidate_collections(self, collection):
+        """按读取顺序返回可能存放该键的集合：分桶模式下先新桶后旧桶，最后是存放永不过期数据的主集合"""
+        if self._bucket_seconds is None:
+            return [collection]
+        database = collection.database
+        return [database.get_collection(self._bucket_name(bucket_id), read_preference=collection.read_preference)
+                for bucket_id in self._live_buckets()] + [collection]
+
+    def _reference_collections(self):
+        """可能引用 blob / GridFS 文件的全部集合：代际模式下还包括重建中的新一代和尚未删除的旧代"""
+        if not self._generations:
+            return self._candidate_collections(self.collection)
+        database = self.client[self._database_name]
+        pattern = re.compile(f"^{re.escape(self._collection_name)}(_g\\d+)?$")
+        return [database[name] for name in database.list_collection_names() if pattern.match(name)]
+
+    def _bucket_name(self, bucket_id: int) -> str:
+        return f"{self._collection_name}_b{bucket_id}"
+
+    @property
+    def bucket_registry(self):
+        """路由索引：每个存活桶一条记录，_id 为桶编号，ends_at 为桶内最晚的过期时间"""
+        return self.client[self._database_name][f"{self._collection_name}_buckets"]
+
+    def _bucket_id(self, expires_at: datetime) -> int:
+        return int(expires_at.replace(tzinfo=timezone.utc).timestamp()) // self._bucket_seconds
+
+    def _live_buckets(self) -> List[int]:
+        """读取路由索引并缓存，顺带 drop 已整体过期的桶"""
+        now = time.monotonic()
+        if self._buckets_loaded_at is not None and now - self._buckets_loaded_at < self._bucket_route_refresh:
+            return self._buckets
+
+        utcnow = datetime.utcnow()
+        buckets = []
+        for route in self.bucket_registry.find().sort("_id", DESCENDING):
+            if route["ends_at"] <= utcnow:
+                self.client[self._database_name].drop_collection(self._bucket_name(route["_id"]))
+                self.bucket_registry.delete_one({"_id": route["_id"]})
+            else:
+                buckets.append(route["_id"])
+        self._buckets = buckets
+        self._buckets_loaded_at = now
+        return buckets
+
+    def _register_bucket(self, bucket_id: int):
+        if bucket_id in self._live_buckets():
+            return
+        ends_at = datetime.utcfromtimestamp((bucket_id + 1) * self._bucket_seconds)
+        self.bucket_registry.update_one({"_id": bucket_id}, {"$set": {"ends_at": ends_at}}, upsert=True)
+        self._buckets = sorted(self._buckets + [bucket_id], reverse=True)
+
+    def _decode(self, data, encoding):
+        return self._serializer.loads(encoding, data)
+
+    def _hedged_read(self, read):
+        """
+        执行一次读取；开启对冲读时，主读超过延迟阈值仍未完成，则以 secondaryPreferred
+        再发一次相同的读，取先成功返回的结果（从节点可能有复制延迟，对缓存可以接受）。
+        """
+        collection = self.collection
+        if not self._hedged_reads:
+            started = time.monotonic()
+            result = self._within_budget(read, collection)
+            self._latency.record(time.monotonic() - started)
+            return result
+
+        executor = self._get_hedge_executor()
+        primary = executor.submit(self._timed_read, read, collection)
+        delay = self._hedge_delay
+        if delay is None:
+            p95 = self._latency.percentile(0.95)
+            if p95 is None:  # 样本不足时不对冲
+                return primary.result()
+            delay = max(p95, self._hedge_min_delay)
+        try:
+            return primary.result(timeout=delay)
+        except FuturesTimeoutError:
+            pass
+
+        hedge_collection = collection.with_options(read_preference=ReadPreference.SECONDARY_PREFERRED)
+        pending = {primary, executor.submit(self._within_budget, read, hedge_collection)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _timed_read(self, read, collection):
+        started = time.monotonic()
+        result = self._within_budget(read, collection)
+        self._latency.record(time.monotonic() - started)
+        return result
+
+    def _read_budget(self):
+        """单次读取的超时预算；写入和维护操作不进入，不受其限制"""
+        return pymongo.timeout(self._read_timeout) if self._read_timeout else nullcontext()
+
+    def _within_budget(self, read, *args):
+        # pymongo.timeout 基于 contextvars，对冲读、并发拉块的线程池拿不到调用方的预算，需在线程内各自进入
+        with self._read_budget():
+            return read(*args)
+
+    @classmethod
+    def _get_hedge_executor(cls) -> ThreadPoolExecutor:
+        if cls._hedge_executor is None:
+            cls._hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="mongo-cache-hedge")
+        return cls._hedge_executor
+
+    def _resolve_timeout(self, key, timeout):
+        """
+        返回相对秒数，None 表示永不过期。未显式传入 timeout 时优先使用 TTL 策略表中匹配的值。
+        注意 BaseCache.get_backend_timeout 返回的是绝对时间戳，不能直接用于 timedelta。
+        """
+        if timeout is DEFAULT_TIMEOUT:
+            if self._ttl_policy is not None:
+                # 规则按调用方看到的键匹配，不含命名空间版本后缀
+                seconds = self._ttl_policy.resolve(self._logical_key(key))
+                if seconds is not None:
+                    return seconds
+            return self.default_timeout
+        if timeout == 0:
+            return -1  # 与 Django 一致，0 表示立即过期
+        return timeout
+
+    def _iter_documents(self, data: Dict[str, Any], timeout=DEFAULT_TIMEOUT, blobs: Optional[Dict[str, tuple]] = None,
+                        files: Optional[Dict[ObjectId, tuple]] = None):
+        """
+        生成 (桶编号, 键, 文档)，每个键先生成各块文档，最后生成头文档。
+        传入 blobs 且开启去重时，大值不生成块文档，头文档只记内容哈希，
+        值放入 blobs {哈希: (值, 过期时间, 引用数)} 由调用方先写入。
+        传入 files 且开启 GridFS 模式时同理，头文档只记新文件的 _id，值放入 files {文件 _id: (键, 值, 过期时间)}。
+        """
+        now = datetime.utcnow()
+        expires_at_by_timeout = {}  # 同一批次中相同 TTL 只计算一次过期时间
+        scheduler = self.refresh_scheduler
+
+        for key, value in data.items():
+            key_timeout = self._resolve_timeout(key, timeout)
+            if key_timeout not in expires_at_by_timeout:
+                expires_at_by_timeout[key_timeout] = (now + timedelta(seconds=key_timeout)
+                                                      if key_timeout is not None else None)
+            expires_at = expires_at_by_timeout[key_timeout]
+            if scheduler is not None and expires_at is not None:
+                scheduler.schedule(key, expires_at)
+            bucket_id = None
+            if self._bucket_seconds is not None and expires_at is not None:
+                bucket_id = self._bucket_id(expires_at)
+            shard_key = self._generate_shard_key(key)  # 生成分片键
+            # 类型码写在头文档里而不是拼在值前面，字节值原样分块存储，不产生额外拷贝
+            encoding, payload = self._serializer.dumps(value)
+            digest = None
+            if blobs is not None and self._blob_store is not None and len(payload) >= self._blob_store.min_bytes:
+                digest = self._blob_store.digest(payload)
+                BlobStore.merge(blobs, {digest: (payload, expires_at or BlobStore.NEVER, 1)})
+            file_id = None
+            if (digest is None and files is not None and self._gridfs is not None
+                    and len(payload) >= self._gridfs.min_bytes):
+                file_id = ObjectId()  # 每次写入一个新文件，读者不会读到写了一半的文件
+                files[file_id] = (key, payload, expires_at)
+            chunks = self._split_value(payload, self._chunk_size) if digest is None and file_id is None else []
+            if self._tracer is not None:
+                self._tracer.record(TraceRecorder.SET, key, len(payload))
+            if self._negative_filter is not None:
+                self._negative_filter.add(key)
+
+            # 每次写入的随机编号：重写沿用相同的块 _id 原地覆盖，读者据此识别混入的其他写入的块；
+            # 本机 L2 也据此判断副本是否仍是最新写入
+            write_id = random.getrandbits(63)
+            for i, chunk in enumerate(chunks):
+                yield bucket_id, key, {
+                    "_id": f"{key}_chunk_{i}",
+                    "value": Binary(chunk),
+                    "n": i,
+                    "write_id": write_id,
+                    "expires_at": expires_at,
+                    "shard_key": shard_key
+                }
+
+            # 头文档最后写入：读取以头文档中的块数为准，重写后多出来的旧块不会被读到，写完头文档后删除
+            head = {
+                "_id": key,
+                "write_id": write_id,
+                "length": len(payload),
+                "chunks": len(chunks),
+                "chunk_size": self._chunk_size if digest is None else BlobStore.CHUNK_SIZE,
+                "encoding": encoding,
+                "expires_at": expires_at,
+                "last_access": now,
+                "shard_key": shard_key
+            }
+            if digest is not None:
+                head["blob"] = digest
+            if file_id is not None:
+                head["gridfs"] = file_id
+            yield bucket_id, key, head
+
+    def _build_operations(self, data: Dict[str, Any], timeout=DEFAULT_TIMEOUT) -> Dict[Optional[int], Dict]:
+        """
+        返回按目标集合分组的写操作 {桶编号: {"keys": [...], "chunks": [...], "operations": [...], "cleanup": [...]}}，
+        chunks 为块文档的写入，须先于 operations 中的头文档完成；cleanup 删除重写后多出来的旧块，在头文档之后执行；
+        桶编号 None 表示主集合（未开启分桶或永不过期的数据）；
+        去重模式下其中一个分组带 "blobs"，GridFS 模式下其中一个分组带 "files"。
+        """
+        grouped: Dict[Optional[int], Dict] = {}
+        blobs: Dict[str, tuple] = {}
+        files: Dict[ObjectId, tuple] = {}
+        for bucket_id, key, document in self._iter_documents(data, timeout, blobs, files):
+            group = grouped.setdefault(bucket_id, {"keys": [], "chunks": [], "operations": [], "cleanup": []})
+            document_id = document.pop("_id")
+            update = {"$set": document}
+            if document_id != key:
+                group["chunks"].append(UpdateOne({"_id": document_id}, update, upsert=True))
+                continue
+            group["keys"].append(key)
+            # 原先是去重或 GridFS 条目时，去掉旧的引用；旧文件由回收线程删除
+            unset = {field: "" for field in ("blob", "gridfs") if field not in document}
+            if unset:
+                update["$unset"] = unset
+            if self._eviction_policy == "lfu":  # 新键以初始访问次数起步，重写不会降低已有的计数
+                update["$max"] = {"hits": CapacityManager.LFU_INIT_HITS}
+            group["operations"].append(UpdateOne({"_id": document_id}, update, upsert=True))
+            # 旧值的块比新值多（或改为去重、GridFS 条目）时，编号不小于新块数的旧块不会再被读到；
+            # 永不过期的键没有 TTL 兜底，必须显式删除
+            group["cleanup"].append(DeleteMany({"_id": {"$regex": f"^{re.escape(key)}_chunk_\\d+$"},
+                                                "n": {"$gte": document["chunks"]}}))
+        if blobs:  # 待写入的 blob 只挂在一个分组上，合并分组时引用数不会重复计算
+            next(iter(grouped.values()))["blobs"] = blobs
+        if files:
+            next(iter(grouped.values()))["files"] = files
+        return grouped
+
+    def _forget_local(self, keys):
+        """本进程写入或删除后，淘汰 L1、L2、钉住的热点键和当前请求作用域的记忆"""
+        memo = self._memo()
+        for key in keys:
+            if memo is not None:
+                memo.pop(key, None)
+            if self._l1 is not None:
+                self._l1.delete(key)
+            if self._l2 is not None:
+                self._l2.delete(key)
+            if self._hot_keys is not None:
+                self._hot_keys.unpin(key)
+
+    def _write_operations(self, grouped: Dict[Optional[int], Dict], ordered=True, durability=None):
+        """
+        按桶写入，durability 为持久性档位名，None 表示客户端默认的 write concern。
+        分桶模式下读取按新桶优先，同一个键写入较旧的桶时（TTL 变短），
+        需要删掉较新桶中的头文档，否则旧值会遮住新值；块文档随桶一起 drop。
+        永不过期的键写入主集合，主集合最后才读，所有存活桶中的同名头文档都要删掉。
+        """
+        apply = self._durability.apply
+        database = self.collection.database
+
+        # 去重的值先写入 blob 集合，再写引用它们的头文档
+        blobs: Dict[str, tuple] = {}
+        for group in grouped.values():
+            BlobStore.merge(blobs, group.get("blobs"))
+        if blobs:
+            self._blob_store.write(blobs, apply(self.blob_collection, durability))
+        # GridFS 文件同样先于引用它们的头文档写入
+        files: Dict[ObjectId, tuple] = {}
+        for group in grouped.values():
+            files.update(group.get("files") or {})
+        if files:
+            self._gridfs.write(files, database, apply(self.collection, durability).write_concern)
+
+        for bucket_id, group in grouped.items():
+            if bucket_id is None:
+                collection = apply(self.collection, durability)
+            else:
+                self._register_bucket(bucket_id)
+                collection = apply(database[self._bucket_name(bucket_id)], durability)
+            operations = group["operations"]
+            cleanup = group.get("cleanup") or []
+            if group.get("chunks"):
+                if ordered:
+                    operations = group["chunks"] + operations  # 有序写入中块排在头文档之前
+                else:
+                    collection.bulk_write(group["chunks"], ordered=False)  # 无序写入分两批，块全部写完再写头文档
+            # 旧块在头文档写完后才删。并发的另一次更长的重写若在此之间写入了头文档，
+            # 它编号靠后的块可能被这里删掉，读者按头文档发现缺块，最坏只是一次未命中
+            if ordered:
+                operations = operations + cleanup
+            if operations:
+                collection.bulk_write(operations, ordered=ordered)
+            if cleanup and not ordered:
+                collection.bulk_write(cleanup, ordered=False)
+            if self._bucket_seconds is None or not group["keys"]:
+                continue
+            for newer_id in self._live_buckets():
+                if bucket_id is not None and newer_id <= bucket_id:
+                    break
+                apply(database[self._bucket_name(newer_id)], durability).bulk_write(
+                    [DeleteMany({"_id": {"$in": group["keys"]}})])
+
+        if self._hot_keys is not None:
+            hot = [key for group in grouped.values() for key in group["keys"] if self._hot_keys.is_hot(key)]
+            if hot:
+                self._drop_replicas(hot)
+
+    @staticmethod
+    def _documents_pattern(key: str, replicas_only: bool = False):
+        """
+        键的头文档、块文档和热点副本（{key}#hot{i} 及其块）的 _id 正则，replicas_only=True 时只匹配副本。
+        键经过转义且首尾锚定，不会误删以该键为前缀的其他键。
+        """
+        replica = "#hot\\d+" if replicas_only else "(#hot\\d+)?"
+        return re.compile(f"^{re.escape(key)}{replica}(_chunk_\\d+)?$")
+
+    def _drop_replicas(self, keys: List[str]):
+        """删除热点副本，副本随后由热点检测线程按新值重建"""
+        replica = DeleteMany({"_id": {"$in": [self._documents_pattern(key, replicas_only=True) for key in keys]}})
+        for collection in self._candidate_collections(self.collection):
+            collection.bulk_write([replica])
+
+    def _replicate(self, key: str, replicas: int, ttl: float):
+        """把热点键连同各块复制为 {key}#hot{i}，副本的过期时间不晚于 ttl 秒后，分散到不同的分片键上"""
+        for collection in self._candidate_collections(self.collection):
+            head = collection.find_one({"_id": key})
+            if head is not None:
+                break
+        else:
+            return
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+        if head.get("expires_at") is not None:
+            expires_at = min(expires_at, head["expires_at"])
+        chunks = list(collection.find({"_id": {"$in": [f"{key}_chunk_{i}" for i in range(head["chunks"])]}}))
+
+        operations = []
+        for i in range(1, replicas + 1):
+            replica_id = f"{key}#hot{i}"
+            shard_key = self._generate_shard_key(replica_id)
+            for chunk in chunks:
+                document = dict(chunk, expires_at=expires_at, shard_key=shard_key)
+                del document["_id"]
+                operations.append(UpdateOne({"_id": f"{replica_id}_chunk_{chunk['n']}"}, {"$set": document}, upsert=True))
+            document = dict(head, expires_at=expires_at, shard_key=shard_key, replica_of=key)
+            del document["_id"]
+            operations.append(UpdateOne({"_id": replica_id}, {"$set": document}, upsert=True))
+        collection.bulk_write(operations)  # 有序写入：块先于头文档
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, durability=None):
+        key = self.make_key(key, version)
+        if not self._breaker.allow():
+            return False
+
+        try:
+            operations = self._build_operations({key: value}, timeout)  # 序列化失败时在 finally 中释放探测名额
+            self._forget_local([key])  # 本进程的写入无需等待 change stream 回调
+            self._write_operations(operations, durability=self._durability.resolve(key, durability))
+        except BulkWriteError as e:
+            self._breaker.record_success()  # 服务端已应答，只是个别文档写入失败
+            print(f"Error during bulk write: {e}")
+            return False
+        except PyMongoError as e:
+            self._breaker.record_failure()
+            print(f"Error during bulk write: {e}")
+            return False
+        finally:
+            self._breaker.release()
+        self._breaker.record_success()
+        return True
+
+    def set_many(self, data: Dict[str, Any], timeout=DEFAULT_TIMEOUT, version=None, durability=None):
+        if not self._breaker.allow():
+            return False
+
+        try:
+            if self._namespaces is not None:
+                self._namespaces.prefetch(data, self.namespace_collection)
+                data = {self.make_key(key, version): value for key, value in data.items()}
+            self._forget_local(data)
+            # write concern 按命令生效，不同档位的键分开写
+            for profile, profile_data in self._durability.split(data, durability).items():
+                self._write_operations(self._build_operations(profile_data, timeout), durability=profile)
+        except BulkWriteError as e:
+            self._breaker.record_success()  # 服务端已应答，只是个别文档写入失败
+            print(f"Error during bulk write: {e}")
+            return False
+        except PyMongoError as e:
+            self._breaker.record_failure()
+            print(f"Error during bulk write: {e}")
+            return False
+        finally:
+            self._breaker.release()
+        self._breaker.record_success()
+        return True
+
+    def get_many(self, keys: List[str], version=None) -> Dict[str, Any]:
+        physical = self._read_keys(keys, version)
+        if physical is None:
+            return {key: None for key in keys}
+        results = self._get_many(list(dict.fromkeys(physical.values())))
+        return {key: results[physical[key]] for key in keys}
+
+    def _get_many(self, keys: List[str]) -> Dict[str, Any]:
+        # 先用请求级记忆、L1 和不存在过滤器应答，剩余的键才访问 MongoDB
+        results = {}
+        pending = []
+        memo = self._memo()
+        collection_name = self._active_collection_name() if self._negative_filter is not None else None
+        for key in keys:
+            if memo is not None and key in memo:
+                hit = memo[key]
+                results[key] = self._decode(*hit) if hit is not None else None
+                if hit is not None:
+                    self._record_read(key)
+                if self._tracer is not None:
+                    self._tracer.record(TraceRecorder.GET, key, len(hit[0]) if hit is not None else 0)
+                continue
+            hit = self._l1.get(key) if self._l1 is not None else None
+            if hit is not None:
+                results[key] = self._decode(*hit)
+                self._record_read(key)
+                if self._tracer is not None:
+                    self._tracer.record(TraceRecorder.GET, key, len(hit[0]))
+            elif (self._negative_filter is not None and not self._negative_filter.might_contain(key, collection_name)
+                  and not self._durability.reads_own_writes(self._durability.resolve(key))):
+                results[key] = None
+                if self._tracer is not None:
+                    self._tracer.record(TraceRecorder.GET, key, 0)
+            else:
+                pending.append(key)
+        if not pending:
+            return results
+
+        if not self._breaker.allow():
+            return {key: results.get(key) for key in keys}
+
+        try:
+            collection = self.collection
+            for key in pending:
+                with self._read_budget():
+                    results[key] = self._read_value(key, collection, memo=memo)  # 如果未找到则返回 None
+                if results[key] is not None:
+                    self._record_read(key)
+                    continue
+                if memo is not None:
+                    memo[key] = None
+                if self._negative_filter is not None:
+                    self._negative_filter.record_false_positive()
+                if self._tracer is not None:
+                    self._tracer.record(TraceRecorder.GET, key, 0)
+        except PyMongoError as e:
+            self._breaker.record_failure()
+            print(f"Error during get_many: {e}")
+            return {key: None for key in keys}
+        finally:
+            self._breaker.release()
+        self._breaker.record_success()
+
+        return {key: results[key] for key in keys}
+
+    def prefetch(self, keys: List[str], version=None) -> int:
+        """
+        在当前 request_memo 作用域内用一次 get_many 预取 keys，之后作用域内对这些键的 get 不再访问 MongoDB。
+        不在作用域内时不做任何事。返回命中的键数。
+        """
+        if self._memo() is None:
+            return 0
+        return sum(1 for value in self.get_many(keys, version).values() if value is not None)
+
+    def _memo(self) -> Optional[Dict[str, Optional[tuple]]]:
+        """当前请求作用域中本缓存的记忆字典 {键: (值, 编码) 或 None（未命中）}，不在作用域内时为 None"""
+        scope = _memo_scope.get()
+        if scope is None:
+            return None
+        return scope.setdefault(self._health_key, {})
+
+    def pipeline(self, durability=None) -> "CachePipeline":
+        """
+        排队混合的 get/set/add/delete/incr/decr/touch，执行时合并为一次 $in 查询和一次无序 bulk_write：
+
+            with cache.pipeline() as pipe:
+                pipe.get("a").set("b", 1).incr("c").delete("d")
+            pipe.results  # 按入队顺序的结果
+        """
+        return CachePipeline(self, durability)
+
+    def iter_keys(self, prefix=None, batch_size=1000, include_values=False, parallelism=1):
+        """
+        遍历缓存中未过期的键，include_values=True 时返回 (键, 值)。
+
+        - 指定 prefix 时按 _id 的前缀区间查询（$gte / $lt），由主键索引限定扫描范围，不使用正则；
+        - 游标按 batch_size 批量拉取，只投影头文档需要的字段；值按批次用一次 $in 取回单块值，多块值单独组装；
+        - 未指定 prefix 且 parallelism > 1 时，按哈希分片键 shard_key 切分成多个区间并发扫描，结果不保证顺序；
+        - 命名空间中的键只返回当前版本，且与 get 的参数一致，不带 @ns{版本} 后缀。
+        """
+        for collection, heads in self._iter_head_batches(prefix, batch_size, parallelism):
+            if self._namespaces is not None:
+                heads = self._current_namespace_heads(heads)
+            if not include_values:
+                for head in heads:
+                    yield self._logical_key(head["_id"])
+                continue
+            for key, value in self._load_batch_values(collection, heads):
+                yield self._logical_key(key), value
+
+    def _current_namespace_heads(self, heads):
+        """去掉命名空间旧版本的条目：失效后旧版本的键仍留在集合中，直到过期被清理"""
+        collection = self.namespace_collection
+        self._namespaces.prefetch([head["_id"] for head in heads], collection)
+        return [head for head in heads if self._namespaces.versioned(head["_id"], collection) == head["_id"]]
+
+    def iter_items(self, prefix=None, batch_size=1000, parallelism=1):
+        return self.iter_keys(prefix, batch_size=batch_size, include_values=True, parallelism=parallelism)
+
+    @staticmethod
+    def _prefix_range(prefix: str) -> Dict[str, str]:
+        return {"$gte": prefix, "$lt": prefix[:-1] + chr(ord(prefix[-1]) + 1)}
+
+    def _iter_head_batches(self, prefix, batch_size, parallelism):
+        """按批返回 (所在集合, 头文档列表)；分桶模式下头文档来自各个桶集合，块文档也在同一集合中"""
+        # 只有头文档带 chunks 字段，块文档在同一前缀区间内但会被过滤掉
+        query = {"chunks": {"$exists": True}, "replica_of": {"$exists": False},
+                 "$or": [{"expires_at": None}, {"expires_at": {"$gt": datetime.utcnow()}}]}
+        projection = {"chunks": 1, "length": 1, "chunk_size": 1, "encoding": 1, "expires_at": 1, "blob": 1, "gridfs": 1,
+                      "write_id": 1}
+        if prefix:
+            query["_id"] = self._prefix_range(prefix)
+
+        candidates = self._candidate_collections(self.collection)
+        for i, collection in enumerate(candidates):
+            if prefix or parallelism <= 1:
+                batches = self._head_batches(collection, query, projection, batch_size)
+            else:
+                batches = self._parallel_head_batches(collection, query, projection, batch_size, parallelism)
+            for batch in batches:
+                batch = self._unshadowed_heads(candidates[:i], batch)
+                if batch:
+                    yield collection, batch
+
+    @staticmethod
+    def _head_batches(collection, query, projection, batch_size):
+        batch = []
+        for head in collection.find(query, projection, batch_size=batch_size):
+            batch.append(head)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @staticmethod
+    def _unshadowed_heads(earlier, heads):
+        """
+        分桶模式下去掉被读取顺序更靠前的集合遮住的头文档：写入只删除较新桶中的同名头文档，
+        较旧的桶和主集合中仍留着旧值，直到过期被清理。每个更靠前的集合一次 $in 查询。
+        """
+        for collection in earlier:
+            if not heads:
+                break
+            shadowed = {document["_id"] for document in
+                        collection.find({"_id": {"$in": [head["_id"] for head in heads]}}, {"_id": 1})}
+            if shadowed:
+                heads = [head for head in heads if head["_id"] not in shadowed]
+        return heads
+
+    @staticmethod
+    def _parallel_head_batches(collection, query, projection, batch_size, parallelism):
+        """按 shard_key（十六进制哈希）的取值区间切分，每个区间一个线程扫描，经有界队列汇总"""
+        bounds = [format(i * 0x10000 // parallelism, "04x") for i in range(parallelism)] + [None]
+        results = queue.Queue(maxsize=parallelism * 2)
+        stopped = threading.Event()
+        done = object()
+
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def scan(lower, upper):
+            shard_range = {"$gte": lower} if upper is None else {"$gte": lower, "$lt": upper}
+            try:
+                batch = []
+                for head in collection.find(dict(query, shard_key=shard_range), projection, batch_size=batch_size):
+                    batch.append(head)
+                    if len(batch) >= batch_size:
+                        put(batch)
+                        batch = []
+                if batch:
+                    put(batch)
+            except PyMongoError as e:
+                put(e)
+            finally:
+                put(done)
+
+        workers = [threading.Thread(target=scan, args=(bounds[i], bounds[i + 1]), daemon=True)
+                   for i in range(parallelism)]
+        for worker in workers:
+            worker.start()
+        try:
+            remaining = len(workers)
+            while remaining:
+                item = results.get()
+                if item is done:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            stopped.set()  # 调用方提前结束遍历时，让仍在扫描的线程退出
+
+    def _load_batch_values(self, collection, heads):
+        single = {f"{head['_id']}_chunk_0": head for head in heads
+                  if head["chunks"] == 1 and head.get("blob") is None}
+        values = {}
+        if single:
+            for chunk in collection.find({"_id": {"$in": list(single)}}, {"value": 1, "write_id": 1}):
+                head = single[chunk["_id"]]
+                if chunk.get("write_id") == head.get("write_id"):
+                    values[head["_id"]] = chunk["value"]
+
+        for head in heads:
+            key = head["_id"]
+            if f"{key}_chunk_0" in single:
+                data = values.get(key)
+            else:
+                data = self._assemble_value(key, head, collection)
+            if data is None or len(data) != head["length"]:
+                continue  # 遍历期间被删除或重写
+            yield key, self._decode(data, head.get("encoding"))
+
+    def delete(self, key, version=None, durability=None):
+        key = self.make_key(key, version)
+        profile = self._durability.resolve(key, durability)
+        # 删除头文档、所有块和热点副本
+        documents = {"_id": self._documents_pattern(key)}
+        self._durability.apply(self.collection, profile).delete_many(documents)
+        if self._bucket_seconds is not None:
+            for bucket_id in self._live_buckets():
+                self._durability.apply(self.client[self._database_name][self._bucket_name(bucket_id)],
+                                       profile).delete_many(documents)
+        self._forget_local([key])
+        if self._tracer is not None:
+            self._tracer.record(TraceRecorder.DELETE, key)
+
+    def delete_many(self, keys: List[str], version=None, durability=None):
+        for key in keys:
+            self.delete(key, version, durability=durability)
+
+    def clear(self):
+        self.collection.delete_many({})
+        if self._bucket_seconds is not None:
+            for route in self.bucket_registry.find():
+                self.client[self._database_name].drop_collection(self._bucket_name(route["_id"]))
+            self.bucket_registry.delete_many({})
+            self._buckets, self._buckets_loaded_at = [], None
+        if self._l1 is not None:
+            self._l1.clear()
+        if self._l2 is not None:
+            self._l2.clear()
+        memo = self._memo()
+        if memo is not None:
+            memo.clear()
@@ -0,0 +1,139 @@
+import pickle
+import time
+import tracemalloc
+
+from bson import BSON
+from bson.errors import InvalidDocument
+
+from .backend import MongoDBCacheBackend
+from .serializers import FastSerializer, JSONSerializer
+
+
+class _ChunkCursorStub:
+    """模拟 MongoDB 游标：每次迭代重新生成块数据，与 pymongo 解码出新的 bytes 对象一致"""
+
+    def __init__(self, key, total_bytes, chunk_size, wrapped=False):
+        self._key = key
+        self._total_bytes = total_bytes
+        self._chunk_size = chunk_size
+        self._wrapped = wrapped
+
+    def _chunks(self):
+        for n, start in enumerate(range(0, self._total_bytes, self._chunk_size)):
+            data = b"x" * min(self._chunk_size, self._total_bytes - start)
+            if self._wrapped:  # 旧格式：每块再包一层 BSON
+                data = BSON.encode({"value": data})
+            yield {"_id": f"{self._key}_chunk_{n}", "n": n, "value": data}
+
+    def find(self, *args, **kwargs):
+        return self._chunks()
+
+    def find_one(self, *args, **kwargs):
+        return next(self._chunks())
+
+
+def benchmark_assemble(total_bytes=64 * 1024 * 1024, chunk_size=4 * 1024 * 1024, rounds=5):
+    """对比旧的“块列表 + BSON 解码 + join”与预分配缓冲区组装的耗时和峰值内存"""
+    head = {"length": total_bytes, "chunks": -(-total_bytes // chunk_size), "chunk_size": chunk_size}
+
+    def join_assemble():
+        cursor = _ChunkCursorStub("k", total_bytes, chunk_size, wrapped=True)
+        return b''.join(BSON(chunk["value"]).decode()["value"] for chunk in cursor.find())
+
+    backend = MongoDBCacheBackend("mongodb://localhost:27017/", {"options": {"CHUNK_FETCH_PARALLELISM": 1}})
+
+    def buffer_assemble(zero_copy):
+        cursor = _ChunkCursorStub("k", total_bytes, chunk_size)
+        return backend._assemble_value("k", head, cursor, zero_copy=zero_copy)
+
+    cases = [
+        ("join", join_assemble),
+        ("buffer", lambda: buffer_assemble(False)),
+        ("buffer(zero_copy)", lambda: buffer_assemble(True)),
+    ]
+    for name, assemble in cases:
+        tracemalloc.start()
+        started = time.perf_counter()
+        for _ in range(rounds):
+            value = assemble()
+            assert len(value) == total_bytes
+            del value
+        elapsed = (time.perf_counter() - started) / rounds
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:<18} {elapsed * 1000:8.1f} ms/read  peak {peak / 1024 / 1024:8.1f} MB")
+
+
+def benchmark_serializers(rounds=200):
+    """按载荷类型对比 FastSerializer、JSONSerializer 与 pickle、BSON 包装的编解码吞吐"""
+    payloads = {
+        "bytes 4MB": b"x" * (4 * 1024 * 1024),
+        "str 64KB": "分支信息" * (16 * 1024),
+        "int": 1234567890,
+        "dict": {"branch": "main", "commits": list(range(200)), "meta": {"protected": True}},
+        "bytearray 4MB": bytearray(4 * 1024 * 1024),
+    }
+
+    def pickle_codec(value):
+        return pickle.loads(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def bson_codec(value):
+        return BSON(BSON.encode({"value": value})).decode()["value"]
+
+    def serializer_codec(serializer):
+        def codec(value):
+            return serializer.loads(*serializer.dumps(value))
+        return codec
+
+    codecs = [
+        ("fast", serializer_codec(FastSerializer())),
+        ("json", serializer_codec(JSONSerializer())),
+        ("pickle", pickle_codec),
+        ("bson", bson_codec),
+    ]
+    for payload_name, payload in payloads.items():
+        for codec_name, codec in codecs:
+            try:
+                started = time.perf_counter()
+                for _ in range(rounds):
+                    codec(payload)
+                elapsed = time.perf_counter() - started
+            except (TypeError, ValueError, InvalidDocument):
+                print(f"{payload_name:<14} {codec_name:<7} unsupported")
+                continue
+            print(f"{payload_name:<14} {codec_name:<7} {rounds / elapsed:12.0f} ops/s")
+
+
+def benchmark_chunk_sizes(uri="mongodb://localhost:27017/", value_sizes=(1024 * 1024, 16 * 1024 * 1024),
+                          chunk_sizes=(64 * 1024, 255 * 1024, 1024 * 1024, 4 * 1024 * 1024, 15 * 1024 * 1024),
+                          rounds=5):
+    """
+    在真实的 MongoDB 上对比不同块大小（以及 GridFS 模式）的写入、读取吞吐，用于选定 CHUNK_SIZE。
+    使用临时集合，结束后删除。
+    """
+    cases = [(f"chunks {size // 1024}KB", {"CHUNK_SIZE": size}) for size in chunk_sizes]
+    cases += [(f"gridfs {size // 1024}KB", {"CHUNK_SIZE": size, "GRIDFS_MIN_BYTES": 1}) for size in chunk_sizes]
+    for value_size in value_sizes:
+        value = b"x" * value_size
+        for case, (name, options) in enumerate(cases):
+            # 每个用例单独一个集合：GridFS 存储按集合在进程内注册，块大小不会沿用上一个用例
+            collection_name = f"chunk_benchmark_{case}"
+            backend = MongoDBCacheBackend(uri, {"options": dict(options, COLLECTION_NAME=collection_name,
+                                                                CHUNK_FETCH_PARALLELISM=1)})
+            try:
+                started = time.perf_counter()
+                for i in range(rounds):
+                    backend.set(f"k{i}", value, timeout=600)
+                write_elapsed = time.perf_counter() - started
+                started = time.perf_counter()
+                for i in range(rounds):
+                    assert len(backend.get(f"k{i}")) == value_size
+                read_elapsed = time.perf_counter() - started
+            finally:
+                database = backend.client[backend._database_name]
+                for collection in (collection_name, f"{backend.gridfs_bucket_name}.files",
+                                   f"{backend.gridfs_bucket_name}.chunks"):
+                    database.drop_collection(collection)
+            megabytes = value_size * rounds / 1024 / 1024
+            print(f"{value_size // 1024:>8}KB  {name:<16} write {megabytes / write_elapsed:8.1f} MB/s  "
+                  f"read {megabytes / read_elapsed:8.1f} MB/s")
@@ -0,0 +1,145 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from .registry import ProcessShared
+
+
+class CapacityManager(ProcessShared):
+    """
+    按条目数 / 总字节数限制集合容量，近似 Redis allkeys-lru / allkeys-lfu：
+
+    - 访问记录：读命中按 sample_rate 抽样，且同一键在 access_interval 秒内最多记录一次，
+      由后台线程批量写回头文档的 last_access / hits（hits 按抽样率放大），读请求本身不产生写入；
+    - 新写入的键以 LFU_INIT_HITS 起步（同 Redis 的 LFU_INIT_VAL），lfu 下不会因为还没被读过就最先被淘汰；
+    - 淘汰：后台线程每 eviction_interval 秒检查一次，超限时反复 $sample 一批头文档，
+      删除其中最久未访问（lru）或访问最少（lfu）的一部分，直到回落到 CULL_FREQUENCY 对应的水位以下；
+    - 分桶模式下条目分散在主集合和各存活桶中，条目数与字节数按总和计算，抽样名额按各集合的条目数分配。
+    """
+    LFU_INIT_HITS = 5
+
+    def __init__(self, policy: str = "lru", max_entries: int = None, max_bytes: int = None,
+                 cull_frequency: int = 3, sample_rate: float = 0.05, access_interval: float = 60,
+                 eviction_interval: float = 10, samples: int = 64, evict_per_sample: int = 16):
+        if policy not in ("lru", "lfu"):
+            raise RuntimeError(f"Unsupported EVICTION_POLICY: {policy!r}")
+        self._sort_field = "last_access" if policy == "lru" else "hits"
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._cull_ratio = 1 - 1 / cull_frequency if cull_frequency and cull_frequency > 1 else 1
+        self._sample_rate = sample_rate
+        self._access_interval = access_interval
+        self._eviction_interval = eviction_interval
+        self._samples = samples
+        self._evict_per_sample = evict_per_sample
+
+        self._lock = threading.Lock()
+        self._pending: Dict[str, int] = {}  # 待写回的访问次数
+        self._recorded: "OrderedDict[str, float]" = OrderedDict()  # 最近记录过访问的键 -> 记录时刻
+        self._backend = None
+        self._thread = None
+
+    def attach(self, backend):
+        """绑定后端，首次调用时启动后台线程；当前代与存活桶在每次维护时从后端取"""
+        self._backend = backend
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="mongo-cache-capacity", daemon=True)
+            self._thread.start()
+
+    def record_access(self, key: str):
+        if random.random() >= self._sample_rate:
+            return
+        now = time.monotonic()
+        with self._lock:
+            last = self._recorded.get(key)
+            if last is not None and now - last < self._access_interval:
+                return
+            self._recorded[key] = now
+            self._recorded.move_to_end(key)
+            while len(self._recorded) > 100000:
+                self._recorded.popitem(last=False)
+            self._pending[key] = self._pending.get(key, 0) + 1
+
+    def _collections(self):
+        """容量覆盖的集合：当前代的主集合，分桶模式下还有各存活桶"""
+        backend = self._backend
+        return backend._candidate_collections(backend.collection)
+
+    def _flush_access(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        now = datetime.utcnow()
+        operations = [UpdateOne({"_id": key}, {"$set": {"last_access": now},
+                                               "$inc": {"hits": count / self._sample_rate}})
+                      for key, count in pending.items()]
+        for collection in self._collections():  # 不知道键在哪个桶，不 upsert，只有存放它的集合会匹配
+            collection.bulk_write(operations, ordered=False)
+
+    def _excess(self, collections):
+        """返回 (各集合的条目数, 需要淘汰的条目数, 需要释放的字节数)"""
+        counts = [collection.count_documents({"last_access": {"$exists": True}}) for collection in collections]
+        excess_entries = excess_bytes = 0
+        if self._max_entries and sum(counts) > self._max_entries:
+            excess_entries = sum(counts) - int(self._max_entries * self._cull_ratio)
+        if self._max_bytes:
+            size = sum(collection.database.command("collStats", collection.name)["size"]
+                       for collection in collections)
+            if size > self._max_bytes:
+                excess_bytes = size - int(self._max_bytes * self._cull_ratio)
+        return counts, excess_entries, excess_bytes
+
+    def _sample(self, collections, counts):
+        """按条目数把抽样名额分给各集合（小数部分随机取整），每个条目被抽中的概率相同；返回 [(集合序号, 头文档)]"""
+        total = sum(counts)
+        candidates = []
+        for index, collection in enumerate(collections):
+            share = self._samples * counts[index] / total
+            size = int(share) + (random.random() < share - int(share))
+            if size <= 0:
+                continue
+            candidates.extend((index, doc) for doc in collection.aggregate([
+                {"$match": {"last_access": {"$exists": True}}},
+                {"$sample": {"size": size}},
+                {"$project": {"chunks": 1, "length": 1, "last_access": 1, "hits": 1}},
+            ]))
+        return candidates
+
+    def evict(self):
+        collections = self._collections()
+        counts, excess_entries, excess_bytes = self._excess(collections)
+        while (excess_entries > 0 or excess_bytes > 0) and sum(counts) > 0:
+            candidates = self._sample(collections, counts)
+            if not candidates:
+                return
+            candidates.sort(key=lambda candidate: candidate[1].get(self._sort_field) or 0)
+            victims = candidates[:self._evict_per_sample]
+
+            ids: Dict[int, list] = {}
+            for index, doc in victims:
+                ids.setdefault(index, []).append(doc["_id"])
+                ids[index].extend(f"{doc['_id']}_chunk_{i}" for i in range(doc.get("chunks", 0)))
+                excess_bytes -= doc.get("length", 0)
+                counts[index] -= 1
+            for index, collection_ids in ids.items():
+                collections[index].delete_many({"_id": {"$in": collection_ids}})
+            excess_entries -= len(victims)
+
+    def _run(self):
+        last_eviction = time.monotonic()
+        while True:
+            time.sleep(1)
+            try:
+                self._flush_access()
+                if time.monotonic() - last_eviction >= self._eviction_interval:
+                    last_eviction = time.monotonic()
+                    self.evict()
+            except PyMongoError as e:
+                print(f"Error during capacity maintenance: {e}")
@@ -0,0 +1,162 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from bson import Binary
+from pymongo import ASCENDING, UpdateMany, UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from .registry import ProcessShared
+
+
+class BlobStore(ProcessShared):
+    """
+    内容寻址的值存储：相同字节的值只在 blob 集合中存一份，缓存条目的头文档只记录内容哈希。
+
+    - 写入：按批次用一次 $in 查询哪些 blob 已存在，只有新 blob 才上传块，已存在的只更新引用计数和过期时间；
+    - 过期：blob 的 expires_at 取所有引用它的条目中最晚的一个（$max），由 TTL 索引清理；
+    - 回收：写入只递增 refs，条目被覆盖或删除时不回写；后台线程定期用 blob 稀疏索引重新统计引用数，
+      超过 grace 秒未被写入且已无引用的 blob 连同块一起删除；
+    - 读取：进程内按字节数限制的 LRU，命中时不访问 MongoDB。
+    """
+    NEVER = datetime(9999, 12, 31)  # 永不过期条目引用的 blob，$max 比较时需要一个可比较的日期
+    CHUNK_SIZE = 4 * 1024 * 1024  # blob 的块大小固定，读取方据此由长度算出块数，无需再查 blob 头文档
+
+    def __init__(self, min_bytes: int = 64 * 1024, cache_bytes: int = 64 * 1024 * 1024,
+                 gc_interval: float = 300, grace: float = 3600, gc_batch: int = 1000):
+        self.min_bytes = min_bytes
+        self._cache_bytes = cache_bytes
+        self._gc_interval = gc_interval
+        self._grace = timedelta(seconds=grace)
+        self._gc_batch = gc_batch
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._cached_bytes = 0
+        self._backend = None
+        self._collection = None
+        self._thread = None
+
+    def attach(self, backend, collection):
+        """绑定（或在代际切换后重新绑定）后端，首次调用时建索引并启动回收线程"""
+        self._backend = backend
+        if self._thread is None:
+            self._collection = collection
+            try:
+                collection.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+                collection.create_index([("touched_at", ASCENDING)], sparse=True)
+            except DuplicateKeyError:
+                pass
+            self._thread = threading.Thread(target=self._run, name="mongo-cache-blob-gc", daemon=True)
+            self._thread.start()
+
+    @staticmethod
+    def digest(payload: bytes) -> str:
+        return hashlib.blake2b(payload, digest_size=32).hexdigest()
+
+    @staticmethod
+    def merge(target: Dict[str, tuple], blobs: Optional[Dict[str, tuple]]):
+        """合并待写入的 blob：同一哈希取较晚的过期时间，引用数相加"""
+        for digest, (payload, expires_at, refs) in (blobs or {}).items():
+            if digest in target:
+                _, target_expires_at, target_refs = target[digest]
+                expires_at, refs = max(expires_at, target_expires_at), refs + target_refs
+            target[digest] = (payload, expires_at, refs)
+
+    def get(self, digest: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._cache.get(digest)
+            if data is not None:
+                self._cache.move_to_end(digest)
+            return data
+
+    def put(self, digest: str, data: bytes):
+        if len(data) > self._cache_bytes // 4:  # 单个值过大时不缓存，避免冲掉整个 LRU
+            return
+        with self._lock:
+            if digest in self._cache:
+                self._cache.move_to_end(digest)
+                return
+            self._cache[digest] = data
+            self._cached_bytes += len(data)
+            while self._cached_bytes > self._cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_bytes -= len(evicted)
+
+    def discard(self, digest: str):
+        with self._lock:
+            data = self._cache.pop(digest, None)
+            if data is not None:
+                self._cached_bytes -= len(data)
+        if self._collection is not None:
+            self._collection.delete_one({"_id": digest})
+
+    def write(self, blobs: Dict[str, tuple], collection):
+        """写入 {哈希: (值, 过期时间, 引用数)}，collection 为带持久性档位的 blob 集合"""
+        now = datetime.utcnow()
+        existing = {document["_id"] for document in collection.find({"_id": {"$in": list(blobs)}}, {"_id": 1})}
+        operations = []
+        for digest, (payload, expires_at, refs) in blobs.items():
+            chunk_count = max(1, -(-len(payload) // self.CHUNK_SIZE))
+            if digest in existing:
+                operations.append(UpdateMany({"_id": {"$in": [f"{digest}_chunk_{i}" for i in range(chunk_count)]}},
+                                             {"$max": {"expires_at": expires_at}}))
+            else:
+                for i in range(chunk_count):
+                    chunk = payload[i * self.CHUNK_SIZE:(i + 1) * self.CHUNK_SIZE]
+                    operations.append(UpdateOne({"_id": f"{digest}_chunk_{i}"},
+                                                {"$setOnInsert": {"value": Binary(chunk), "n": i},
+                                                 "$max": {"expires_at": expires_at}},
+                                                upsert=True))
+            operations.append(UpdateOne({"_id": digest},
+                                        {"$setOnInsert": {"length": len(payload), "chunks": chunk_count},
+                                         "$inc": {"refs": refs},
+                                         "$max": {"expires_at": expires_at},
+                                         "$set": {"touched_at": now}},
+                                        upsert=True))
+            self.put(digest, payload)
+        collection.bulk_write(operations)  # 有序写入：块先于 blob 头文档
+
+    def extend(self, expirations: Dict[str, tuple], collection):
+        """touch 引用 blob 的条目时延长 blob 的过期时间 {哈希: (值长度, 过期时间)}，$max 只延后不提前"""
+        operations = []
+        for digest, (length, expires_at) in expirations.items():
+            chunk_count = max(1, -(-length // self.CHUNK_SIZE))
+            operations.append(UpdateMany({"_id": {"$in": [f"{digest}_chunk_{i}" for i in range(chunk_count)]}},
+                                         {"$max": {"expires_at": expires_at}}))
+            operations.append(UpdateOne({"_id": digest}, {"$max": {"expires_at": expires_at}}))
+        collection.bulk_write(operations)
+
+    def collect(self):
+        """重新统计一批 blob 的引用数，删除超过宽限期且已无引用的 blob"""
+        backend = self._backend
+        now = datetime.utcnow()
+        cutoff = now - self._grace
+        references = backend._reference_collections()
+        query = {"touched_at": {"$lt": cutoff},
+                 "$or": [{"checked_at": {"$exists": False}},
+                         {"checked_at": {"$lt": now - timedelta(seconds=self._gc_interval)}}]}
+        for blob in self._collection.find(query, {"chunks": 1}).limit(self._gc_batch):
+            digest = blob["_id"]
+            refs = sum(collection.count_documents({"blob": digest}) for collection in references)
+            if refs:
+                self._collection.update_one({"_id": digest}, {"$set": {"refs": refs, "checked_at": now}})
+                continue
+            # 带上 touched_at 条件：统计期间刚被写入引用的 blob 不删
+            if self._collection.delete_one({"_id": digest, "touched_at": {"$lt": cutoff}}).deleted_count:
+                self._collection.delete_many(
+                    {"_id": {"$in": [f"{digest}_chunk_{i}" for i in range(blob.get("chunks", 1))]}})
+                with self._lock:
+                    data = self._cache.pop(digest, None)
+                    if data is not None:
+                        self._cached_bytes -= len(data)
+
+    def _run(self):
+        while True:
+            time.sleep(self._gc_interval)
+            try:
+                self.collect()
+            except PyMongoError as e:
+                print(f"Error collecting unreferenced blobs: {e}")
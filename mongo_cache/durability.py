@@ -0,0 +1,103 @@
+from typing import Any, Callable, Dict, Optional
+
+from pymongo import ReadPreference
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+
+from .ttl_policy import TTLPolicy
+
+
+class DurabilityRules(TTLPolicy):
+    """键模式 -> 持久性档位名，复用 TTLPolicy 的精确 / 前缀树 / glob 匹配"""
+
+    def __init__(self, rules: Dict[str, str], profiles: Dict[str, Any]):
+        self._profiles = profiles
+        super().__init__(rules)
+
+    def _convert(self, profile: str) -> str:
+        if profile not in self._profiles:
+            raise RuntimeError(f"Unknown durability profile in DURABILITY_RULES: {profile!r}")
+        return profile
+
+
+class DurabilityPolicy:
+    """
+    命名的持久性档位，每个档位是一组 write concern（w / j / wtimeout，wtimeout 单位毫秒），
+    可附带 read_concern / read_preference，带读设置的档位读取时固定按该设置读，不走 L1 和对冲读：
+
+    - fast: w=1, j=false，随时可重新生成的数据，如定时刷新的分支信息；
+    - bulk: w=0，不等待确认，仅用于可容忍丢失的批量预热；
+    - safe: w=majority；
+    - lock: w=majority, j=true，读取使用 majority read concern 并固定读主节点，保证读到自己的写入。
+
+    DURABILITY_PROFILES 中同名档位覆盖内置定义。档位按 调用参数 > 键模式规则 > DURABILITY_DEFAULT 选择，
+    结果为 None 时使用客户端默认的 write concern。
+    """
+    PROFILES = {
+        "fast": {"w": 1, "j": False},
+        "bulk": {"w": 0},
+        "safe": {"w": "majority"},
+        "lock": {"w": "majority", "j": True, "read_concern": "majority", "read_preference": "primary"},
+    }
+    _READ_PREFERENCES = {
+        "primary": ReadPreference.PRIMARY,
+        "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+        "secondary": ReadPreference.SECONDARY,
+        "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+        "nearest": ReadPreference.NEAREST,
+    }
+
+    def __init__(self, profiles: Optional[Dict[str, Dict[str, Any]]] = None,
+                 rules: Optional[Dict[str, str]] = None, default: Optional[str] = None,
+                 logical_key: Optional[Callable[[str], str]] = None):
+        self._profiles = dict(self.PROFILES, **(profiles or {}))
+        self._rules = DurabilityRules(rules, self._profiles) if rules else None
+        self._logical_key = logical_key  # 规则匹配前还原存储键（如去掉命名空间版本后缀）
+        if default is not None and default not in self._profiles:
+            raise RuntimeError(f"Unknown DURABILITY_DEFAULT: {default!r}")
+        self._default = default
+        self._collections: Dict[tuple, Any] = {}  # (集合全名, 档位) -> 带选项的集合对象
+
+    def resolve(self, key: str, profile: Optional[str] = None) -> Optional[str]:
+        if profile is not None:
+            if profile not in self._profiles:
+                raise RuntimeError(f"Unknown durability profile: {profile!r}")
+            return profile
+        if self._rules is not None:
+            matched = self._rules.resolve(key if self._logical_key is None else self._logical_key(key))
+            if matched is not None:
+                return matched
+        return self._default
+
+    def split(self, data: Dict[str, Any], profile: Optional[str] = None) -> Dict[Optional[str], Dict[str, Any]]:
+        """按档位拆分 {键: 值}，未配置规则或显式指定档位时不拆分"""
+        if profile is not None or self._rules is None:
+            return {self.resolve("", profile): data}
+        groups: Dict[Optional[str], Dict[str, Any]] = {}
+        for key, value in data.items():
+            groups.setdefault(self.resolve(key), {})[key] = value
+        return groups
+
+    def reads_own_writes(self, profile: Optional[str]) -> bool:
+        if profile is None:
+            return False
+        settings = self._profiles[profile]
+        return "read_concern" in settings or "read_preference" in settings
+
+    def apply(self, collection, profile: Optional[str]):
+        """返回带该档位 write concern / read concern 的集合对象；profile 为 None 时原样返回"""
+        if profile is None:
+            return collection
+        cache_key = (collection.full_name, profile)
+        applied = self._collections.get(cache_key)
+        if applied is None or applied.database.client is not collection.database.client:
+            settings = self._profiles[profile]
+            write_concern = {name: settings[name] for name in ("w", "j", "wtimeout") if name in settings}
+            options = {"write_concern": WriteConcern(**write_concern)}
+            if "read_concern" in settings:
+                options["read_concern"] = ReadConcern(settings["read_concern"])
+            if "read_preference" in settings:
+                options["read_preference"] = self._READ_PREFERENCES[settings["read_preference"]]
+            applied = collection.with_options(**options)
+            self._collections[cache_key] = applied
+        return applied
@@ -0,0 +1,137 @@
+from typing import Any, Dict, Optional
+
+from pymongo import MongoClient
+from pymongo.errors import ConnectionFailure
+
+from .profiling import CommandProfiler
+
+
+class MongoDBConnectionFactory:
+    """
+    由于 Django 会为每次请求新建cache实例，此处进程级别建立维护连接池
+    """
+    _pools: Dict[str, MongoClient] = {}
+    _profilers: Dict[str, "CommandProfiler"] = {}
+
+    def __init__(self, options: Dict[str, Any]):
+        """
+        client_kwargs 中存储 MongoClient 初始化的相关参数， 如
+
+        :param options:
+        """
+        self.options = options
+        self.client_kwargs = options.get("CLIENT_KWARGS", {})
+        # 连接池参数 MongoClient 客户端默认支持线程池，无需专门的线程池工具类
+        self._max_pool_size = self.client_kwargs.get('MAX_POOL_SIZE', 100)  # 最大连接数
+        self._min_pool_size = self.client_kwargs.get('MIN_POOL_SIZE', 10)    # 最小连接数
+        self._max_idle_time = self.client_kwargs.get('MAX_IDLE_TIME', 300)   # 最大空闲时间
+        # 延迟预算（秒）：缓存不应比它保护的数据库更慢，默认值远小于 pymongo 的 30 秒
+        self._server_selection_timeout = self.client_kwargs.get('SERVER_SELECTION_TIMEOUT', 1)
+        self._connect_timeout = self.client_kwargs.get('CONNECT_TIMEOUT', 1)
+        self._wait_queue_timeout = self.client_kwargs.get('WAIT_QUEUE_TIMEOUT', 1)  # 等待连接池空闲连接
+        # 读取预算按操作生效（pymongo.timeout），只约束缓存读取；写入、过期清理、重建、GridFS 上传不受其限制。
+        # SOCKET_TIMEOUT / OPERATION_TIMEOUT 作用于连接池上的全部操作，默认不设置
+        self._read_timeout = self.client_kwargs.get('READ_TIMEOUT', 2)
+        self._socket_timeout = self.client_kwargs.get('SOCKET_TIMEOUT')
+        self._operation_timeout = self.client_kwargs.get('OPERATION_TIMEOUT')  # 单次操作总预算，对应 timeoutMS
+        # 命令级性能剖析：基于 pymongo 命令监听，记录每类查询形状的耗时与返回量，慢命令打印并抽样 explain
+        self._profile_commands = self.client_kwargs.get('PROFILE_COMMANDS', False)
+        self._slow_command_threshold = self.client_kwargs.get('SLOW_COMMAND_THRESHOLD', 0.1)  # 秒
+        self._explain_sample_rate = self.client_kwargs.get('EXPLAIN_SAMPLE_RATE', 0)  # 慢命令中执行 explain 的比例
+        self._explain_interval = self.client_kwargs.get('EXPLAIN_INTERVAL', 300)  # 秒，同一查询形状两次 explain 的最小间隔
+
+    @property
+    def max_pool_size(self) -> int:
+        return self._max_pool_size
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        """单次缓存读取的预算（秒），None 表示不限制"""
+        return self._read_timeout
+
+    def get_profiler(self, uri: str) -> Optional["CommandProfiler"]:
+        """返回该 URI 连接池上注册的命令剖析器，未开启 PROFILE_COMMANDS 时为 None"""
+        return self._profilers.get(uri)
+
+    def make_connection_params(self, uri: str) -> Dict[str, Any]:
+        """
+        根据传入的 URI 构建连接参数字典。
+        """
+        params = {"uri": uri}
+
+        username = self.options.get("USERNAME")
+        password = self.options.get("PASSWORD")
+        if username and password:
+            params["username"] = username
+            params["password"] = password
+
+        return params
+
+    def connect(self, uri: str) -> MongoClient:
+        """
+        返回一个新的 MongoDB 连接。
+        """
+        params = self.make_connection_params(uri)
+        connection = self.get_connection(params)
+        return connection
+
+    def disconnect(self, connection: MongoClient):
+        """
+        断开与 MongoDB 服务器的连接。
+        """
+        connection.close()
+
+    def get_connection(self, params: Dict[str, Any]) -> MongoClient:
+        """
+        返回一个新的 MongoDB 连接。
+        """
+        pool = self.get_or_create_connection_pool(params)
+        return pool
+
+    def get_or_create_connection_pool(self, params: Dict[str, Any]) -> MongoClient:
+        """
+        返回现有的连接池或创建一个新的连接池。
+        """
+        key = params["uri"]
+        if key not in self._pools:
+            self._pools[key] = self.create_connection_pool(params)
+        return self._pools[key]
+
+    def create_connection_pool(self, params: Dict[str, Any]) -> MongoClient:
+        """
+        创建一个新的 MongoDB 连接池。
+        """
+        uri = params["uri"]
+        kwargs = {
+            "maxPoolSize": self._max_pool_size,
+            "minPoolSize": self._min_pool_size,
+            "maxIdleTimeMS": self._max_idle_time * 1000,  # 转换为毫秒
+            "serverSelectionTimeoutMS": self._server_selection_timeout * 1000,
+            "connectTimeoutMS": self._connect_timeout * 1000,
+            "waitQueueTimeoutMS": self._wait_queue_timeout * 1000,
+        }
+        if self._socket_timeout is not None:
+            kwargs["socketTimeoutMS"] = self._socket_timeout * 1000
+        if self._operation_timeout is not None:
+            kwargs["timeoutMS"] = self._operation_timeout * 1000
+        # 全大写的键是本层自己的配置，其余原样透传给 MongoClient，与上面的默认值重复时以透传的为准
+        kwargs.update({key: value for key, value in self.client_kwargs.items() if not key.isupper()})
+        profiler = None
+        if self._profile_commands:
+            profiler = CommandProfiler(slow_threshold=self._slow_command_threshold,
+                                       explain_sample_rate=self._explain_sample_rate,
+                                       explain_interval=self._explain_interval)
+            kwargs["event_listeners"] = list(kwargs.get("event_listeners") or []) + [profiler]
+        client = MongoClient(uri, **kwargs)
+        if profiler is not None:
+            profiler.bind(client)  # explain 需要通过同一个客户端发出
+            self._profilers[uri] = profiler
+
+        # 测试连接
+        # TODO: 去除，或者异常处理，外部目前没有异常处理
+        try:
+            client.admin.command('ping')
+        except ConnectionFailure:
+            raise Exception("Failed to connect to MongoDB.")
+
+        return client
@@ -0,0 +1,160 @@
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+
+
+class LocalFileCache:
+    """
+    本机磁盘二级缓存（L2），位于内存与 MongoDB 之间。
+
+    每个键对应一个文件，文件头记录写入时头文档的 expires_at、write_id 与值长度：
+    - 写入先落临时文件再 os.replace，读者永远看不到半个文件；
+    - 读取通过 mmap 映射，直接返回页缓存上的 memoryview，不额外拷贝；
+    - 按文件总字节数做 LRU 淘汰。
+
+    注意：容量记账是进程内的，同机多个 worker 共用目录时总量只是近似受限。
+    """
+    _HEADER = struct.Struct("<dqQ")  # expires_at 时间戳（0 表示永不过期）、write_id（-1 表示头文档没有）、值长度
+
+    def __init__(self, directory: str, max_bytes: int = 1024 * 1024 * 1024):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # 文件名 -> 文件大小，按最近访问排序
+        self._total_bytes = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_entries()
+
+    @staticmethod
+    def _filename(key: str) -> str:
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    @staticmethod
+    def _to_timestamp(expires_at: Optional[datetime]) -> float:
+        # 存储层使用的是 utcnow() 生成的 naive 时间
+        if expires_at is None:
+            return 0.0
+        return expires_at.replace(tzinfo=timezone.utc).timestamp()
+
+    @staticmethod
+    def _to_write_id(write_id: Optional[int]) -> int:
+        # write_id 由 getrandbits(63) 生成，非负；旧版本写入的头文档没有该字段
+        return -1 if write_id is None else write_id
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self._directory, name)
+
+    def _load_entries(self):
+        """启动时扫描目录重建 LRU 记账，按修改时间近似最近访问顺序"""
+        files = []
+        for entry in os.scandir(self._directory):
+            if not entry.is_file():
+                continue
+            if entry.name.endswith(".tmp"):  # 上次写入中途退出留下的临时文件
+                self._remove(entry.path)
+                continue
+            stat = entry.stat()
+            files.append((stat.st_mtime, entry.name, stat.st_size))
+
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total_bytes += size
+        with self._lock:
+            self._evict()
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _forget(self, name: str):
+        """调用方需持有锁"""
+        size = self._entries.pop(name, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _evict(self):
+        """调用方需持有锁；已被 mmap 的文件删除后仍可读，不影响正在进行的读取"""
+        while self._total_bytes > self._max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self._remove(self._path(name))
+
+    def get(self, key: str, expires_at: Optional[datetime], write_id: Optional[int] = None) -> Optional[memoryview]:
+        """
+        返回值的只读视图；仅当文件中记录的 expires_at 与 write_id 都与头文档当前值一致时才算命中，
+        不一致说明其他进程已重新写入（永不过期的键重写后 expires_at 不变，只能靠 write_id 区分），旧文件直接丢弃。
+        """
+        name = self._filename(key)
+        path = self._path(name)
+        try:
+            with open(path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):  # ValueError: 空文件无法映射
+            with self._lock:
+                self._forget(name)
+            return None
+
+        if len(mm) < self._HEADER.size:  # 旧格式或损坏的文件
+            mm.close()
+            self.delete(key)
+            return None
+        stored_expires_at, stored_write_id, length = self._HEADER.unpack_from(mm)
+        if (stored_expires_at != self._to_timestamp(expires_at) or stored_write_id != self._to_write_id(write_id)
+                or len(mm) != self._HEADER.size + length):
+            mm.close()
+            self.delete(key)
+            return None
+
+        with self._lock:
+            if name in self._entries:
+                self._entries.move_to_end(name)
+        # memoryview 持有 mmap 的引用，视图释放后映射随之释放
+        return memoryview(mm)[self._HEADER.size:]
+
+    def set(self, key: str, value: bytes, expires_at: Optional[datetime], write_id: Optional[int] = None) -> bool:
+        size = self._HEADER.size + len(value)
+        if size > self._max_bytes:
+            return False
+
+        name = self._filename(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self._HEADER.pack(self._to_timestamp(expires_at), self._to_write_id(write_id), len(value)))
+                f.write(value)
+            os.replace(tmp_path, self._path(name))  # 原子替换
+        except OSError as e:
+            print(f"Error writing local file cache: {e}")
+            self._remove(tmp_path)
+            return False
+
+        with self._lock:
+            self._forget(name)
+            self._entries[name] = size
+            self._total_bytes += size
+            self._evict()
+        return True
+
+    def delete(self, key: str):
+        name = self._filename(key)
+        with self._lock:
+            self._forget(name)
+        self._remove(self._path(name))
+
+    def clear(self):
+        with self._lock:
+            names = list(self._entries)
+            self._entries.clear()
+            self._total_bytes = 0
+        for name in names:
+            self._remove(self._path(name))
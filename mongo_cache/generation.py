@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+from bson import ObjectId
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from pymongo.errors import DuplicateKeyError
+
+from .capacity import CapacityManager
+
+
+class GenerationRebuild:
+    """
+    一次全量重建：数据以无序 insert_many 写入新一代集合（新集合中不存在旧文档，无需 upsert），
+    退出时用带条件的 findOneAndUpdate 把指针从旧代切到新代；期间若已被其他重建抢先切换则放弃本次结果。
+    重建期间在代注册表中保持 building 记录的心跳，切换后旧代记为待删除，删除不依赖本进程存活。
+    """
+
+    def __init__(self, backend, current: int, generation: int, batch_size: int = 1000):
+        self._backend = backend
+        self._current = current
+        self.generation = generation
+        self._batch_size = batch_size
+        self._database = backend.client[backend._database_name]
+        self._collection = self._database[backend._generation_name(generation)]
+        self._registry = backend.generation_registry
+        self._building_id = f"building:{generation}"
+
+    def _heartbeat(self):
+        self._registry.update_one({"_id": self._building_id}, {"$set": {"heartbeat": datetime.utcnow()}}, upsert=True)
+
+    def set_many(self, data: Dict[str, Any], timeout=DEFAULT_TIMEOUT, version=None):
+        backend = self._backend
+        if backend._namespaces is not None:  # 与 cache.set_many 一样写入带命名空间版本后缀的键
+            backend._namespaces.prefetch(data, backend.namespace_collection)
+            data = {backend.make_key(key, version): value for key, value in data.items()}
+        blobs: Dict[str, tuple] = {}
+        files: Dict[ObjectId, tuple] = {}
+        batch = []
+        for _, key, document in backend._iter_documents(data, timeout, blobs, files):
+            if backend._eviction_policy == "lfu" and document["_id"] == key:
+                document["hits"] = CapacityManager.LFU_INIT_HITS  # 与 cache.set 一样给头文档初始访问次数
+            batch.append(document)
+            if len(batch) >= self._batch_size:
+                self._insert(batch, blobs, files)
+                batch = []
+        if batch:
+            self._insert(batch, blobs, files)
+
+    def _insert(self, batch, blobs: Dict[str, tuple], files: Dict[ObjectId, tuple]):
+        if blobs:  # blob 集合各代共用，先于引用它的头文档写入
+            self._backend._blob_store.write(blobs, self._backend.blob_collection)
+            blobs.clear()
+        if files:  # GridFS bucket 同样各代共用
+            self._backend._gridfs.write(files, self._database)
+            files.clear()
+        self._collection.insert_many(batch, ordered=False)
+        self._heartbeat()
+
+    def __enter__(self):
+        self._heartbeat()  # 先登记再建集合，其他进程的 rebuild() 不会把它当作崩溃遗留
+        self._backend._initialize_sharding(self._collection.name)
+        self._backend._create_indexes(self._collection)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self._discard()
+            return False
+
+        registry = self._registry
+        try:
+            registry.find_one_and_update(
+                {"_id": "active", "generation": self._current},
+                {"$set": {"generation": self.generation}},
+                upsert=True,
+            )
+        except DuplicateKeyError:  # 指针已不是 current，说明其他重建已先完成切换
+            self._discard()
+            raise RuntimeError(f"Generation {self._current} is no longer active, rebuild discarded.")
+
+        # 延迟删除旧代：仍缓存着旧代编号的读者有 GENERATION_REFRESH 秒的窗口
+        drop_after = datetime.utcnow() + timedelta(seconds=self._backend._generation_drop_delay)
+        registry.update_one({"_id": f"drop:{self._current}"},
+                            {"$set": {"collection": self._backend._generation_name(self._current),
+                                      "drop_after": drop_after}}, upsert=True)
+        registry.delete_one({"_id": self._building_id})
+        self._backend._active_generation(refresh=True)
+        return False
+
+    def _discard(self):
+        self._database.drop_collection(self._collection.name)
+        self._registry.delete_one({"_id": self._building_id})
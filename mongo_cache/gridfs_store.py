@@ -0,0 +1,94 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict
+
+from bson import ObjectId
+from gridfs import GridFSBucket
+from gridfs.errors import NoFile
+from pymongo.errors import PyMongoError
+from pymongo.write_concern import WriteConcern
+
+from .registry import ProcessShared
+
+
+class GridFSStore(ProcessShared):
+    """
+    GridFS 存储模式：不小于 min_bytes 的值写入 GridFS bucket，头文档仍在缓存集合中，gridfs 字段记录文件 _id。
+
+    - 写入：每次写入上传一个新文件（新 ObjectId），按 chunk_size 分块后先于头文档写入，读者只会读到完整的文件；
+    - 读取：一个游标按批拉取全部块，不再依赖单个大文档的传输；
+    - 回收：条目被覆盖、删除或过期时不回写，后台线程定期检查上传超过 grace 秒的文件，已无头文档引用的连同块一起删除。
+    """
+
+    def __init__(self, bucket_name: str, min_bytes: int = 1024 * 1024, chunk_size: int = 1024 * 1024,
+                 gc_interval: float = 300, grace: float = 600, gc_batch: int = 1000):
+        self.min_bytes = min_bytes
+        self._bucket_name = bucket_name
+        self._chunk_size = chunk_size
+        self._gc_interval = gc_interval
+        self._grace = timedelta(seconds=grace)
+        self._gc_batch = gc_batch
+        self._backend = None
+        self._thread = None
+
+    def attach(self, backend):
+        """绑定（或在代际切换后重新绑定）后端，首次调用时启动回收线程"""
+        self._backend = backend
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="mongo-cache-gridfs-gc", daemon=True)
+            self._thread.start()
+
+    def bucket(self, database, write_concern=None) -> GridFSBucket:
+        if write_concern is not None and not write_concern.acknowledged:
+            # GridFSBucket 不接受 w=0；文件写入须先于头文档确认完成，bulk 等不确认的档位在此升级为 w=1
+            write_concern = WriteConcern(w=1)
+        return GridFSBucket(database, bucket_name=self._bucket_name, chunk_size_bytes=self._chunk_size,
+                            write_concern=write_concern)
+
+    def write(self, files: Dict[ObjectId, tuple], database, write_concern=None):
+        """上传 {文件 _id: (键, 值, 过期时间)}，write_concern 为持久性档位对应的写关注"""
+        bucket = self.bucket(database, write_concern)
+        for file_id, (key, payload, expires_at) in files.items():
+            bucket.upload_from_stream_with_id(file_id, key, payload, metadata={"expires_at": expires_at})
+
+    def collect(self) -> int:
+        """检查一批超过宽限期的文件，删除已无头文档引用的，返回删除的文件数"""
+        backend = self._backend
+        database = backend.client[backend._database_name]
+        files = database[f"{self._bucket_name}.files"]
+        now = datetime.utcnow()
+        query = {"uploadDate": {"$lt": now - self._grace},
+                 "$or": [{"checked_at": {"$exists": False}},
+                         {"checked_at": {"$lt": now - timedelta(seconds=self._gc_interval)}}]}
+        file_ids = [document["_id"] for document in files.find(query, {"_id": 1}).limit(self._gc_batch)]
+        if not file_ids:
+            return 0
+
+        references = backend._reference_collections()
+        referenced = set()
+        for collection in references:
+            for head in collection.find({"gridfs": {"$in": file_ids}}, {"gridfs": 1}):
+                referenced.add(head["gridfs"])
+        if referenced:
+            files.update_many({"_id": {"$in": list(referenced)}}, {"$set": {"checked_at": now}})
+
+        bucket = self.bucket(database)
+        removed = 0
+        for file_id in file_ids:
+            if file_id in referenced:
+                continue
+            try:
+                bucket.delete(file_id)
+                removed += 1
+            except NoFile:
+                pass  # 其他进程已删除
+        return removed
+
+    def _run(self):
+        while True:
+            time.sleep(self._gc_interval)
+            try:
+                self.collect()
+            except PyMongoError as e:
+                print(f"Error collecting unreferenced GridFS files: {e}")
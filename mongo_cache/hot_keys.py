@@ -0,0 +1,145 @@
+import logging
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo.errors import PyMongoError
+
+from .registry import ProcessShared
+
+logger = logging.getLogger(__name__)
+
+
+class HotKeyDetector(ProcessShared):
+    """
+    热点键检测：对 get 按 sample_rate 抽样，用 Space-Saving 算法在 capacity 个计数器内估计高频键，
+    每 window 秒结算一次，估计计数下界（计数 - 误差）占本窗口抽样读取的比例不低于 threshold 的键视为热点，
+    结算后计数减半，热点列表反映最近几个窗口的访问。
+
+    - pin：热点键读到的值在进程内钉住 pin_ttl 秒，不受 L1 容量淘汰影响；本进程写入时立即失效，
+      其他进程的写入最多延迟 pin_ttl 秒可见；
+    - replicate：后台线程每个窗口把热点键复制为 replicas 个 {key}#hot{i} 副本，读取时随机选一个（含原键），
+      副本过期时间不超过 replica_ttl 秒；本进程写入热点键时删除副本，其他进程的写入最多延迟 replica_ttl 秒可见。
+    """
+
+    def __init__(self, mode: str = "pin", capacity: int = 64, sample_rate: float = 0.1, window: float = 10,
+                 threshold: float = 0.01, min_count: int = 10, replicas: int = 4, replica_ttl: float = 30,
+                 pin_ttl: float = 5):
+        if mode not in ("pin", "replicate"):
+            raise RuntimeError(f"Unsupported HOT_KEY_MODE: {mode!r}")
+        self._mode = mode
+        self._capacity = capacity
+        self._sample_rate = sample_rate
+        self._window = window
+        self._threshold = threshold
+        self._min_count = min_count
+        self._replicas = replicas
+        self._replica_ttl = replica_ttl
+        self._pin_ttl = pin_ttl
+
+        self._lock = threading.Lock()
+        self._counts: Dict[str, float] = {}
+        self._errors: Dict[str, float] = {}  # 键接替被淘汰计数器时继承的计数，即高估的上限
+        self._total = 0.0
+        self._hot: Dict[str, float] = {}  # 热点键 -> 占比
+        self._pinned: Dict[str, tuple] = {}  # 键 -> (值, 本地过期时刻)
+        self.sequence = 0  # 每次失效递增，读取期间发生失效时不钉住读到的旧值
+        self._backend = None
+        self._thread = None
+
+    def attach(self, backend):
+        self._backend = backend
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="mongo-cache-hot-keys", daemon=True)
+            self._thread.start()
+
+    def record(self, key: str):
+        if random.random() >= self._sample_rate:
+            return
+        with self._lock:
+            self._total += 1
+            if key in self._counts:
+                self._counts[key] += 1
+            elif len(self._counts) < self._capacity:
+                self._counts[key] = 1
+                self._errors[key] = 0
+            else:
+                victim = min(self._counts, key=self._counts.get)  # 替换计数最小的键
+                floor = self._counts.pop(victim)
+                del self._errors[victim]
+                self._counts[key] = floor + 1
+                self._errors[key] = floor
+
+    def is_hot(self, key: str) -> bool:
+        return key in self._hot
+
+    def hot_keys(self) -> List[tuple]:
+        """返回 [(键, 占本窗口抽样读取的比例)]，按占比降序"""
+        return sorted(self._hot.items(), key=lambda item: item[1], reverse=True)
+
+    def pinned(self, key: str) -> Optional[tuple]:
+        entry = self._pinned.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    def pin(self, key: str, value: tuple, expires_at: Optional[datetime], sequence: Optional[int]):
+        if self._mode != "pin" or key not in self._hot:
+            return
+        ttl = self._pin_ttl
+        if expires_at is not None:
+            ttl = min(ttl, (expires_at - datetime.utcnow()).total_seconds())
+        if ttl <= 0:
+            return
+        with self._lock:
+            if sequence == self.sequence:
+                self._pinned[key] = (value, time.monotonic() + ttl)
+
+    def unpin(self, key: str):
+        with self._lock:
+            self.sequence += 1
+            self._pinned.pop(key, None)
+
+    def pick_replica(self, key: str) -> str:
+        if self._mode != "replicate" or key not in self._hot:
+            return key
+        i = random.randint(0, self._replicas)
+        return key if i == 0 else f"{key}#hot{i}"
+
+    def rollover(self):
+        """结算一个窗口：更新热点列表，计数减半"""
+        with self._lock:
+            hot = {}
+            if self._total:
+                for key, count in self._counts.items():
+                    guaranteed = count - self._errors[key]
+                    if guaranteed >= self._min_count and guaranteed / self._total >= self._threshold:
+                        hot[key] = guaranteed / self._total
+            for key in list(self._counts):
+                self._counts[key] /= 2
+                self._errors[key] /= 2
+                if self._counts[key] < 1:
+                    del self._counts[key], self._errors[key]
+            self._total /= 2
+            for key in list(self._pinned):
+                if key not in hot:
+                    del self._pinned[key]
+            new_keys = [key for key in hot if key not in self._hot]
+            self._hot = hot
+        for key in new_keys:
+            logger.info("Hot cache key detected: %r (%.1f%% of sampled reads)", key, hot[key] * 100)
+        return hot
+
+    def _run(self):
+        while True:
+            time.sleep(self._window)
+            hot = self.rollover()
+            if self._mode != "replicate":
+                continue
+            for key in hot:
+                try:
+                    self._backend._replicate(key, self._replicas, self._replica_ttl)
+                except PyMongoError as e:
+                    logger.warning("Error replicating hot key %r: %s", key, e)
@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from .negative_filter import NegativeLookupFilter
+
+
+class LocalMemoryCache:
+    """
+    进程内一级缓存：LRU + TTL，多线程共享。
+    每次失效都会递增 sequence，读取方据此判断读取期间是否发生过失效，避免把旧值放回缓存。
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 300, fallback_ttl: float = 5):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._fallback_ttl = fallback_ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, 本地过期时刻, MongoDB 中的过期时间)
+        self.sequence = 0
+        self.streaming = False  # change stream 正常工作时才使用完整 TTL
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, expires_at: Optional[datetime] = None, sequence: Optional[int] = None):
+        ttl = self._ttl if self.streaming else self._fallback_ttl
+        if expires_at is not None:
+            ttl = min(ttl, (expires_at - datetime.utcnow()).total_seconds())
+        if ttl <= 0:
+            return
+        with self._lock:
+            if sequence is not None and sequence != self.sequence:
+                return
+            self._entries[key] = (value, time.monotonic() + ttl, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self.sequence += 1
+            self._entries.pop(key, None)
+
+    def snapshot(self, limit: int) -> List[tuple]:
+        """按最近使用顺序返回最多 limit 个未过期条目 [(key, value, expires_at)]，供预热快照使用"""
+        now = time.monotonic()
+        with self._lock:
+            entries = list(reversed(self._entries.items()))
+        return [(key, entry[0], entry[2]) for key, entry in entries if entry[1] > now][:limit]
+
+    def clear(self):
+        with self._lock:
+            self.sequence += 1
+            self._entries.clear()
+
+
+class ChangeStreamInvalidator:
+    """
+    每个进程每个缓存集合一个后台线程，监听缓存集合上的写入与删除事件，按文档 _id（即缓存键）淘汰 L1，
+    并把其他进程新写入的键加入不存在过滤器。
+    指定 collections 时（分桶模式，键分布在主集合和各桶集合中）改为在库级别监听，按集合名正则过滤事件。
+    断线后使用 resume token 续传；token 失效时清空 L1 后从当前位置重新监听。
+    """
+    _listeners: Dict[str, "ChangeStreamInvalidator"] = {}
+    _registry_lock = threading.Lock()
+
+    # 只需要文档主键，去掉 fullDocument / updateDescription，避免事件中携带大块的值
+    _PIPELINE = [
+        {"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}},
+        {"$project": {"operationType": 1, "documentKey": 1}},
+    ]
+    _UNSUPPORTED_CODES = (40573,)  # 非副本集 / 分片集群不支持 change stream
+    _HISTORY_LOST_CODES = (280, 286)  # ChangeStreamFatalError / ChangeStreamHistoryLost
+
+    @classmethod
+    def ensure_started(cls, name: str, collection, local_cache: Optional[LocalMemoryCache],
+                       negative_filter: Optional["NegativeLookupFilter"] = None, collections: Optional[str] = None):
+        with cls._registry_lock:
+            if name not in cls._listeners:
+                listener = cls(collection, local_cache, negative_filter, collections=collections)
+                listener.start()
+                cls._listeners[name] = listener
+            return cls._listeners[name]
+
+    @classmethod
+    def stop_listening(cls, name: str):
+        with cls._registry_lock:
+            listener = cls._listeners.pop(name, None)
+        if listener is not None:
+            listener.stop()
+
+    def __init__(self, collection, local_cache: Optional[LocalMemoryCache],
+                 negative_filter: Optional["NegativeLookupFilter"] = None, retry_interval: float = 1,
+                 collections: Optional[str] = None):
+        self._collection = collection
+        self._collections = collections
+        self._local_cache = local_cache
+        self._negative_filter = negative_filter
+        self._retry_interval = retry_interval
+        self._resume_token = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="mongo-cache-invalidator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        source, pipeline = self._collection, self._PIPELINE
+        if self._collections is not None:
+            source = self._collection.database
+            pipeline = [{"$match": {"ns.coll": {"$regex": self._collections}}}] + self._PIPELINE
+        while not self._stopped.is_set():
+            try:
+                with source.watch(pipeline, resume_after=self._resume_token) as stream:
+                    if self._resume_token is None and self._local_cache is not None:
+                        self._local_cache.clear()  # 无法续传，监听建立前的写入可能已错过
+                    self._set_streaming(True)
+                    while not self._stopped.is_set():
+                        change = stream.try_next()
+                        if change is not None:
+                            self._apply(change)
+                        self._resume_token = stream.resume_token
+            except OperationFailure as e:
+                self._set_streaming(False)
+                if e.code in self._UNSUPPORTED_CODES:
+                    print(f"Change streams unavailable, falling back to short local TTL: {e}")
+                    return
+                if e.code in self._HISTORY_LOST_CODES:
+                    self._resume_token = None
+                self._stopped.wait(self._retry_interval)
+            except PyMongoError as e:
+                self._set_streaming(False)
+                print(f"Change stream interrupted, resuming: {e}")
+                self._stopped.wait(self._retry_interval)
+
+    def _apply(self, change):
+        key = change["documentKey"]["_id"]
+        if self._local_cache is not None:
+            self._local_cache.delete(key)
+        if self._negative_filter is not None and change["operationType"] != "delete":
+            self._negative_filter.add(key)  # 块文档的 _id 也会加入，只是略微抬高误判率
+
+    def _set_streaming(self, streaming: bool):
+        if self._local_cache is not None:
+            self._local_cache.streaming = streaming
@@ -0,0 +1,104 @@
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+
+class LockTimeout(RuntimeError):
+    pass
+
+
+class MongoLock:
+    """
+    基于单个文档的租约锁：
+    - 获取：一次 findOneAndUpdate，仅当锁空闲或租约已过期时写入持有者并递增 token，锁被占用时 upsert 触发唯一键冲突；
+    - 续约：持有期间心跳线程每 1/3 租约续一次，续约失败（已被他人接管）时标记 lost；
+    - 释放：仅当持有者和 token 都匹配时才清空持有者；
+    - 等待：指数退避加随机抖动，上限 max_backoff 秒。
+    """
+
+    def __init__(self, collection, name: str, lease, blocking: bool = True, timeout: float = None,
+                 max_backoff: float = 1.0):
+        self._collection = collection
+        self.name = name
+        self._lease = timedelta(seconds=lease.total_seconds())
+        self._blocking = blocking
+        self._timeout = timeout
+        self._max_backoff = max_backoff
+        self._owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        self._heartbeat = None
+        self._stopped = threading.Event()
+        self.token = None
+        self.lost = False
+
+    def _try_acquire(self) -> bool:
+        now = datetime.utcnow()
+        try:
+            document = self._collection.find_one_and_update(
+                {"_id": self.name, "$or": [{"owner": None}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"owner": self._owner, "expires_at": now + self._lease}, "$inc": {"token": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:  # 锁被占用且租约未过期，upsert 插入与已有文档冲突
+            return False
+        self.token = document["token"]
+        return True
+
+    def acquire(self) -> int:
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        backoff = 0.01
+        while not self._try_acquire():
+            if not self._blocking or (deadline is not None and time.monotonic() >= deadline):
+                raise LockTimeout(f"Failed to acquire lock {self.name!r}.")
+            delay = random.uniform(0, backoff)
+            if deadline is not None:
+                delay = min(delay, max(deadline - time.monotonic(), 0))
+            time.sleep(delay)
+            backoff = min(backoff * 2, self._max_backoff)
+
+        self.lost = False
+        self._stopped.clear()
+        self._heartbeat = threading.Thread(target=self._renew_loop, name=f"mongo-lock-{self.name}", daemon=True)
+        self._heartbeat.start()
+        return self.token
+
+    def _renew_loop(self):
+        interval = self._lease.total_seconds() / 3
+        while not self._stopped.wait(interval):
+            try:
+                result = self._collection.update_one(
+                    {"_id": self.name, "owner": self._owner, "token": self.token},
+                    {"$set": {"expires_at": datetime.utcnow() + self._lease}},
+                )
+            except PyMongoError as e:
+                print(f"Error renewing lock {self.name!r}: {e}")  # 租约到期前还有机会重试
+                continue
+            if result.matched_count == 0:
+                self.lost = True
+                return
+
+    def release(self) -> bool:
+        """返回 False 表示租约在释放前已丢失"""
+        self._stopped.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        result = self._collection.update_one(
+            {"_id": self.name, "owner": self._owner, "token": self.token},
+            {"$set": {"owner": None, "expires_at": None}},
+        )
+        return result.matched_count == 1
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
@@ -0,0 +1,84 @@
+import re
+import time
+from typing import Dict, List, Optional, Set
+
+from pymongo import ReturnDocument
+
+from .registry import ProcessShared
+
+
+class NamespaceVersions(ProcessShared):
+    """
+    命名空间版本号：键所属命名空间为匹配的前缀加上其后到下一个分隔符为止的一段，
+    如前缀 "repo:" 下 "repo:42:branch:main" 的命名空间为 "repo:42"。
+
+    版本号为 0（从未失效）时键不变，兼容已有数据；大于 0 时在键末尾追加 @ns{版本}，
+    后缀放在末尾，iter_keys 的前缀扫描不受影响；TTL / 持久性规则按去掉后缀的键匹配。
+    版本号存放在 MongoDB，进程内缓存 cache_ttl 秒。
+    """
+    _SUFFIX = re.compile(r"@ns\d+$")
+
+    def __init__(self, prefixes: List[str], separator: str = ":", cache_ttl: float = 5):
+        self._prefixes = sorted(prefixes, key=len, reverse=True)  # 最长前缀优先
+        self._separator = separator
+        self._cache_ttl = cache_ttl
+        self._versions: Dict[str, tuple] = {}  # 命名空间 -> (版本号, 读取时刻)
+
+    @classmethod
+    def logical(cls, key: str) -> str:
+        """存储键去掉版本后缀，即调用方传入的键"""
+        return cls._SUFFIX.sub("", key)
+
+    def namespace(self, key: str) -> Optional[str]:
+        for prefix in self._prefixes:
+            if key.startswith(prefix):
+                end = key.find(self._separator, len(prefix))
+                return key if end == -1 else key[:end]
+        return None
+
+    def versioned(self, key: str, collection) -> str:
+        key = self.logical(key)  # 已带版本后缀的键（如刷新调度器回写的键）按当前版本重新生成
+        namespace = self.namespace(key)
+        if namespace is None:
+            return key
+        version = self.version(namespace, collection)
+        return f"{key}@ns{version}" if version else key
+
+    def version(self, namespace: str, collection) -> int:
+        cached = self._versions.get(namespace)
+        if cached is not None and time.monotonic() - cached[1] < self._cache_ttl:
+            return cached[0]
+        document = collection.find_one({"_id": namespace})
+        version = document["version"] if document is not None else 0
+        self._versions[namespace] = (version, time.monotonic())
+        return version
+
+    def stale(self, keys) -> Set[str]:
+        """keys 所属命名空间中版本号未缓存或缓存已过期（需要访问 MongoDB）的命名空间"""
+        now = time.monotonic()
+        stale = set()
+        for key in keys:
+            namespace = self.namespace(self.logical(key))
+            if namespace is None:
+                continue
+            cached = self._versions.get(namespace)
+            if cached is None or now - cached[1] >= self._cache_ttl:
+                stale.add(namespace)
+        return stale
+
+    def prefetch(self, keys, collection):
+        """批量操作前用一次 $in 取回缓存已过期的命名空间版本号"""
+        now = time.monotonic()
+        stale = dict.fromkeys(self.stale(keys), 0)
+        if not stale:
+            return
+        for document in collection.find({"_id": {"$in": list(stale)}}):
+            stale[document["_id"]] = document["version"]
+        for namespace, version in stale.items():
+            self._versions[namespace] = (version, now)
+
+    def bump(self, namespace: str, collection) -> int:
+        document = collection.find_one_and_update(
+            {"_id": namespace}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER)
+        self._versions[namespace] = (document["version"], time.monotonic())
+        return document["version"]
@@ -0,0 +1,163 @@
+import hashlib
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from pymongo.errors import PyMongoError
+
+from .registry import ProcessShared
+
+
+class NegativeLookupFilter(ProcessShared):
+    """
+    进程内的 Bloom filter，记录集合中存在的键，用于在本地确定“一定不存在”的键。
+
+    - 构建：后台线程流式扫描当前集合的头文档，记录存储键（含命名空间版本后缀），容量按集合文档数估算；
+      构建完成前不做任何过滤；
+    - 更新：本进程写入的键立即加入；其他进程的写入通过 change stream 加入，change stream 不可用时
+      （如单机 mongod）要等到下次定期重建才会加入，期间这些键的 get 返回未命中，即读到的是过时的“不存在”；
+      add、incr 等依据是否存在决定写入的操作，以及读自己写入的持久性档位，都绕过过滤器；
+    - 删除：Bloom filter 不支持删除，已删除或过期的键只是变成误判，定期重建时清除；
+    - 重建期间的写入同时加入新旧两个过滤器，切换时不会丢键；键在写入落库之前就加入过滤器，
+      最近 recent_window 秒内加入的键在重建开始时补进新过滤器，扫描没赶上的写入也不会丢。
+    """
+
+    def __init__(self, fp_rate: float = 0.01, rebuild_interval: float = 600, min_capacity: int = 100000,
+                 growth: float = 1.5, batch_size: int = 5000, recent_window: float = 60):
+        self._fp_rate = fp_rate
+        self._rebuild_interval = rebuild_interval
+        self._min_capacity = min_capacity
+        self._growth = growth  # 容量按当前文档数预留的增长空间
+        self._batch_size = batch_size
+        self._recent_window = recent_window
+
+        self._lock = threading.Lock()
+        self._recent: "deque[tuple]" = deque()  # (加入时刻, 键)，只保留 recent_window 秒内的
+        self._backend = None
+        self._source = None  # 过滤器对应的集合名，代际切换后需要重建
+        self._bloom: Optional["_BloomBits"] = None
+        self._building: Optional["_BloomBits"] = None
+        self._rebuild = threading.Event()
+        self._thread = None
+        self._filtered = 0
+        self._false_positives = 0
+
+    def attach(self, backend, collection_name: str):
+        """绑定（或在代际切换后重新绑定）集合，首次调用时启动后台线程"""
+        with self._lock:
+            self._backend = backend
+            if collection_name != self._source:
+                self._source = collection_name
+                self._bloom = None  # 旧集合的过滤器作废，新的建好之前不做过滤
+                self._rebuild.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="mongo-cache-negative-filter", daemon=True)
+                self._thread.start()
+
+    def might_contain(self, key: str, collection_name: str) -> bool:
+        bloom = self._bloom
+        if bloom is None or collection_name != self._source:
+            return True
+        if key in bloom:
+            return True
+        self._filtered += 1
+        return False
+
+    def add(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            for bloom in (self._bloom, self._building):
+                if bloom is not None:
+                    bloom.add(key)
+            self._recent.append((now, key))
+            while self._recent[0][0] < now - self._recent_window:
+                self._recent.popleft()
+
+    def record_false_positive(self):
+        if self._bloom is not None:
+            self._false_positives += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """估算误判率按当前条目数计算；observed_fp_rate 为放行到 MongoDB 后未命中的比例"""
+        bloom = self._bloom
+        passed_misses = self._false_positives + self._filtered
+        return {
+            "ready": bloom is not None,
+            "entries": bloom.count if bloom is not None else 0,
+            "capacity": bloom.capacity if bloom is not None else 0,
+            "bytes": len(bloom.bits) if bloom is not None else 0,
+            "estimated_fp_rate": bloom.estimated_fp_rate() if bloom is not None else None,
+            "filtered": self._filtered,
+            "false_positives": self._false_positives,
+            "observed_fp_rate": self._false_positives / passed_misses if passed_misses else None,
+        }
+
+    def rebuild(self):
+        backend = self._backend
+        source = self._source
+        collection = backend.collection
+        capacity = max(self._min_capacity, int(collection.estimated_document_count() * self._growth))
+        building = _BloomBits(capacity, self._fp_rate)
+        with self._lock:
+            self._building = building
+            for _, key in self._recent:  # 已加入过滤器但写入可能还没落库，扫描会漏掉
+                building.add(key)
+        try:
+            # 读路径按存储键查过滤器，不能用 iter_keys（返回去掉命名空间版本后缀的键）
+            for _, heads in backend._iter_head_batches(None, self._batch_size, 1):
+                for head in heads:
+                    building.add(head["_id"])
+        except PyMongoError:
+            with self._lock:
+                self._building = None
+            raise
+        with self._lock:  # 与 add 互斥，切换瞬间的写入不会只进入旧过滤器
+            self._building = None
+            if self._source == source:  # 扫描期间发生代际切换则丢弃本次结果
+                self._bloom = building
+                self._false_positives = self._filtered = 0
+
+    def _run(self):
+        while True:
+            self._rebuild.wait(self._rebuild_interval)
+            self._rebuild.clear()
+            try:
+                self.rebuild()
+            except PyMongoError as e:
+                print(f"Error rebuilding negative lookup filter: {e}")
+                self._rebuild.wait(10)
+
+
+class _BloomBits:
+    """按期望条目数和误判率计算位数与哈希个数，用 blake2b 的两段 64 位做双重哈希"""
+
+    def __init__(self, capacity: int, fp_rate: float):
+        self.capacity = capacity
+        size = max(8, int(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.bits = bytearray((size + 7) // 8)
+        self._size = len(self.bits) * 8
+        self._hashes = max(1, round(self._size / capacity * math.log(2)))
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self._size for i in range(self._hashes)]
+
+    def add(self, key: str):
+        positions = self._positions(key)
+        with self._lock:  # |= 是读改写，并发写同一字节会丢位
+            for position in positions:
+                self.bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def estimated_fp_rate(self) -> float:
+        return (1 - math.exp(-self._hashes * self.count / self._size)) ** self._hashes
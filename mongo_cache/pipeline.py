@@ -0,0 +1,311 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from pymongo import DeleteMany, UpdateMany
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from .dedup import BlobStore
+from .tracing import TraceRecorder
+
+
+class CachePipeline:
+    """
+    混合操作流水线。入队时不访问 MongoDB，execute 时：
+    1. 需要旧值的键（get/add/incr/touch/delete）用一次 $in 同时取回头文档和 0 号块，单块值无需再查；
+    2. 在内存中按入队顺序模拟各操作得到结果，同一个键的多次写入折叠为最终状态；
+    3. 所有写入合并为一次无序 bulk_write。
+    incr/decr 的键不存在时在写入前抛出 ValueError，此时不会写入任何数据。
+    """
+    _MISSING = object()
+    _PRESENT = object()  # 只取了头文档，已知存在但未取值
+
+    def __init__(self, backend, durability: Optional[str] = None):
+        self._backend = backend
+        self._durability = durability  # 持久性档位，None 时按键模式规则选择
+        self._commands: List[tuple] = []
+        self._sizes: Dict[str, int] = {}  # 读到的值大小，供访问轨迹记录
+        self.results: List[Any] = []
+
+    def get(self, key, default=None, version=None):
+        self._commands.append(("get", self._backend.make_key(key, version), default))
+        return self
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._commands.append(("set", self._backend.make_key(key, version), (value, timeout)))
+        return self
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._commands.append(("add", self._backend.make_key(key, version), (value, timeout)))
+        return self
+
+    def delete(self, key, version=None):
+        self._commands.append(("delete", self._backend.make_key(key, version), None))
+        return self
+
+    def incr(self, key, delta=1, version=None):
+        self._commands.append(("incr", self._backend.make_key(key, version), delta))
+        return self
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version)  # incr 中再转换键
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._commands.append(("touch", self._backend.make_key(key, version), timeout))
+        return self
+
+    def __len__(self):
+        return len(self._commands)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.execute()
+        return False
+
+    def execute(self) -> List[Any]:
+        commands, self._commands = self._commands, []
+        backend = self._backend
+        if not commands:
+            self.results = []
+            return self.results
+        if not backend._breaker.allow():
+            self.results = self._failed_results(commands)
+            return self.results
+
+        try:
+            with backend._read_budget():
+                state, heads = self._load(self._read_plan(commands), self._filterable(commands))
+            self.results, final = self._simulate(commands, state, heads)
+            self._write(final, heads)
+        except PyMongoError as e:
+            if isinstance(e, BulkWriteError):
+                backend._breaker.record_success()  # 服务端已应答，只是个别文档写入失败
+            else:
+                backend._breaker.record_failure()
+            print(f"Error during pipeline: {e}")
+            self.results = self._failed_results(commands)
+            return self.results
+        finally:
+            backend._breaker.release()  # incr 的 ValueError 等未记录结果的退出
+        backend._breaker.record_success()
+
+        tracer = backend._tracer
+        for (op, key, args), result in zip(commands, self.results):
+            if op == "get" and result is not None:
+                backend._record_read(key)
+            if tracer is None:
+                continue
+            if op == "get":
+                tracer.record(TraceRecorder.GET, key, self._sizes.get(key, 0) if result is not args else 0)
+            elif op in ("delete", "touch"):
+                tracer.record(TraceRecorder.DELETE if op == "delete" else TraceRecorder.TOUCH, key)
+        self._sizes = {}
+        return self.results
+
+    @staticmethod
+    def _failed_results(commands):
+        return [args if op == "get" else False for op, _, args in commands]
+
+    def _read_plan(self, commands) -> Dict[str, bool]:
+        """
+        返回需要读取的键 {键: 是否需要值}。键的第一个写操作之前的读才依赖库中状态：
+        第一个操作是 set 的键无需读取，delete 只需头文档判断是否存在；分桶模式下 touch 会改写到新桶，需要取值。
+        """
+        value_ops = ("get", "add", "incr") + (("touch",) if self._backend._bucket_seconds is not None else ())
+        plan: Dict[str, bool] = {}
+        determined = set()
+        for op, key, _ in commands:
+            if key in determined:
+                continue
+            if op in ("set", "delete"):
+                determined.add(key)
+                if op == "delete":
+                    plan.setdefault(key, False)
+                continue
+            plan[key] = plan.get(key, False) or op in value_ops
+        return plan
+
+    @staticmethod
+    def _filterable(commands):
+        """只有 get 的键才使用不存在过滤器：add / incr / delete / touch 依据是否存在决定写入，误判会写错"""
+        reads = {key for op, key, _ in commands if op == "get"}
+        return reads - {key for op, key, _ in commands if op != "get"}
+
+    def _load(self, plan: Dict[str, bool], filterable):
+        """返回 ({键: 值 / _PRESENT / _MISSING}, {键: 头文档})；filterable 为可以使用不存在过滤器的键"""
+        backend = self._backend
+        state: Dict[str, Any] = {}
+        heads: Dict[str, dict] = {}
+        pending = []
+        negative_filter = backend._negative_filter
+        collection_name = backend.collection.name if negative_filter is not None else None
+        durability = backend._durability
+        read_profile = None  # 有需要读自己写入的键时，整次 $in 查询都读主节点
+        for key, need_value in plan.items():
+            profile = durability.resolve(key, self._durability)
+            use_filter = key in filterable
+            if durability.reads_own_writes(profile):
+                read_profile = profile
+                need_value = use_filter = False  # 不使用 L1 和不存在过滤器
+            hit = backend._l1.get(key) if need_value and backend._l1 is not None else None
+            if hit is not None:
+                state[key] = backend._decode(*hit)
+                self._sizes[key] = len(hit[0])
+            elif use_filter and negative_filter is not None and not negative_filter.might_contain(key, collection_name):
+                state[key] = self._MISSING
+            else:
+                pending.append(key)
+        if not pending:
+            return state, heads
+
+        sequence = backend._l1.sequence if backend._l1 is not None else None
+        now = datetime.utcnow()
+        for collection in backend._candidate_collections(durability.apply(backend.collection, read_profile)):
+            ids = []
+            for key in pending:
+                if key not in heads:
+                    ids.append(key)
+                    if plan[key]:
+                        ids.append(f"{key}_chunk_0")
+            if not ids:
+                break
+            documents = {document["_id"]: document for document in collection.find({"_id": {"$in": ids}})}
+
+            for key in pending:
+                head = documents.get(key)
+                if key in heads or head is None:
+                    continue
+                heads[key] = head
+                if head.get("expires_at") is not None and head["expires_at"] <= now:
+                    state[key] = self._MISSING
+                    continue
+                if not plan[key]:
+                    state[key] = self._PRESENT
+                    continue
+
+                if head["chunks"] == 1 and head.get("blob") is None:
+                    chunk = documents.get(f"{key}_chunk_0")
+                    data = None
+                    if chunk is not None and chunk.get("write_id") == head.get("write_id"):
+                        data = chunk["value"]
+                else:
+                    data = backend._assemble_value(key, head, collection)
+                if data is None or len(data) != head["length"]:
+                    state[key] = self._MISSING  # 读取期间被并发重写，按未命中处理
+                    continue
+                if backend._l1 is not None:
+                    backend._l1.set(key, (data, head.get("encoding")), head.get("expires_at"), sequence)
+                state[key] = backend._decode(data, head.get("encoding"))
+                self._sizes[key] = head["length"]
+
+        for key in pending:
+            state.setdefault(key, self._MISSING)
+        return state, heads
+
+    def _simulate(self, commands, state, heads):
+        """按入队顺序计算结果，返回 (结果列表, {键: 最终写操作})"""
+        results = []
+        final: Dict[str, tuple] = {}
+        for op, key, args in commands:
+            current = state.get(key, self._MISSING)
+            if op == "get":
+                results.append(args if current is self._MISSING else current)
+            elif op == "set" or (op == "add" and current is self._MISSING):
+                state[key] = args[0]
+                final[key] = ("set",) + args
+                results.append(True)
+            elif op == "add":
+                results.append(False)
+            elif op == "delete":
+                state[key] = self._MISSING
+                final[key] = ("delete",)
+                results.append(current is not self._MISSING)
+            elif op == "incr":
+                if current is self._MISSING:
+                    raise ValueError("Key '%s' not found" % key)
+                state[key] = current + args
+                final[key] = ("set", state[key], DEFAULT_TIMEOUT)
+                results.append(state[key])
+            elif op == "touch":
+                if current is self._MISSING:
+                    results.append(False)
+                    continue
+                if key in final and final[key][0] == "set":
+                    final[key] = ("set", final[key][1], args)
+                elif key in heads and self._backend._bucket_seconds is None:
+                    final[key] = ("touch", args)
+                else:
+                    final[key] = ("set", current, args)  # 分桶模式需改写到新过期时间对应的桶；值来自 L1 时也没有头文档
+                results.append(True)
+        return results, final
+
+    def _write(self, final: Dict[str, tuple], heads: Dict[str, dict]):
+        # write concern 按命令生效，不同持久性档位的键各写一次
+        for profile, profile_final in self._backend._durability.split(final, self._durability).items():
+            self._write_profile(profile_final, heads, profile)
+
+    def _write_profile(self, final: Dict[str, tuple], heads: Dict[str, dict], durability: Optional[str]):
+        backend = self._backend
+        grouped: Dict[Optional[int], Dict] = {}
+        by_timeout: Dict[Any, Dict[str, Any]] = {}
+        deleted = []
+        main_operations = []
+        touched_blobs: Dict[str, tuple] = {}
+        for key, action in final.items():
+            if action[0] == "set":
+                by_timeout.setdefault(action[2], {})[key] = action[1]
+            elif action[0] == "delete":
+                deleted.append(key)
+            else:
+                main_operations.append(self._touch_operation(key, action[1], heads[key], touched_blobs))
+
+        for timeout, data in by_timeout.items():
+            for bucket_id, group in backend._build_operations(data, timeout).items():
+                merged = grouped.setdefault(bucket_id, {"keys": [], "chunks": [], "operations": [], "cleanup": [],
+                                                        "blobs": {}, "files": {}})
+                merged["keys"].extend(group["keys"])
+                merged["chunks"].extend(group["chunks"])
+                merged["operations"].extend(group["operations"])
+                merged["cleanup"].extend(group["cleanup"])
+                BlobStore.merge(merged["blobs"], group.get("blobs"))
+                merged["files"].update(group.get("files") or {})
+
+        delete_operation = None
+        if deleted:
+            # 头文档和块文档一次删除：$in 中可以直接放正则，且各键互不影响（不会误删以该键为前缀的其他键）
+            patterns = [backend._documents_pattern(key) for key in deleted]
+            delete_operation = DeleteMany({"_id": {"$in": patterns}})
+            main_operations.append(delete_operation)
+        if main_operations:
+            grouped.setdefault(None, {"keys": [], "operations": []})["operations"].extend(main_operations)
+
+        backend._forget_local(final)
+        if touched_blobs:  # blob 先于引用它的头文档延长，头文档不会指向已过期的 blob
+            backend._blob_store.extend(touched_blobs, backend._durability.apply(backend.blob_collection, durability))
+        if grouped:
+            backend._write_operations(grouped, ordered=False, durability=durability)
+        if delete_operation is not None and backend._bucket_seconds is not None:
+            database = backend.collection.database
+            for bucket_id in backend._live_buckets():
+                backend._durability.apply(database[backend._bucket_name(bucket_id)], durability).bulk_write(
+                    [delete_operation])
+
+    def _touch_operation(self, key, timeout, head, touched_blobs: Dict[str, tuple]):
+        """只改过期时间，不重写值：头文档和各块一起更新；去重条目引用的 blob 记入 touched_blobs {哈希: (长度, 过期时间)}"""
+        backend = self._backend
+        seconds = backend._resolve_timeout(key, timeout)
+        expires_at = datetime.utcnow() + timedelta(seconds=seconds) if seconds is not None else None
+        scheduler = backend.refresh_scheduler
+        if scheduler is not None and expires_at is not None:
+            scheduler.schedule(key, expires_at)
+        digest = head.get("blob")
+        if digest is not None:
+            blob_expires_at = expires_at or BlobStore.NEVER
+            if digest in touched_blobs:
+                blob_expires_at = max(blob_expires_at, touched_blobs[digest][1])
+            touched_blobs[digest] = (head["length"], blob_expires_at)
+        ids = [key] + [f"{key}_chunk_{i}" for i in range(head["chunks"])]
+        return UpdateMany({"_id": {"$in": ids}}, {"$set": {"expires_at": expires_at}})
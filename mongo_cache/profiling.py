@@ -0,0 +1,188 @@
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict
+
+from bson import BSON
+from pymongo import MongoClient, monitoring
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+class CommandProfiler(monitoring.CommandListener):
+    """
+    pymongo 命令监听器，由 MongoDBConnectionFactory 在创建连接池时注册。
+
+    - 按 (命令名, 命名空间, 查询形状) 汇总次数、失败数、耗时、返回文档数和应答字节数，
+      查询形状保留字段名和操作符，值一律替换为 "?"，如 {"_id": {"$regex": "?"}}；
+    - 耗时超过 slow_threshold 的命令打印出来，并按 explain_sample_rate 抽样，
+      在后台线程以 executionStats 执行 explain，记录扫描的文档数/索引键数与返回数之比及执行计划；
+    - 应答字节数需要重新编码一次应答，仅用于排查问题时开启。
+    """
+    _IGNORED = ("explain", "hello", "ismaster", "isMaster", "ping", "buildInfo", "endSessions",
+                "saslStart", "saslContinue", "killCursors")
+    _EXPLAINABLE = ("find", "count", "distinct", "aggregate", "delete", "update", "findAndModify")
+    _FILTER_FIELDS = {"find": "filter", "count": "query", "distinct": "query",
+                      "findAndModify": "query", "aggregate": "pipeline"}
+    _SESSION_FIELDS = ("lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "writeConcern")
+
+    def __init__(self, slow_threshold: float = 0.1, explain_sample_rate: float = 0, explain_interval: float = 300):
+        self._slow_threshold = slow_threshold
+        self._explain_sample_rate = explain_sample_rate
+        self._explain_interval = explain_interval
+        self._client = None
+        self._lock = threading.Lock()
+        self._pending: Dict[tuple, tuple] = {}  # (连接, request_id) -> (命令名, 库名, 命名空间, 命令)
+        self._stats: Dict[tuple, Dict[str, Any]] = {}
+        self._explained_at: Dict[tuple, float] = {}
+        self._explain_queue = None
+
+    def bind(self, client: MongoClient):
+        self._client = client
+
+    def stats(self) -> Dict[tuple, Dict[str, Any]]:
+        """返回 {(命令名, 命名空间, 查询形状): 汇总} 的快照"""
+        with self._lock:
+            return {shape: dict(entry) for shape, entry in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._explained_at.clear()
+
+    def started(self, event):
+        if event.command_name in self._IGNORED:
+            return
+        command = event.command
+        collection = command.get("collection") if event.command_name == "getMore" else command.get(event.command_name)
+        namespace = f"{event.database_name}.{collection}"
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                event.command_name, event.database_name, namespace, command)
+
+    def succeeded(self, event):
+        self._finish(event, event.reply)
+
+    def failed(self, event):
+        self._finish(event, None)
+
+    def _finish(self, event, reply):
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        name, database_name, namespace, command = pending
+        seconds = event.duration_micros / 1e6
+        shape = self._command_shape(name, command)
+        returned = self._returned(reply) if reply is not None else 0
+        reply_bytes = len(BSON.encode(reply)) if reply is not None else 0
+
+        stats_key = (name, namespace, shape)
+        with self._lock:
+            entry = self._stats.setdefault(stats_key, {
+                "count": 0, "failures": 0, "total_time": 0.0, "max_time": 0.0,
+                "docs_returned": 0, "reply_bytes": 0, "explain": None,
+            })
+            entry["count"] += 1
+            entry["failures"] += reply is None
+            entry["total_time"] += seconds
+            entry["max_time"] = max(entry["max_time"], seconds)
+            entry["docs_returned"] += returned
+            entry["reply_bytes"] += reply_bytes
+
+        if seconds < self._slow_threshold:
+            return
+        logger.warning("Slow MongoDB command %s on %s: %.1f ms, shape=%s, returned=%s, reply=%s bytes",
+                       name, namespace, seconds * 1000, shape, returned, reply_bytes)
+        if name in self._EXPLAINABLE and self._should_explain(stats_key):
+            self._submit_explain(stats_key, database_name, command)
+
+    @classmethod
+    def _command_shape(cls, name, command) -> str:
+        if name in ("delete", "update"):
+            statements = command.get(name + "s") or [{}]  # 批量写只取第一条语句的形状
+            spec = statements[0].get("q", {})
+        else:
+            spec = command.get(cls._FILTER_FIELDS.get(name, ""), {})
+        return json.dumps(cls._normalize(spec))
+
+    @classmethod
+    def _normalize(cls, value):
+        if isinstance(value, dict):
+            return {key: cls._normalize(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [cls._normalize(value[0])] if value else []  # $in 等数组只保留一个元素的形状
+        return "?"
+
+    @staticmethod
+    def _returned(reply) -> int:
+        cursor = reply.get("cursor")
+        if cursor is not None:
+            return len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+        return reply.get("n", 0)
+
+    def _should_explain(self, stats_key) -> bool:
+        if self._client is None or random.random() >= self._explain_sample_rate:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            last = self._explained_at.get(stats_key)
+            if last is not None and now - last < self._explain_interval:
+                return False
+            self._explained_at[stats_key] = now
+        return True
+
+    def _submit_explain(self, stats_key, database_name, command):
+        """
+        explain 在后台线程执行：监听回调在发起命令的线程上同步运行，在回调里发命令会直接拖慢该请求。
+        队列满时直接丢弃。
+        """
+        if self._explain_queue is None:
+            with self._lock:
+                if self._explain_queue is None:
+                    self._explain_queue = queue.Queue(maxsize=16)
+                    threading.Thread(target=self._explain_loop, name="mongo-cache-explain", daemon=True).start()
+        try:
+            self._explain_queue.put_nowait((stats_key, database_name, command))
+        except queue.Full:
+            pass
+
+    def _explain_loop(self):
+        while True:
+            stats_key, database_name, command = self._explain_queue.get()
+            explainable = {key: value for key, value in command.items() if key not in self._SESSION_FIELDS}
+            for field in ("deletes", "updates"):
+                if field in explainable:
+                    explainable[field] = explainable[field][:1]  # explain 只支持单条写语句
+            try:
+                result = self._client[database_name].command(
+                    {"explain": explainable, "verbosity": "executionStats"})
+            except PyMongoError as e:
+                logger.warning("Error during explain: %s", e)
+                continue
+
+            execution = result.get("executionStats", {})
+            summary = {
+                "plan": self._plan_stages(result.get("queryPlanner", {}).get("winningPlan", {})),
+                "docs_examined": execution.get("totalDocsExamined"),
+                "keys_examined": execution.get("totalKeysExamined"),
+                "returned": execution.get("nReturned"),
+            }
+            with self._lock:
+                if stats_key in self._stats:
+                    self._stats[stats_key]["explain"] = summary
+            name, namespace, shape = stats_key
+            logger.info("Explain %s on %s shape=%s: %s", name, namespace, shape, summary)
+
+    @staticmethod
+    def _plan_stages(plan) -> str:
+        """把执行计划压成 "DELETE <- FETCH <- IXSCAN" 形式"""
+        stages = []
+        while plan:
+            stages.append(plan.get("stage", "?"))
+            plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+        return " <- ".join(stages)
@@ -0,0 +1,120 @@
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from .time_config import TimeConfig
+
+
+class RefreshScheduler:
+    """
+    按过期时间主动刷新缓存，取代每日全量刷新的定时任务：
+
+        scheduler = RefreshScheduler(cache, lead_time=TimeConfig(minutes=30))
+        scheduler.register_loader("branch:", load_branch_infos)  # loader(keys) -> {key: value}
+        scheduler.start()
+
+    匹配已注册前缀的键在写入时按 expires_at 放入最小堆，到达 expires_at - lead_time 时：
+    - 自上次刷新以来没有被读过的键直接放弃，任其自然过期；
+    - 其余键按 loader 分组、分批调用 loader，结果经 set_many 批量写回（写回时会按新的过期时间重新入堆），
+      并发批次数受 max_workers 限制。
+    """
+
+    def __init__(self, backend, lead_time=None, max_workers: int = 4, batch_size: int = 500,
+                 durability: Optional[str] = "fast"):
+        self._backend = backend
+        self._durability = durability  # 刷新的值随时可以重新生成，默认使用轻量的写确认
+        self._lead = timedelta(seconds=(lead_time or TimeConfig(minutes=10)).total_seconds())
+        self._max_workers = max_workers
+        self._batch_size = batch_size
+        self._loaders = []  # (前缀, loader)，按前缀长度降序，最长前缀优先
+        self._heap = []  # (refresh_at, key)，键被重新调度后旧条目留在堆中，弹出时与 _scheduled 比对后丢弃
+        self._scheduled: Dict[str, datetime] = {}
+        self._read_since_refresh: Set[str] = set()  # 上次刷新后被读过的键，只刷新仍有人读的键
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def register_loader(self, prefix: str, loader):
+        with self._condition:
+            self._loaders.append((prefix, loader))
+            self._loaders.sort(key=lambda item: len(item[0]), reverse=True)
+
+    def _loader_for(self, key):
+        for prefix, loader in self._loaders:
+            if key.startswith(prefix):
+                return loader
+        return None
+
+    def schedule(self, key: str, expires_at: datetime):
+        if self._loader_for(key) is None:
+            return
+        refresh_at = expires_at - self._lead
+        with self._condition:
+            self._scheduled[key] = refresh_at
+            heapq.heappush(self._heap, (refresh_at, key))
+            if self._heap[0][1] == key:
+                self._condition.notify()  # 新的最早刷新时间，唤醒调度线程重新计算等待时长
+
+    def mark_read(self, key: str):
+        if key in self._scheduled:
+            self._read_since_refresh.add(key)
+
+    def start(self):
+        """注册到后端并启动调度线程，同一进程同一缓存集合只需启动一个"""
+        self._backend._refresh_schedulers[self._backend._health_key] = self
+        self._thread = threading.Thread(target=self._run, name="mongo-cache-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._backend._refresh_schedulers.pop(self._backend._health_key, None)
+
+    def _pop_due(self):
+        """等待到最早的刷新时间，返回所有已到期且近期被读过的键"""
+        with self._condition:
+            while not self._stopped:
+                now = datetime.utcnow()
+                if self._heap and self._heap[0][0] <= now:
+                    break
+                timeout = (self._heap[0][0] - now).total_seconds() if self._heap else None
+                self._condition.wait(timeout)
+            if self._stopped:
+                return []
+
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                refresh_at, key = heapq.heappop(self._heap)
+                if self._scheduled.get(key) != refresh_at:
+                    continue  # 已被重新调度的旧条目
+                del self._scheduled[key]
+                if key in self._read_since_refresh:
+                    self._read_since_refresh.discard(key)
+                    due.append(key)
+            return due
+
+    def _run(self):
+        with ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="mongo-cache-refresh") as executor:
+            while not self._stopped:
+                due = self._pop_due()
+                groups: Dict[Any, List[str]] = {}
+                for key in due:
+                    groups.setdefault(self._loader_for(key), []).append(key)
+
+                futures = []
+                for loader, keys in groups.items():
+                    for i in range(0, len(keys), self._batch_size):
+                        futures.append(executor.submit(self._refresh, loader, keys[i:i + self._batch_size]))
+                for future in futures:  # 等本轮完成再取下一轮，写入速率受 max_workers 约束
+                    future.result()
+
+    def _refresh(self, loader, keys):
+        try:
+            values = loader(keys)
+            if values:
+                self._backend.set_many(values, durability=self._durability)
+        except Exception as e:
+            print(f"Error refreshing {len(keys)} keys: {e}")
@@ -0,0 +1,23 @@
+import threading
+from typing import Any, Dict
+
+
+class ProcessShared:
+    """
+    进程内按名字共享的组件：同一 LOCATION + 集合的多个后端实例（Django 每个请求都会新建）
+    通过 for_backend 拿到同一个实例，共用后台线程和统计。每个子类各自一张注册表。
+    """
+    _instances: Dict[str, Any] = {}
+    _registry_lock = threading.Lock()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._instances = {}
+        cls._registry_lock = threading.Lock()
+
+    @classmethod
+    def for_backend(cls, name: str, **kwargs):
+        with cls._registry_lock:
+            if name not in cls._instances:
+                cls._instances[name] = cls(**kwargs)
+            return cls._instances[name]
@@ -0,0 +1,62 @@
+import contextvars
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.module_loading import import_string
+
+
+# 当前作用域的记忆 {缓存标识: {键: (值, 编码) 或 None}}，None 表示不在作用域内
+_memo_scope: contextvars.ContextVar = contextvars.ContextVar("mongo_cache_request_memo", default=None)
+
+
+@contextmanager
+def request_memo():
+    """
+    请求级读取记忆：作用域内对同一键的重复 get / get_many 只访问一次 MongoDB，未命中同样记住。
+
+    作用域基于 contextvars，每个请求、每个 asyncio 任务各自独立，作用域结束即丢弃，不需要 TTL。
+    作用域内经本进程的写入和删除会淘汰对应的记忆，之后的读取重新访问 MongoDB；
+    其他请求或进程在作用域期间的写入，本作用域内不可见。
+    """
+    token = _memo_scope.set({})
+    try:
+        yield
+    finally:
+        _memo_scope.reset(token)
+
+
+@sync_and_async_middleware
+def request_memo_middleware(get_response):
+    """
+    为每个请求开启 request_memo 作用域。缓存 options 中配置 REQUEST_PREFETCH 时，请求开始前用一次 get_many 预取：
+    值为键列表，或可调用对象（及其点分路径）request -> 键列表。
+    """
+    prefetches = []
+    for alias, config in settings.CACHES.items():
+        keys = config.get('options', {}).get('REQUEST_PREFETCH')  # 与后端一致，从 options 读取
+        if keys:
+            prefetches.append((alias, import_string(keys) if isinstance(keys, str) else keys))
+
+    def prefetch(request):
+        for alias, keys in prefetches:
+            try:
+                caches[alias].prefetch(keys(request) if callable(keys) else keys)
+            except Exception as e:  # 预取失败不影响请求，之后的读取照常访问 MongoDB
+                print(f"Error prefetching cache keys for {alias!r}: {e}")
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            with request_memo():
+                if prefetches:
+                    await sync_to_async(prefetch)(request)  # sync_to_async 沿用当前 contextvars
+                return await get_response(request)
+    else:
+        def middleware(request):
+            with request_memo():
+                if prefetches:
+                    prefetch(request)
+                return get_response(request)
+    return middleware
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+
+class CircuitBreaker:
+    """
+    连续失败达到阈值后熔断，熔断期间直接拒绝请求；冷却时间过后放行一个探测请求（半开），
+    探测成功则恢复，失败则重新熔断。
+    调用方在 finally 中调用 release：探测请求因非 MongoDB 异常（如序列化失败）退出、未记录结果时释放探测名额，
+    否则半开状态会一直占着名额；探测超过 reset_timeout 仍未结束时也会重新放行。
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._probe_owner = None  # 发出探测请求的线程
+        self._probe_started = None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at < self._reset_timeout:
+                return False
+            if self._probing and now - self._probe_started < self._reset_timeout:
+                return False
+            self._probing = True  # 半开，只放行一个探测请求
+            self._probe_owner = threading.get_ident()
+            self._probe_started = now
+            return True
+
+    def release(self):
+        """本线程的探测请求结束但没有记录成功或失败时，释放探测名额"""
+        with self._lock:
+            if self._probing and self._probe_owner == threading.get_ident():
+                self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self._failure_threshold:
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class LatencyTracker:
+    """保存最近若干次读取耗时，用于估算对冲读的触发延迟"""
+
+    def __init__(self, window: int = 1000, refresh_every: int = 100, min_samples: int = 20):
+        self._samples = deque(maxlen=window)
+        self._min_samples = min_samples
+        self._refresh_every = refresh_every
+        self._since_refresh = 0
+        self._cached: Dict[float, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self._since_refresh += 1
+            if self._since_refresh >= self._refresh_every:
+                self._cached.clear()  # 分位数按批量重新计算，避免每次读取都排序
+                self._since_refresh = 0
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if q not in self._cached:
+                if len(self._samples) < self._min_samples:
+                    return None
+                ordered = sorted(self._samples)
+                self._cached[q] = ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+            return self._cached[q]
@@ -0,0 +1,84 @@
+import json
+import pickle
+import struct
+from typing import Tuple
+
+from bson import BSON
+
+
+class FastSerializer:
+    """
+    按类型选择编码，dumps 返回 (一字节类型码, 载荷)：
+    - b: bytes 原样返回，零开销
+    - s: str，UTF-8
+    - i: 64 位范围内的 int，8 字节小端；超出范围的走 pickle
+    - p: 其他对象，pickle 协议 5
+    - o: 含大缓冲区（numpy 数组等通过 PickleBuffer 导出缓冲区）的对象，缓冲区走带外（out-of-band）存放在 pickle 流之前，
+         反序列化时直接切片引用，不再拷贝进 pickle 流
+    另兼容本层引入前写入的 "raw" / "bson" 数据。
+    """
+    BYTES, STR, INT, PICKLE, PICKLE_OOB, JSON = "b", "s", "i", "p", "o", "j"
+    _COUNT = struct.Struct("<I")
+    _LENGTH = struct.Struct("<Q")
+    _INT = struct.Struct("<q")
+
+    def dumps(self, value) -> Tuple[str, bytes]:
+        value_type = type(value)
+        if value_type is bytes:
+            return self.BYTES, value
+        if value_type is str:
+            return self.STR, value.encode()
+        if value_type is int and -2 ** 63 <= value < 2 ** 63:  # bool 是 int 的子类，type 判断可将其排除
+            return self.INT, self._INT.pack(value)
+        return self._dumps_object(value)
+
+    def _dumps_object(self, value) -> Tuple[str, bytes]:
+        buffers = []
+        stream = pickle.dumps(value, protocol=5, buffer_callback=buffers.append)
+        if not buffers:
+            return self.PICKLE, stream
+        raws = [buffer.raw() for buffer in buffers]
+        parts = [self._COUNT.pack(len(raws))]
+        parts.extend(self._LENGTH.pack(raw.nbytes) for raw in raws)
+        parts.extend(raws)
+        parts.append(stream)
+        return self.PICKLE_OOB, b"".join(parts)
+
+    def loads(self, code: str, data):
+        if code == self.BYTES or code == "raw":
+            return data
+        if code == self.STR:
+            return str(data, "utf-8")
+        if code == self.INT:
+            return self._INT.unpack(data)[0]
+        if code == self.PICKLE:
+            return pickle.loads(data)
+        if code == self.PICKLE_OOB:
+            view = memoryview(data)
+            count, = self._COUNT.unpack_from(view)
+            offset = self._COUNT.size
+            lengths = [self._LENGTH.unpack_from(view, offset + i * self._LENGTH.size)[0] for i in range(count)]
+            offset += count * self._LENGTH.size
+            buffers = []
+            for length in lengths:
+                buffers.append(view[offset:offset + length])
+                offset += length
+            return pickle.loads(view[offset:], buffers=buffers)
+        if code == self.JSON:
+            return json.loads(bytes(data))
+        if code == "bson":
+            return BSON(bytes(data)).decode()
+        raise ValueError(f"Unknown value encoding: {code!r}")
+
+
+class JSONSerializer(FastSerializer):
+    """bytes / str / int 同样走快速路径，其他对象用 JSON 编码，便于其他语言的读者直接解析"""
+
+    def _dumps_object(self, value) -> Tuple[str, bytes]:
+        return self.JSON, json.dumps(value, separators=(",", ":")).encode()
+
+
+SERIALIZERS = {
+    "fast": FastSerializer,
+    "json": JSONSerializer,
+}
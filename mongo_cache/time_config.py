@@ -0,0 +1,40 @@
+from dataclasses import dataclass
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1024)
+def _parse_time_string(time_str: str):
+    """Parse 'HH:MM:SS' into (hours, minutes, seconds); repeated strings are served from cache."""
+    parts = time_str.split(':')
+    if len(parts) != 3:
+        raise ValueError("Time string must be in 'HH:MM:SS' format.")
+    return tuple(map(int, parts))
+
+
+@dataclass
+class TimeConfig:
+    hours: int = 0
+    minutes: int = 0
+    seconds: int = 0
+
+    def total_seconds(self) -> int:
+        """Calculate total time in seconds."""
+        return self.hours * 3600 + self.minutes * 60 + self.seconds
+
+    def to_x_message_ttl(self) -> int:
+        """Convert to x-message-ttl format (in milliseconds)."""
+        return self.total_seconds() * 1000
+
+    def to_expiration(self) -> str:
+        """Convert to expiration format (as a string in milliseconds)."""
+        return str(self.to_x_message_ttl())
+
+    @classmethod
+    def from_string(cls, time_str: str):
+        """Create a TimeConfig from a string in the format 'HH:MM:SS'."""
+        hours, minutes, seconds = _parse_time_string(time_str)
+        return cls(hours, minutes, seconds)
+
+    def __str__(self) -> str:
+        """Return a string representation of the time in 'HH:MM:SS' format."""
+        return f"{self.hours:02}:{self.minutes:02}:{self.seconds:02}"
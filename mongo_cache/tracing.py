@@ -0,0 +1,183 @@
+import atexit
+import hashlib
+import queue
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class TraceRecorder:
+    """
+    抽样记录线上访问轨迹，供 replay_trace 回放做容量规划和上线前验证。
+
+    每条记录 21 字节：时间戳（float64）、操作码（1 字节）、键的 64 位哈希、值大小（uint32），不落原始键。
+    按键的哈希抽样而不是按请求抽样：被选中的键的每一次访问都会记录，热点分布和同一键的读写顺序得以保留。
+    记录先写入内存缓冲，缓冲满或每 flush_interval 秒由后台线程追加到文件，多个进程可以共用一个文件。
+    """
+    GET, SET, DELETE, TOUCH = b"g", b"s", b"d", b"t"
+    RECORD = struct.Struct("<dcQI")
+    _SAMPLE_SCALE = 1000000
+    _recorders: Dict[str, "TraceRecorder"] = {}
+    _registry_lock = threading.Lock()
+
+    @classmethod
+    def for_path(cls, path: str, **kwargs) -> "TraceRecorder":
+        with cls._registry_lock:
+            if path not in cls._recorders:
+                cls._recorders[path] = cls(path, **kwargs)
+            return cls._recorders[path]
+
+    def __init__(self, path: str, sample_rate: float = 0.01, flush_interval: float = 5, buffer_bytes: int = 64 * 1024):
+        self._path = path
+        self._threshold = int(sample_rate * self._SAMPLE_SCALE)
+        self._flush_interval = flush_interval
+        self._buffer_bytes = buffer_bytes
+        self._lock = threading.Lock()
+        self._buffer = bytearray()
+        threading.Thread(target=self._run, name="mongo-cache-trace", daemon=True).start()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def hash_key(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+
+    def record(self, op: bytes, key: str, size: int = 0):
+        key_hash = self.hash_key(key)
+        if key_hash % self._SAMPLE_SCALE >= self._threshold:
+            return
+        record = self.RECORD.pack(time.time(), op, key_hash, min(size, 0xFFFFFFFF))
+        with self._lock:
+            self._buffer += record
+            full = len(self._buffer) >= self._buffer_bytes
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            data, self._buffer = bytes(self._buffer), bytearray()
+        if not data:
+            return
+        try:
+            with open(self._path, "ab") as f:  # O_APPEND：多进程各自整块追加，记录不会交错
+                f.write(data)
+        except OSError as e:
+            print(f"Error writing trace file: {e}")
+
+    def _run(self):
+        while True:
+            time.sleep(self._flush_interval)
+            self.flush()
+
+    @classmethod
+    def read(cls, path: str):
+        """逐条返回 (时间戳, 操作码, 键哈希, 值大小)，忽略文件末尾不完整的记录"""
+        with open(path, "rb") as f:
+            data = f.read()
+        end = len(data) - len(data) % cls.RECORD.size
+        yield from cls.RECORD.iter_unpack(data[:end])
+
+
+def replay_trace(backend, path: str, speed: Optional[float] = 1.0, workers: int = 8, prefill: bool = True,
+                 max_records: Optional[int] = None) -> Dict[str, Any]:
+    """
+    用 TraceRecorder 记录的轨迹驱动任意 MongoDBCacheBackend 实例，返回各操作的延迟分位数和命中率。
+
+    - speed 为回放倍速（1 为原速，10 为十倍速），None 表示不按时间间隔、尽快回放；
+    - 同一个键的记录固定分给同一个 worker，保证按原顺序执行；
+    - prefill=True 时先写入轨迹中第一次出现即为读命中的键，模拟稳态缓存，否则命中率只反映冷启动；
+    - 值用记录的大小生成的零字节串代替，键为 "trace:<哈希>"。
+    """
+    records = list(TraceRecorder.read(path))
+    records.sort(key=lambda record: record[0])
+    if max_records is not None:
+        records = records[:max_records]
+    if not records:
+        return {"operations": 0}
+
+    payloads: Dict[int, bytes] = {}
+
+    def payload(size):
+        if size not in payloads:
+            payloads[size] = bytes(size)
+        return payloads[size]
+
+    if prefill:
+        first_seen: Dict[int, tuple] = {}
+        for record in records:
+            first_seen.setdefault(record[2], record)
+        warm = {f"trace:{key_hash:016x}": payload(size)
+                for _, op, key_hash, size in first_seen.values() if op == TraceRecorder.GET and size}
+        items = list(warm.items())
+        for i in range(0, len(items), 1000):
+            backend.set_many(dict(items[i:i + 1000]), timeout=None)
+
+    latencies: Dict[str, List[float]] = {}
+    counters = {"gets": 0, "hits": 0, "errors": 0, "max_lag": 0.0}
+    lock = threading.Lock()
+    queues = [queue.Queue(maxsize=1000) for _ in range(workers)]
+    done = object()
+
+    def run(tasks):
+        local_latencies: Dict[str, List[float]] = {}
+        gets = hits = errors = 0
+        while True:
+            task = tasks.get()
+            if task is done:
+                break
+            op, key, size = task
+            started = time.perf_counter()
+            try:
+                if op == TraceRecorder.GET:
+                    gets += 1
+                    hits += backend.get(key) is not None
+                elif op == TraceRecorder.SET:
+                    backend.set(key, payload(size))
+                elif op == TraceRecorder.DELETE:
+                    backend.delete(key)
+                else:
+                    backend.pipeline().touch(key).execute()  # touch 只会由 pipeline 产生
+            except Exception:
+                errors += 1
+            local_latencies.setdefault(op.decode(), []).append(time.perf_counter() - started)
+        with lock:
+            for name, values in local_latencies.items():
+                latencies.setdefault(name, []).extend(values)
+            counters["gets"] += gets
+            counters["hits"] += hits
+            counters["errors"] += errors
+
+    threads = [threading.Thread(target=run, args=(tasks,), daemon=True) for tasks in queues]
+    for thread in threads:
+        thread.start()
+
+    first_timestamp = records[0][0]
+    started_at = time.perf_counter()
+    for timestamp, op, key_hash, size in records:
+        if speed:
+            lag = time.perf_counter() - started_at - (timestamp - first_timestamp) / speed
+            if lag < 0:
+                time.sleep(-lag)
+            else:
+                counters["max_lag"] = max(counters["max_lag"], lag)  # 回放跟不上轨迹节奏时的最大落后秒数
+        queues[key_hash % workers].put((op, f"trace:{key_hash:016x}", size))
+    for tasks in queues:
+        tasks.put(done)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started_at
+
+    def percentiles(values):
+        values.sort()
+        pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+        return {"count": len(values), "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": values[-1]}
+
+    return {
+        "operations": len(records),
+        "elapsed": elapsed,
+        "throughput": len(records) / elapsed if elapsed else None,
+        "hit_rate": counters["hits"] / counters["gets"] if counters["gets"] else None,
+        "errors": counters["errors"],
+        "max_lag": counters["max_lag"],
+        "latency": {name: percentiles(values) for name, values in latencies.items()},
+    }
@@ -0,0 +1,75 @@
+import fnmatch
+import re
+from typing import Any, Dict, Optional
+
+from .time_config import TimeConfig
+
+
+class TTLPolicy:
+    """
+    键模式 -> TTL（秒）的策略表。
+
+    - 不含通配符的模式按精确键匹配，优先级最高；
+    - 仅以一个 * 结尾的模式（如 "lock:*"）编入前缀树，查找时沿键逐字符下行一次，取最长前缀，
+      批量写入时无需对每个键跑正则；
+    - 其他 glob 预编译为正则，按字面字符数（去掉 *、?、[...] 后的长度）从长到短排列。
+
+    多个模式都匹配时最具体的胜出：前缀树命中的字面长度是前缀长度（"*" 为 0），
+    只有字面更长的 glob 才会尝试；字面一样长时前缀树优先，glob 之间按配置顺序。
+
+    TTL 可以是 TimeConfig、"HH:MM:SS" 字符串或秒数。
+    """
+    _TERMINAL = ""  # 前缀树节点中保存 TTL 的位置，单个字符永远不会是空串
+    _WILDCARDS = re.compile(r"\*|\?|\[[^]]*\]")
+
+    def __init__(self, rules: Dict[str, Any]):
+        self._exact: Dict[str, int] = {}
+        self._trie: Dict[str, Any] = {}
+        self._globs = []
+
+        for pattern, ttl in rules.items():
+            seconds = self._convert(ttl)
+            if not any(c in pattern for c in "*?["):
+                self._exact[pattern] = seconds
+            elif pattern.endswith("*") and not any(c in pattern[:-1] for c in "*?["):
+                node = self._trie
+                for char in pattern[:-1]:
+                    node = node.setdefault(char, {})
+                node[self._TERMINAL] = seconds
+            else:
+                literal = len(self._WILDCARDS.sub("", pattern))
+                self._globs.append((literal, re.compile(fnmatch.translate(pattern)), seconds))
+        self._globs.sort(key=lambda glob: -glob[0])  # 稳定排序，字面一样长的保持配置顺序
+
+    @staticmethod
+    def _to_seconds(ttl) -> int:
+        if isinstance(ttl, str):
+            ttl = TimeConfig.from_string(ttl)
+        if hasattr(ttl, "total_seconds"):
+            return int(ttl.total_seconds())
+        return int(ttl)
+
+    _convert = _to_seconds  # 规则值的转换，子类复用前缀树匹配时覆盖
+
+    def resolve(self, key: str) -> Optional[int]:
+        """返回匹配的 TTL 秒数，未匹配返回 None"""
+        seconds = self._exact.get(key)
+        if seconds is not None:
+            return seconds
+
+        node = self._trie
+        seconds = node.get(self._TERMINAL)
+        matched = 0 if seconds is not None else -1  # 前缀树命中的前缀长度，-1 表示未命中
+        for depth, char in enumerate(key, 1):
+            node = node.get(char)
+            if node is None:
+                break
+            if self._TERMINAL in node:
+                seconds, matched = node[self._TERMINAL], depth
+
+        for literal, regex, glob_seconds in self._globs:
+            if literal <= matched:
+                break
+            if regex.match(key):
+                return glob_seconds
+        return seconds
@@ -0,0 +1,213 @@
+import atexit
+import os
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from pymongo.errors import PyMongoError
+
+from .hot_keys import HotKeyDetector
+from .local_cache import LocalMemoryCache
+from .registry import ProcessShared
+
+
+class WarmStartSnapshot(ProcessShared):
+    """
+    进程重启后的预热快照：每 interval 秒把 L1 中最近使用的 max_keys 个条目（热点键优先）写入本地文件，
+    values=True 时连同值一起写入，否则只写键。
+
+    进程启动时由后台线程读取快照，不阻塞请求：
+    - 带值的条目按批用一次 $in 取回头文档校验，过期时间和长度与快照一致（期间未被重写）时直接放入 L1；
+    - 只有键、永不过期无法校验或已被重写的条目，按批通过 pipeline 的一次 $in 查询取回后放入 L1。
+    写入先落临时文件再 os.replace，多个 worker 共用一个文件时后写入的覆盖先写入的。
+    """
+    MAGIC = b"MCWS"
+    HEADER = struct.Struct("<4sq")  # 魔数、写入时刻（毫秒）
+    RECORD = struct.Struct("<HBIq")  # 键长度、编码长度、值长度、过期时间（毫秒）
+    NO_VALUE = 0xFFFFFFFF
+    NO_ENCODING = 0xFF
+    NEVER = -1
+    BATCH_SIZE = 500
+    MAX_VALUE_BYTES = 1024 * 1024  # 更大的值只记键，启动时从 MongoDB 取
+
+    def __init__(self, path: str, local_cache: LocalMemoryCache, hot_keys: Optional["HotKeyDetector"] = None,
+                 interval: float = 60, max_keys: int = 1000, values: bool = False):
+        self._path = path
+        self._local_cache = local_cache
+        self._hot_keys = hot_keys
+        self._interval = interval
+        self._max_keys = max_keys
+        self._values = values
+        self._loaded = threading.Event()  # 预热完成前不写快照，避免用几乎为空的 L1 覆盖上一次的快照
+        self._backend = None
+        self._thread = None
+
+    def attach(self, backend):
+        self._backend = backend
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="mongo-cache-warm-start", daemon=True)
+            self._thread.start()
+            atexit.register(self.save)
+
+    def save(self) -> int:
+        """写入快照，返回写入的条目数"""
+        if not self._loaded.is_set():
+            return 0
+        entries = self._local_cache.snapshot(self._max_keys)
+        if not entries:
+            return 0
+        if self._hot_keys is not None:
+            rank = {key: i for i, (key, _) in enumerate(self._hot_keys.hot_keys())}
+            entries.sort(key=lambda entry: rank.get(entry[0], len(rank)))  # 稳定排序，其余条目保持最近使用顺序
+
+        buffer = bytearray(self.HEADER.pack(self.MAGIC, int(time.time() * 1000)))
+        count = 0
+        for key, (data, encoding), expires_at in entries:
+            key_bytes = key.encode()
+            if len(key_bytes) > 0xFFFF:
+                continue
+            encoding_bytes = encoding.encode() if encoding is not None else b""
+            if not self._values or len(data) > self.MAX_VALUE_BYTES:
+                data = None
+            buffer += self.RECORD.pack(
+                len(key_bytes),
+                len(encoding_bytes) if encoding is not None else self.NO_ENCODING,
+                len(data) if data is not None else self.NO_VALUE,
+                self._to_millis(expires_at),
+            )
+            buffer += key_bytes + encoding_bytes
+            if data is not None:
+                buffer += data
+            count += 1
+
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self._path)), suffix=".tmp")
+        except OSError as e:
+            print(f"Error writing warm start snapshot: {e}")
+            return 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(buffer)
+            os.replace(tmp_path, self._path)  # 原子替换
+        except OSError as e:
+            print(f"Error writing warm start snapshot: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return 0
+        return count
+
+    def read(self) -> List[tuple]:
+        """读取快照，返回未过期的 [(键, (值, 编码) 或 None, 过期时间)]；文件不存在或损坏时返回空列表"""
+        try:
+            with open(self._path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        except OSError as e:
+            print(f"Error reading warm start snapshot: {e}")
+            return []
+
+        view = memoryview(data)
+        entries = []
+        now = datetime.utcnow()
+        try:
+            magic, _ = self.HEADER.unpack_from(view)
+            if magic != self.MAGIC:
+                raise ValueError("bad magic")
+            offset = self.HEADER.size
+            while offset < len(view):
+                key_length, encoding_length, value_length, expires_millis = self.RECORD.unpack_from(view, offset)
+                offset += self.RECORD.size
+                key = str(view[offset:offset + key_length], "utf-8")
+                offset += key_length
+                encoding = None
+                if encoding_length != self.NO_ENCODING:
+                    encoding = str(view[offset:offset + encoding_length], "utf-8")
+                    offset += encoding_length
+                value = None
+                if value_length != self.NO_VALUE:
+                    value = (bytes(view[offset:offset + value_length]), encoding)
+                    offset += value_length
+                if offset > len(view):
+                    raise ValueError("truncated record")
+                expires_at = self._from_millis(expires_millis)
+                if expires_at is None or expires_at > now:
+                    entries.append((key, value, expires_at))
+        except (struct.error, ValueError) as e:
+            print(f"Ignoring corrupt warm start snapshot {self._path}: {e}")
+            return []
+        return entries
+
+    def load(self) -> int:
+        """按快照预热 L1，返回放入的条目数"""
+        entries = self.read()
+        loaded = 0
+        for i in range(0, len(entries), self.BATCH_SIZE):
+            try:
+                loaded += self._load_batch(entries[i:i + self.BATCH_SIZE])
+            except PyMongoError as e:
+                print(f"Error during warm start: {e}")
+                break
+        return loaded
+
+    def _load_batch(self, batch) -> int:
+        backend = self._backend
+        fetch = [key for key, value, _ in batch if value is None]
+        cached = {key: (value, expires_at) for key, value, expires_at in batch
+                  if value is not None and expires_at is not None}
+        fetch += [key for key, value, expires_at in batch if value is not None and expires_at is None]
+
+        loaded = 0
+        if cached:
+            # 过期时间在每次写入时重新计算，与快照一致说明期间没有被重写
+            sequence = self._local_cache.sequence
+            heads = {}
+            for collection in backend._candidate_collections(backend.collection):
+                ids = [key for key in cached if key not in heads]
+                if not ids:
+                    break
+                for head in collection.find({"_id": {"$in": ids}}, {"expires_at": 1, "length": 1, "encoding": 1}):
+                    heads[head["_id"]] = head
+            for key, (value, expires_at) in cached.items():
+                head = heads.get(key)
+                if (head is not None and head.get("expires_at") == expires_at
+                        and head["length"] == len(value[0]) and head.get("encoding") == value[1]):
+                    self._local_cache.set(key, value, expires_at, sequence)
+                    loaded += 1
+                else:
+                    fetch.append(key)
+
+        if fetch:
+            with backend.pipeline() as pipe:  # 一次 $in 取回头文档和 0 号块，读到的值由 pipeline 放入 L1
+                for key in fetch:
+                    pipe.get(key)
+            loaded += sum(1 for result in pipe.results if result is not None)
+        return loaded
+
+    @staticmethod
+    def _to_millis(expires_at: Optional[datetime]) -> int:
+        # 存储层使用的是 utcnow() 生成的 naive 时间，MongoDB 只保留到毫秒
+        if expires_at is None:
+            return WarmStartSnapshot.NEVER
+        return (expires_at - datetime(1970, 1, 1)) // timedelta(milliseconds=1)
+
+    @staticmethod
+    def _from_millis(millis: int) -> Optional[datetime]:
+        if millis == WarmStartSnapshot.NEVER:
+            return None
+        return datetime(1970, 1, 1) + timedelta(milliseconds=millis)
+
+    def _run(self):
+        started = time.monotonic()
+        loaded = self.load()
+        if loaded:
+            print(f"Warm start loaded {loaded} cache entries in {time.monotonic() - started:.2f}s")
+        self._loaded.set()
+        while True:
+            time.sleep(self._interval)
+            self.save()
@@ -0,0 +1,40 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings  # noqa: E402
+
+if not settings.configured:
+    settings.configure()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """mongomock 代替 MongoDB，不支持分片与 change stream，初始化分片和监听在测试中跳过"""
+    mongomock = pytest.importorskip("mongomock")
+    from mongo_cache import MongoDBCacheBackend
+    from mongo_cache.local_cache import ChangeStreamInvalidator
+
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(MongoDBCacheBackend, "connect", lambda self: client)
+    monkeypatch.setattr(MongoDBCacheBackend, "_initialize_sharding", lambda self, collection_name=None: None)
+    monkeypatch.setattr(ChangeStreamInvalidator, "ensure_started", classmethod(lambda cls, *args, **kwargs: None))
+    return client
+
+
+@pytest.fixture
+def make_backend(client):
+    """进程内共享的组件按 LOCATION + 集合名注册，每个测试使用独立的集合名"""
+    from mongo_cache import MongoDBCacheBackend
+
+    collection_name = f"cache_{uuid.uuid4().hex}"
+
+    def make(**options):
+        options.setdefault("COLLECTION_NAME", collection_name)
+        return MongoDBCacheBackend("mongodb://localhost", {"options": options})
+
+    return make
@@ -0,0 +1,149 @@
+"""后端读写路径，使用 mongomock 代替 MongoDB"""
+from datetime import datetime
+
+import pytest
+from bson import Binary
+from pymongo.errors import AutoReconnect
+
+
+def write_chunked(collection, key, value, chunk_size):
+    """按头文档 + 块文档的格式直接写入一个分块的值"""
+    chunks = [value[i:i + chunk_size] for i in range(0, len(value), chunk_size)]
+    for i, chunk in enumerate(chunks):
+        collection.insert_one({"_id": f"{key}_chunk_{i}", "value": Binary(chunk), "n": i})
+    collection.insert_one({"_id": key, "length": len(value), "chunks": len(chunks), "chunk_size": chunk_size,
+                           "encoding": "raw", "expires_at": None})
+
+
+def test_round_trip(make_backend):
+    cache = make_backend()
+    cache.set("bytes", b"\x00raw")
+    cache.set("document", {"a": 1})
+    assert bytes(cache.get("bytes")) == b"\x00raw"  # mongomock 把单块原样返回为 Binary
+    assert cache.get("document") == {"a": 1}
+    assert cache.get_many(["document", "missing"]) == {"document": {"a": 1}, "missing": None}
+
+
+def test_reads_leave_expired_entries_to_the_ttl_index(make_backend, monkeypatch):
+    cache = make_backend()
+    cache.set_many({"a": "1", "b": "2"}, 60)
+    cache.collection.update_many({"_id": {"$in": ["a", "b"]}}, {"$set": {"expires_at": datetime.utcnow()}})
+    deletes = []
+    monkeypatch.setattr(type(cache.collection), "delete_many", lambda self, *args, **kwargs: deletes.append(args))
+    assert cache.get("a") is None
+    assert cache.get_view("a") is None
+    assert cache.get_many(["a", "b"]) == {"a": None, "b": None}
+    assert deletes == []  # 读路径不再发出删除
+
+
+def test_chunks_are_assembled_by_position(make_backend):
+    cache = make_backend()
+    value = bytes(range(256)) * 4
+    write_chunked(cache.collection, "k", value, 100)
+    assert cache.get("k") == value
+    view = cache.get_view("k")
+    assert isinstance(view, memoryview) and view == value
+    view.release()
+
+
+def test_incomplete_chunks_read_as_miss(make_backend):
+    cache = make_backend()
+    write_chunked(cache.collection, "k", b"x" * 1000, 100)
+    cache.collection.delete_one({"_id": "k_chunk_3"})
+    assert cache.get("k") is None
+
+    write_chunked(cache.collection, "single", b"x" * 10, 100)
+    cache.collection.update_one({"_id": "single_chunk_0"}, {"$set": {"value": Binary(b"x" * 5)}})
+    assert cache.get("single") is None
+
+
+class FlakyCollection:
+    """第一次查询返回一个块后断开连接，之后的查询照常，记录每次查询的块 _id"""
+
+    def __init__(self, collection, failures=1):
+        self._collection = collection
+        self._failures = failures
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append(sorted(query["_id"]["$in"]))
+        cursor = self._collection.find(query, projection).sort("n", 1)
+        if self._failures:
+            self._failures -= 1
+            return self._fail_after_first(cursor)
+        return cursor
+
+    @staticmethod
+    def _fail_after_first(cursor):
+        yield next(cursor)
+        raise AutoReconnect("connection reset")
+
+
+def test_chunks_are_fetched_in_parallel_groups(make_backend):
+    cache = make_backend(CHUNK_FETCH_PARALLELISM=3)
+    value = bytes(range(256)) * 4
+    write_chunked(cache.collection, "k", value, 100)
+    assert cache.get("k") == value
+
+
+def test_chunk_fetch_retries_only_missing_chunks(make_backend):
+    cache = make_backend(CHUNK_FETCH_RETRIES=1)
+    write_chunked(cache.collection, "k", bytes(range(40)), 10)
+    ids = [f"k_chunk_{i}" for i in range(4)]
+    view = memoryview(bytearray(40))
+    flaky = FlakyCollection(cache.collection)
+    assert cache._fetch_chunks(flaky, ids, view, 10) == 40
+    assert view == bytes(range(40))
+    assert flaky.queries == [ids, ids[1:]]
+
+    with pytest.raises(AutoReconnect):
+        cache._fetch_chunks(FlakyCollection(cache.collection, failures=2), ids, memoryview(bytearray(40)), 10)
+
+
+def test_chunked_value_round_trip(make_backend):
+    cache = make_backend(CHUNK_SIZE=100, CHUNK_FETCH_PARALLELISM=3)
+    value = "v" * 1000
+    cache.set("k", value)
+    assert cache.collection.count_documents({"_id": {"$regex": "^k_chunk_"}}) > 1
+    assert cache.get("k") == value
+    cache.set("k", "short")
+    assert cache.get("k") == "short"
+    cache.delete("k")
+    assert cache.get("k", "default") == "default"
+
+
+def test_shorter_rewrite_deletes_leftover_chunks(make_backend):
+    cache = make_backend(CHUNK_SIZE=100)
+    cache.set("k", "v" * 1000)
+    cache.set("k", "short")
+    head = cache.collection.find_one({"_id": "k"})
+    assert cache.collection.count_documents({"_id": {"$regex": "^k_chunk_"}}) == head["chunks"]
+
+    cache.set("k", "v" * 1000)
+    with cache.pipeline() as pipeline:
+        pipeline.set("k", "v" * 250)
+    head = cache.collection.find_one({"_id": "k"})
+    assert cache.collection.count_documents({"_id": {"$regex": "^k_chunk_"}}) == head["chunks"]
+    assert cache.get("k") == "v" * 250
+
+
+def test_torn_chunks_read_as_miss(make_backend):
+    cache = make_backend(CHUNK_SIZE=100)
+    cache.set("k", "v" * 1000)
+    cache.collection.update_one({"_id": "k_chunk_3"}, {"$set": {"write_id": 1}})  # 混入了另一次写入的块
+    assert cache.get("k") is None
+
+    cache.set("k", "v" * 1000)
+    cache.collection.delete_one({"_id": "k_chunk_3"})
+    assert cache.get("k") is None
+
+
+def test_delete_removes_only_the_key_and_its_documents(make_backend):
+    cache = make_backend(CHUNK_SIZE=100)
+    for key in ("a.b", "a.bc", "axb", "a.b_chunk_x"):
+        cache.set(key, "v" * 300)
+    cache._replicate("a.b", 2, 30)
+    cache.delete("a.b")
+    assert cache.collection.count_documents({"_id": {"$regex": "^a\\.b(#|_chunk_\\d|$)"}}) == 0
+    assert cache.get_many(["a.bc", "axb", "a.b_chunk_x"]) == {"a.bc": "v" * 300, "axb": "v" * 300,
+                                                                "a.b_chunk_x": "v" * 300}
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from pymongo.errors import OperationFailure
+
+from mongo_cache.local_cache import ChangeStreamInvalidator
+
+
+def test_expiring_entries_go_to_bucket_collections(make_backend):
+    cache = make_backend(BUCKET_HOURS=1)
+    cache.set("expiring", {"v": 1}, 3600)
+    cache.set("forever", {"v": 2}, None)
+    assert cache.collection.find_one({"_id": "expiring"}) is None
+    assert cache.collection.find_one({"_id": "forever"}) is not None
+    assert len(cache._live_buckets()) == 1
+    assert cache.get("expiring") == {"v": 1}
+    assert cache.get("forever") == {"v": 2}
+
+
+def test_rewrite_into_older_bucket_is_not_shadowed(make_backend):
+    cache = make_backend(BUCKET_HOURS=1)
+    cache.set("a", {"v": "old"}, 7200)
+    cache.set("a", {"v": "new"}, 3600)
+    assert cache.get("a") == {"v": "new"}
+    assert len(cache._live_buckets()) == 2
+
+
+def test_fully_expired_buckets_are_dropped(make_backend, client):
+    cache = make_backend(BUCKET_HOURS=1)
+    bucket_id = cache._bucket_id(datetime.utcnow() - timedelta(hours=3))
+    database = client[cache._database_name]
+    database[cache._bucket_name(bucket_id)].insert_one({"_id": "stale"})
+    cache.bucket_registry.insert_one({"_id": bucket_id, "ends_at": datetime.utcnow() - timedelta(hours=2)})
+    cache._buckets_loaded_at = None
+
+    assert cache._live_buckets() == []
+    assert cache._bucket_name(bucket_id) not in database.list_collection_names()
+    assert cache.bucket_registry.count_documents({}) == 0
+
+
+def test_write_without_expiry_shadows_bucketed_copies(make_backend):
+    cache = make_backend(BUCKET_HOURS=1)
+    other = make_backend(BUCKET_HOURS=1)
+    assert other._live_buckets() == []  # 另一个进程缓存了空的存活桶列表
+    cache.set("a", "old", 7200)
+    cache.set("a", "new", None)
+    assert cache.get("a") == other.get("a") == "new"
+    cache.set("a", "newer", 7200)
+    assert cache.get("a") == "newer"
+
+
+class _Database:
+    def __init__(self):
+        self.pipelines = []
+
+    def watch(self, pipeline, resume_after=None):
+        self.pipelines.append(pipeline)
+        raise OperationFailure("not a replica set", code=40573)
+
+
+def test_bucket_mode_invalidator_watches_bucket_collections():
+    collection = SimpleNamespace(database=_Database())
+    ChangeStreamInvalidator(collection, None, collections="^cache(_b\\d+)?$", retry_interval=0.01)._run()
+    assert collection.database.pipelines[0][0] == {"$match": {"ns.coll": {"$regex": "^cache(_b\\d+)?$"}}}
+
+
+def test_iteration_skips_copies_shadowed_by_an_earlier_bucket(make_backend):
+    cache = make_backend(BUCKET_HOURS=1)
+    cache.set("a", "old", 7200)
+    cache.set("a", "new", None)
+    assert cache.get("a") == "new"
+    cache.set("a", "newer", 7200)
+    assert cache.get("a") == "newer"
+    cache.set("b", 2, 3600 * 5)
+    assert sorted(cache.iter_items()) == [("a", "newer"), ("b", 2)]
@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+from mongo_cache.capacity import CapacityManager
+
+
+@pytest.mark.parametrize("policy", ["lru", "lfu"])
+def test_eviction_keeps_recently_or_frequently_read_entries(make_backend, policy):
+    cache = make_backend(EVICTION_POLICY=policy, MAX_ENTRIES=30, CULL_FREQUENCY=0,
+                         ACCESS_SAMPLE_RATE=1, EVICTION_INTERVAL=3600)
+    cache.set_many({f"k{i}": {"v": i} for i in range(40)}, None)
+    time.sleep(0.01)  # BSON 时间精确到毫秒
+    read = [f"k{i}" for i in range(16, 40)]
+    for key in read:
+        assert cache.get(key) is not None
+    cache._capacity._flush_access()
+
+    cache._capacity.evict()  # 超出 10 条，一次抽样淘汰 16 条
+    heads = sorted(doc["_id"] for doc in cache.collection.find({"last_access": {"$exists": True}}))
+    assert heads == sorted(read)
+    assert cache.collection.count_documents({"_id": {"$regex": "_chunk_"}}) == len(read)  # 块随头文档一起删除
+
+
+def test_lfu_seeds_new_keys_without_lowering_counts(make_backend):
+    cache = make_backend(EVICTION_POLICY="lfu", MAX_ENTRIES=30, ACCESS_SAMPLE_RATE=1, EVICTION_INTERVAL=3600)
+    cache.set("k", 1)
+    assert cache.collection.find_one({"_id": "k"})["hits"] == CapacityManager.LFU_INIT_HITS
+    cache.collection.update_one({"_id": "k"}, {"$set": {"hits": 40}})
+    cache.set("k", 2)
+    assert cache.collection.find_one({"_id": "k"})["hits"] == 40
+
+    cache = make_backend(EVICTION_POLICY="lfu", MAX_ENTRIES=30, GENERATIONS=True, EVICTION_INTERVAL=3600,
+                         COLLECTION_NAME="rebuilt")
+    with cache.rebuild() as rebuild:
+        rebuild.set_many({"x": 1})
+    assert cache.collection.find_one({"_id": "x"})["hits"] == CapacityManager.LFU_INIT_HITS
+
+
+def test_eviction_counts_and_samples_every_bucket(make_backend):
+    cache = make_backend(EVICTION_POLICY="lru", MAX_ENTRIES=30, CULL_FREQUENCY=0, BUCKET_HOURS=1,
+                         ACCESS_SAMPLE_RATE=1, EVICTION_INTERVAL=3600)
+    timeouts = [None, 3600, 7200, 10800]
+    for i in range(40):
+        cache.set(f"k{i}", {"v": i}, timeouts[i % 4])
+    collections = cache._candidate_collections(cache.collection)
+    assert len(collections) == 4
+    time.sleep(0.01)
+    read = [f"k{i}" for i in range(16, 40)]
+    for key in read:
+        assert cache.get(key) is not None
+    cache._capacity._flush_access()
+
+    cache._capacity.evict()
+    heads = sorted(doc["_id"] for collection in collections for doc in collection.find({"last_access": {"$exists": True}}))
+    assert heads == sorted(read)
+
+
+def test_within_limit_nothing_is_evicted(make_backend):
+    cache = make_backend(EVICTION_POLICY="lru", MAX_ENTRIES=30, EVICTION_INTERVAL=3600)
+    cache.set_many({f"k{i}": {"v": i} for i in range(30)}, None)
+    cache._capacity.evict()
+    assert cache.collection.count_documents({"last_access": {"$exists": True}}) == 30
+
+
+def test_access_is_recorded_once_per_interval():
+    manager = CapacityManager(sample_rate=1, access_interval=60)
+    for _ in range(3):
+        manager.record_access("k")
+    assert manager._pending == {"k": 1}
+
+
+def test_unknown_policy_is_a_config_error():
+    with pytest.raises(RuntimeError):
+        CapacityManager(policy="random")
+
+
+def test_eviction_policy_requires_explicit_limit(make_backend):
+    with pytest.raises(RuntimeError):
+        make_backend(EVICTION_POLICY="lru")  # 不套用 Django 默认的 MAX_ENTRIES=300
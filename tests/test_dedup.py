@@ -0,0 +1,53 @@
+import time
+from datetime import datetime, timedelta
+
+
+def test_identical_values_share_one_blob(make_backend):
+    cache = make_backend(DEDUP_MIN_BYTES=10)
+    cache.set_many({"a": "q" * 50, "b": "q" * 50, "small": "q"}, 60)
+    blobs = list(cache.blob_collection.find({"refs": {"$exists": True}}))
+    assert len(blobs) == 1 and blobs[0]["refs"] == 2
+    assert cache.collection.find_one({"_id": "a"})["blob"] == blobs[0]["_id"]
+    assert cache.collection.find_one({"_id": "small"}).get("blob") is None
+
+    other = make_backend()  # 未开启去重的进程也能读
+    assert cache.get("a") == other.get("b") == "q" * 50
+
+
+def test_unreferenced_blobs_are_collected(make_backend):
+    cache = make_backend(DEDUP_MIN_BYTES=10, DEDUP_GC_GRACE=0)
+    cache.set("a", "x" * 50)
+    cache.set("b", "y" * 50)
+    cache.set("c", "y" * 50)
+    cache.set("a", "short")
+    cache.delete("b")
+    time.sleep(0.01)
+
+    cache._blob_store.collect()
+    blobs = {blob["_id"]: blob["refs"] for blob in cache.blob_collection.find({"refs": {"$exists": True}})}
+    assert list(blobs.values()) == [1]  # x 已无引用被删除，y 仍被 c 引用，引用数重新统计
+    assert cache.blob_collection.count_documents({}) == 2
+    assert cache.get("c") == "y" * 50
+
+
+def test_touch_extends_deduplicated_blob(make_backend):
+    cache = make_backend(DEDUP_MIN_BYTES=10)
+    cache.set("a", "q" * 50, 60)
+    cache.set("b", "q" * 50, 60)
+    with cache.pipeline() as pipeline:
+        pipeline.touch("a", 7200)
+    blob = cache.blob_collection.find_one({"refs": {"$exists": True}})
+    assert blob["expires_at"] - datetime.utcnow() > timedelta(seconds=7000)
+    assert cache.get("a") == cache.get("b") == "q" * 50
+
+
+def test_blobs_referenced_by_other_generations_are_kept(make_backend):
+    cache = make_backend(DEDUP_MIN_BYTES=10, DEDUP_GC_GRACE=0, GENERATIONS=True, GENERATION_DROP_DELAY=60,
+                         GENERATION_REFRESH=0)
+    cache.set("old", "o" * 50)  # 旧代尚未删除，仍缓存旧代编号的读者还会读到
+    with cache.rebuild() as rebuild:
+        rebuild.set_many({"new": "n" * 50})
+    time.sleep(0.01)
+
+    cache._blob_store.collect()
+    assert cache.blob_collection.count_documents({"refs": {"$exists": True}}) == 2
@@ -0,0 +1,59 @@
+import pytest
+from pymongo import UpdateOne
+
+from mongo_cache.durability import DurabilityPolicy, DurabilityRules
+from mongo_cache.namespaces import NamespaceVersions
+
+mongomock = pytest.importorskip("mongomock")
+
+
+def test_durability_rules_reject_unknown_profile():
+    with pytest.raises(RuntimeError):
+        DurabilityRules({"a:*": "missing"}, DurabilityPolicy.PROFILES)
+
+
+def test_durability_policy_resolution_order():
+    policy = DurabilityPolicy(rules={"lock:*": "lock", "warm:*": "bulk"}, default="fast")
+    assert policy.resolve("lock:x", "safe") == "safe"
+    assert policy.resolve("lock:x") == "lock"
+    assert policy.resolve("other") == "fast"
+    assert policy.split({"lock:a": 1, "warm:b": 2, "c": 3}) == {
+        "lock": {"lock:a": 1}, "bulk": {"warm:b": 2}, "fast": {"c": 3}}
+    assert policy.reads_own_writes("lock")
+    assert not policy.reads_own_writes("fast")
+    assert not policy.reads_own_writes(None)
+    with pytest.raises(RuntimeError):
+        policy.resolve("x", "missing")
+
+
+def test_durability_policy_matches_rules_on_logical_key():
+    policy = DurabilityPolicy(rules={"repo:*:lock": "lock"}, logical_key=NamespaceVersions.logical)
+    assert policy.resolve("repo:1:lock@ns3") == "lock"
+
+
+@pytest.fixture
+def write_concerns(monkeypatch):
+    """记录每次 bulk_write 使用的 write concern 与写入的头文档"""
+    recorded = []
+    bulk_write = mongomock.collection.Collection.bulk_write
+
+    def recording_bulk_write(self, requests, *args, **kwargs):
+        heads = sorted(request._filter["_id"] for request in requests
+                       if isinstance(request, UpdateOne) and "_chunk_" not in request._filter["_id"])
+        recorded.append((self.write_concern.document, heads))
+        return bulk_write(self, requests, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, "bulk_write", recording_bulk_write)
+    return recorded
+
+
+def test_backend_writes_each_key_with_its_profile(make_backend, write_concerns):
+    cache = make_backend(DURABILITY_RULES={"lock:*": "lock"}, DURABILITY_DEFAULT="fast",
+                         DURABILITY_PROFILES={"fast": {"w": 1}})
+    cache.set_many({"lock:a": 1, "b": 2})
+    cache.set("b", 3, durability="safe")
+    assert sorted(write_concerns[:2], key=str) == sorted([({"w": "majority", "j": True}, ["lock:a"]),
+                                                         ({"w": 1}, ["b"])], key=str)
+    assert write_concerns[2] == ({"w": "majority"}, ["b"])
+    assert cache.get_many(["lock:a", "b"]) == {"lock:a": 1, "b": 3}
+    assert cache.get("lock:a", durability="lock") == 1
@@ -0,0 +1,57 @@
+import os
+from datetime import datetime, timedelta
+
+from mongo_cache.file_cache import LocalFileCache
+
+
+def test_local_file_cache_hits_only_matching_write(tmp_path):
+    cache = LocalFileCache(str(tmp_path), max_bytes=1024)
+    expires_at = datetime.utcnow() + timedelta(minutes=5)
+    assert cache.set("k", b"value", expires_at, write_id=1)
+    assert bytes(cache.get("k", expires_at, write_id=1)) == b"value"
+    assert cache.get("k", expires_at, write_id=2) is None  # 永不过期的键被重写时只有 write_id 不同
+    assert cache.get("k", expires_at, write_id=1) is None  # 不一致的文件已被丢弃
+
+    assert cache.set("never", b"value", None)
+    assert bytes(cache.get("never", None)) == b"value"
+    assert cache.get("never", None, write_id=5) is None
+
+
+def test_local_file_cache_evicts_by_bytes(tmp_path):
+    cache = LocalFileCache(str(tmp_path), max_bytes=200)
+    cache.set("a", b"x" * 100, None)
+    cache.set("b", b"x" * 100, None)
+    assert cache.get("a", None) is None
+    assert cache.get("b", None) is not None
+    assert not cache.set("big", b"x" * 300, None)
+
+
+def test_local_file_cache_drops_leftover_temp_files(tmp_path):
+    (tmp_path / "partial.tmp").write_bytes(b"x")
+    LocalFileCache(str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+
+def test_backend_serves_large_values_from_l2(make_backend, tmp_path):
+    cache = make_backend(L2_CACHE_DIR=str(tmp_path), L2_CACHE_MIN_BYTES=100)
+    cache.set("small", "s", 60)
+    cache.set("large", "l" * 1000, 60)
+    assert cache.get("small") == "s"
+    assert cache.get("large") == "l" * 1000
+    assert len(os.listdir(tmp_path)) == 1  # 只缓存大值
+
+    # 过期时间不变而块内容被改写，读到原值说明来自 L2
+    cache.collection.update_many({"_id": {"$regex": "^large_chunk_"}}, {"$set": {"value": b""}})
+    assert cache.get("large") == "l" * 1000
+    cache.delete("large")
+    assert os.listdir(tmp_path) == []
+
+
+def test_l2_is_invalidated_by_rewrite_from_other_process(make_backend, tmp_path):
+    cache = make_backend(L2_CACHE_DIR=str(tmp_path), L2_CACHE_MIN_BYTES=1)
+    other = make_backend()
+    cache.set("k", "old", None)
+    assert cache.get("k") == "old"
+    assert len(os.listdir(tmp_path)) == 1  # 第一次读取后写入 L2
+    other.set("k", "new", None)  # 永不过期的键重写后 expires_at 不变
+    assert cache.get("k") == "new"
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+
+def test_rebuild_switches_generation_on_exit(make_backend, client):
+    cache = make_backend(GENERATIONS=True, GENERATION_DROP_DELAY=0, GENERATION_REFRESH=0)
+    cache.set("x", {"v": "old"})
+    old_name = cache.collection.name
+
+    with cache.rebuild() as rebuild:
+        rebuild.set_many({"x": {"v": "new"}, "y": {"v": "new"}})
+        assert cache.get("x") == {"v": "old"}  # 切换前读者看不到新一代
+        assert cache.get("y") is None
+    assert cache.get("x") == {"v": "new"}
+    assert cache.collection.name != old_name
+    assert old_name not in client[cache._database_name].list_collection_names()  # 读者刷新当前代时删除到期的旧代
+
+
+def test_failed_rebuild_is_discarded(make_backend, client):
+    cache = make_backend(GENERATIONS=True, GENERATION_REFRESH=0)
+    cache.set("x", {"v": "old"})
+    with pytest.raises(ValueError):
+        with cache.rebuild() as rebuild:
+            rebuild.set_many({"x": {"v": "broken"}})
+            discarded = rebuild._collection.name
+            raise ValueError
+    assert cache.get("x") == {"v": "old"}
+    assert discarded not in client[cache._database_name].list_collection_names()
+
+
+def test_rebuild_overtaken_by_another_switch_is_discarded(make_backend):
+    cache = make_backend(GENERATIONS=True, GENERATION_REFRESH=0)
+    first, second = cache.rebuild(), cache.rebuild()
+    first.__enter__()
+    first.set_many({"x": {"v": "first"}})
+    with second:
+        second.set_many({"x": {"v": "second"}})
+    with pytest.raises(RuntimeError):
+        first.__exit__(None, None, None)
+    assert cache.get("x") == {"v": "second"}
+
+
+def test_old_generation_is_dropped_by_readers_after_the_delay(make_backend, client):
+    cache = make_backend(GENERATIONS=True, GENERATION_DROP_DELAY=60, GENERATION_REFRESH=0)
+    cache.set("x", "old")
+    old_name = cache.collection.name
+    with cache.rebuild() as rebuild:
+        rebuild.set_many({"x": "new"})
+    database = client[cache._database_name]
+    assert old_name in database.list_collection_names()  # 仍缓存旧代编号的读者还能读
+
+    cache.generation_registry.update_many({"_id": {"$regex": "^drop:"}},
+                                          {"$set": {"drop_after": datetime.utcnow() - timedelta(seconds=1)}})
+    assert cache.get("x") == "new"
+    assert old_name not in database.list_collection_names()
+
+
+def test_next_rebuild_drops_collections_left_by_crashed_rebuilds(make_backend, client):
+    cache = make_backend(GENERATIONS=True, GENERATION_REFRESH=0, GENERATION_BUILD_TIMEOUT=60)
+    crashed = cache.rebuild()
+    crashed.__enter__()
+    crashed.set_many({"x": "partial"})
+    running = cache.rebuild()
+    database = client[cache._database_name]
+    assert crashed._collection.name in database.list_collection_names()  # 心跳仍在超时内
+
+    cache.generation_registry.update_one({"_id": f"building:{crashed.generation}"},
+                                         {"$set": {"heartbeat": datetime.utcnow() - timedelta(seconds=120)}})
+    with running:
+        pass
+    cache.rebuild()
+    assert crashed._collection.name not in database.list_collection_names()
+    assert cache.get("x") is None
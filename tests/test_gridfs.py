@@ -0,0 +1,72 @@
+import time
+
+import pytest
+from gridfs import GridFSBucket
+
+import mongo_cache.backend
+import mongo_cache.gridfs_store
+
+
+class _Bucket(GridFSBucket):
+    """mongomock 的集合会被 pymongo 的 GridFSBucket 当作超时设置，构造后清掉"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._timeout = None
+
+
+@pytest.fixture
+def make_gridfs_backend(make_backend, monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    import mongomock.gridfs
+    mongomock.gridfs.enable_gridfs_integration()
+    monkeypatch.setattr(mongo_cache.backend, "GridFSBucket", _Bucket)
+    monkeypatch.setattr(mongo_cache.gridfs_store, "GridFSBucket", _Bucket)
+
+    def make(**options):
+        return make_backend(GRIDFS_MIN_BYTES=100, GRIDFS_GC_INTERVAL=3600, **options)
+
+    return make
+
+
+def files(cache):
+    return cache.client[cache._database_name][f"{cache.gridfs_bucket_name}.files"]
+
+
+def test_large_values_are_stored_in_gridfs(make_gridfs_backend):
+    cache = make_gridfs_backend(CHUNK_SIZE=64)
+    cache.set("big", "v" * 1000)
+    cache.set("small", "x")
+    head = cache.collection.find_one({"_id": "big"})
+    assert files(cache).find_one({"_id": head["gridfs"]})["length"] == head["length"]
+    assert cache.collection.count_documents({"_id": {"$regex": "^big_chunk_"}}) == 0
+    assert cache.collection.find_one({"_id": "small"}).get("gridfs") is None
+    assert cache.get_many(["big", "small"]) == {"big": "v" * 1000, "small": "x"}
+
+    files(cache).delete_many({})  # 文件被回收后读作未命中
+    assert cache.get("big") is None
+
+
+def test_unreferenced_files_are_collected_after_grace(make_gridfs_backend):
+    cache = make_gridfs_backend(GRIDFS_GC_GRACE=0)
+    cache.set("big", "a" * 1000)
+    cache.set("big", "b" * 1000)
+    assert files(cache).count_documents({}) == 2
+    time.sleep(0.01)  # mongomock 的时间只保留到毫秒
+    assert cache._gridfs.collect() == 1
+    assert cache.get("big") == "b" * 1000
+    cache.delete("big")
+    files(cache).update_many({}, {"$unset": {"checked_at": ""}})  # 仍被引用的文件 GRIDFS_GC_INTERVAL 秒内不再检查
+    assert cache._gridfs.collect() == 1
+    assert files(cache).count_documents({}) == 0
+
+
+def test_chunk_size_must_fit_in_a_document(make_backend):
+    with pytest.raises(RuntimeError):
+        make_backend(CHUNK_SIZE=16 * 1024 * 1024)
+
+
+def test_unacknowledged_profile_writes_files_with_w1(make_gridfs_backend):
+    cache = make_gridfs_backend()
+    assert cache.set("big", "v" * 1000, durability="bulk")
+    assert cache.get("big") == "v" * 1000
@@ -0,0 +1,79 @@
+import logging
+
+import pytest
+
+from mongo_cache.hot_keys import HotKeyDetector
+
+
+def test_hot_key_detector_reports_only_guaranteed_counts(caplog):
+    caplog.set_level(logging.INFO, logger="mongo_cache.hot_keys")
+    detector = HotKeyDetector(capacity=4, sample_rate=1, threshold=0.2, min_count=5)
+    for _ in range(50):
+        detector.record("hot")
+    for i in range(50):
+        detector.record(f"cold:{i}")  # 不断挤占其余计数器，被接替的计数只计入误差
+    hot = detector.rollover()
+    assert list(hot) == ["hot"]
+    assert detector.is_hot("hot")
+    assert detector.hot_keys()[0][0] == "hot"
+    assert [record.getMessage() for record in caplog.records] == [
+        "Hot cache key detected: 'hot' (50.0% of sampled reads)"]
+
+
+def test_hot_key_detector_pins_only_hot_keys_without_concurrent_invalidation():
+    detector = HotKeyDetector(capacity=4, sample_rate=1, threshold=0.5, min_count=1)
+    detector.record("hot")
+    detector.rollover()
+    detector.pin("cold", (b"v", "b"), None, detector.sequence)
+    assert detector.pinned("cold") is None
+
+    sequence = detector.sequence
+    detector.unpin("other")  # 读取期间发生失效
+    detector.pin("hot", (b"v", "b"), None, sequence)
+    assert detector.pinned("hot") is None
+
+    detector.pin("hot", (b"v", "b"), None, detector.sequence)
+    assert detector.pinned("hot") == (b"v", "b")
+    detector.unpin("hot")
+    assert detector.pinned("hot") is None
+
+
+def test_hot_key_detector_rejects_unknown_mode():
+    with pytest.raises(RuntimeError):
+        HotKeyDetector(mode="other")
+
+
+def make_hot(cache, key):
+    for _ in range(20):
+        cache.get(key)
+    cache._hot_keys.rollover()
+    assert cache.hot_keys()[0][0] == key
+
+
+def test_hot_keys_are_pinned_until_local_write(make_backend):
+    cache = make_backend(HOT_KEYS=True, HOT_KEY_SAMPLE_RATE=1, HOT_KEY_THRESHOLD=0.5, HOT_KEY_WINDOW=3600)
+    cache.set("hot", "v1")
+    make_hot(cache, "hot")
+    assert cache.get("hot") == "v1"
+    cache.collection.update_many({}, {"$set": {"expires_at": None}})  # 钉住期间不访问 MongoDB
+    cache.collection.delete_many({})
+    assert cache.get("hot") == "v1"
+    cache.set("hot", "v2")
+    assert cache.get("hot") == "v2"
+
+
+def test_hot_keys_are_replicated_and_replicas_dropped_on_write(make_backend):
+    cache = make_backend(HOT_KEYS=True, HOT_KEY_MODE="replicate", HOT_KEY_SAMPLE_RATE=1, HOT_KEY_THRESHOLD=0.5,
+                         HOT_KEY_WINDOW=3600, HOT_KEY_REPLICAS=2)
+    cache.set("hot", "v1")
+    cache.set("hot#other", "x")
+    make_hot(cache, "hot")
+    cache._replicate("hot", 2, 30)
+    assert cache.collection.count_documents({"replica_of": "hot"}) == 2
+    assert {cache.get("hot") for _ in range(10)} == {"v1"}
+    assert sorted(cache.iter_keys()) == ["hot", "hot#other"]  # 副本不出现在遍历结果中
+
+    cache.set("hot", "v2")
+    assert cache.collection.count_documents({"replica_of": "hot"}) == 0
+    assert cache.get("hot#other") == "x"
+    assert cache.get("hot") == "v2"
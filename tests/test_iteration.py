@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+from bson import Binary
+
+
+def test_iter_keys_by_prefix_skips_chunks_and_expired_entries(make_backend):
+    cache = make_backend()
+    cache.set_many({"branch:1": "a", "branch:2": "b", "tag:1": "c"}, None)
+    cache.set("branch:3", "expired", 60)
+    cache.collection.update_one({"_id": "branch:3"}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+
+    assert sorted(cache.iter_keys()) == ["branch:1", "branch:2", "tag:1"]
+    assert sorted(cache.iter_keys("branch:")) == ["branch:1", "branch:2"]
+    assert sorted(cache.iter_items("branch:", batch_size=1)) == [("branch:1", "a"), ("branch:2", "b")]
+
+
+def test_iter_items_assembles_multi_chunk_values(make_backend):
+    cache = make_backend()
+    value = bytes(range(256)) * 4
+    for i in range(0, len(value), 100):
+        cache.collection.insert_one({"_id": f"big_chunk_{i // 100}", "value": Binary(value[i:i + 100]), "n": i // 100})
+    cache.collection.insert_one({"_id": "big", "length": len(value), "chunks": 11, "chunk_size": 100,
+                                 "encoding": "b", "expires_at": None})
+    cache.set("small", "s", None)
+    assert dict(cache.iter_items()) == {"big": value, "small": "s"}
+
+
+def test_parallel_scan_returns_every_key_once(make_backend):
+    cache = make_backend()
+    keys = [f"k{i}" for i in range(100)]
+    cache.set_many(dict.fromkeys(keys, 1), None)
+    assert sorted(cache.iter_keys(parallelism=4, batch_size=7)) == sorted(keys)
+
+
+def test_iter_items_reads_values_from_bucket_collections(make_backend):
+    cache = make_backend(BUCKET_HOURS=1)
+    cache.set("a", "bucketed", 3600)
+    cache.set("b", "x" * 100, 7200)
+    cache.set("c", "main", None)
+    assert sorted(cache.iter_items()) == [("a", "bucketed"), ("b", "x" * 100), ("c", "main")]
@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta
+
+from pymongo.errors import AutoReconnect, OperationFailure
+
+from mongo_cache.local_cache import ChangeStreamInvalidator, LocalMemoryCache
+
+
+def test_local_memory_cache_lru_and_sequence():
+    cache = LocalMemoryCache(max_entries=2, ttl=60, fallback_ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    sequence = cache.sequence
+    cache.delete("a")
+    cache.set("a", "stale", sequence=sequence)  # 读取期间发生失效，不放回旧值
+    assert cache.get("a") is None
+
+
+def test_local_memory_cache_respects_expires_at():
+    cache = LocalMemoryCache(ttl=60, fallback_ttl=60)
+    cache.set("expired", 1, datetime.utcnow() - timedelta(seconds=1))
+    assert cache.get("expired") is None
+    cache.set("live", 1, datetime.utcnow() + timedelta(seconds=30))
+    assert cache.get("live") == 1
+
+
+class FakeStream:
+    """按顺序返回事件；可调用对象在轮到时执行（模拟两次 try_next 之间发生的事），异常在轮到时抛出"""
+
+    def __init__(self, items):
+        self._items = list(items)
+        self.resume_token = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def try_next(self):
+        if not self._items:
+            return None
+        item = self._items.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        if callable(item):
+            item()
+            return None
+        self.resume_token = {"_data": item["documentKey"]["_id"]}
+        return item
+
+
+class FakeCollection:
+    def __init__(self, *streams):
+        self._streams = list(streams)
+        self.resume_tokens = []
+
+    def watch(self, pipeline, resume_after=None):
+        self.resume_tokens.append(resume_after)
+        return FakeStream(self._streams.pop(0))
+
+
+def change(operation, key):
+    return {"operationType": operation, "documentKey": {"_id": key}}
+
+
+def test_invalidator_evicts_changed_keys_and_resumes():
+    local_cache = LocalMemoryCache(ttl=60, fallback_ttl=60)
+    collection = FakeCollection()
+    invalidator = ChangeStreamInvalidator(collection, local_cache, retry_interval=0.01)
+    collection._streams = [
+        [lambda: [local_cache.set(key, 1) for key in "abc"], change("update", "a"), AutoReconnect("reset")],
+        [lambda: local_cache.set("d", 1), change("delete", "b"), invalidator.stop],
+    ]
+    invalidator._run()
+
+    assert collection.resume_tokens == [None, {"_data": "a"}]
+    assert [local_cache.get(key) for key in "abcd"] == [None, None, 1, 1]  # 续传成功时不清空 L1
+    assert local_cache.streaming
+
+
+def test_invalidator_clears_when_history_is_lost():
+    local_cache = LocalMemoryCache(ttl=60, fallback_ttl=60)
+    collection = FakeCollection()
+    invalidator = ChangeStreamInvalidator(collection, local_cache, retry_interval=0.01)
+    collection._streams = [
+        [change("update", "a"), lambda: local_cache.set("b", 1), OperationFailure("lost", code=286)],
+        [invalidator.stop],
+    ]
+    invalidator._run()
+
+    assert collection.resume_tokens == [None, None]
+    assert local_cache.get("b") is None  # 无法续传，期间的写入可能已错过
+
+
+def test_invalidator_gives_up_without_change_streams():
+    local_cache = LocalMemoryCache(ttl=60, fallback_ttl=5)
+    collection = FakeCollection([OperationFailure("not a replica set", code=40573)])
+    ChangeStreamInvalidator(collection, local_cache, retry_interval=0.01)._run()
+    assert collection.resume_tokens == [None]
+    assert not local_cache.streaming  # 退化为较短的 TTL
+
+
+def test_backend_serves_reads_from_l1_and_drops_local_writes(make_backend):
+    cache = make_backend(LOCAL_CACHE_MAX_ENTRIES=100)
+    cache.set("k", {"v": 1})
+    assert cache.get("k") == {"v": 1}
+    cache.collection.delete_many({})  # 其他进程的删除由 change stream 淘汰，这里直接绕过
+    assert cache.get("k") == {"v": 1}
+    cache.set("k", {"v": 2})
+    assert cache.get("k") == {"v": 2}
+    cache.delete("k")
+    assert cache.get("k") is None
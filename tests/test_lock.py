@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from mongo_cache import LockTimeout
+from mongo_cache.time_config import TimeConfig
+
+
+def test_lock_tokens_are_monotonic(make_backend):
+    cache = make_backend()
+    with cache.lock("L", blocking=False) as lock:
+        first = lock.token
+        with pytest.raises(LockTimeout):
+            cache.lock("L", blocking=False).acquire()
+        with pytest.raises(LockTimeout):
+            cache.lock("L", timeout=0.05).acquire()
+    with cache.lock("L", blocking=False) as lock:
+        assert lock.token == first + 1
+
+
+def test_expired_lease_is_taken_over(make_backend):
+    cache = make_backend()
+    stale = cache.lock("L", lease=TimeConfig(minutes=1))
+    stale.acquire()
+    cache.lock_collection.update_one({"_id": "L"}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+
+    with cache.lock("L", blocking=False) as lock:
+        assert lock.token == stale.token + 1
+        assert stale.release() is False  # 持有者已换人，过期的持有者不能释放
+        assert cache.lock_collection.find_one({"_id": "L"})["owner"] is not None
+
+
+def test_time_config_parses_strings():
+    assert TimeConfig.from_string("01:02:03").total_seconds() == 3723
+    assert str(TimeConfig(minutes=5)) == "00:05:00"
+    with pytest.raises(ValueError):
+        TimeConfig.from_string("5")
+
+
+def test_lock_collection_uses_lock_durability_profile(make_backend):
+    cache = make_backend(DURABILITY_DEFAULT="fast")  # 锁不受缓存默认档位影响
+    assert cache.lock_collection.write_concern.document == {"w": "majority", "j": True}
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+from pymongo.errors import AutoReconnect
+
+from mongo_cache import MongoDBCacheBackend
+from mongo_cache.namespaces import NamespaceVersions
+
+
+def test_namespace_versions_namespace_and_logical_key():
+    namespaces = NamespaceVersions(["repo:", "repo:admin:"])
+    assert namespaces.namespace("repo:42:branch:main") == "repo:42"
+    assert namespaces.namespace("repo:admin:x:y") == "repo:admin:x"
+    assert namespaces.namespace("repo:42") == "repo:42"
+    assert namespaces.namespace("other:1") is None
+    assert NamespaceVersions.logical("repo:42:branch@ns7") == "repo:42:branch"
+
+
+def test_namespace_invalidation_misses_only_that_namespace(make_backend):
+    cache = make_backend(NAMESPACES=["repo:"])
+    cache.set("repo:1:branch", "a")
+    cache.set("repo:2:branch", "b")
+    assert cache.collection.find_one({"_id": "repo:1:branch"}) is not None  # 从未失效的命名空间键不变
+    assert cache.invalidate_namespace("repo:1") == 1
+    assert cache.get("repo:1:branch") is None
+    assert cache.get("repo:2:branch") == "b"
+    assert list(cache.iter_keys()) == ["repo:2:branch"]
+
+    cache.set("repo:1:branch", "c")
+    assert cache.collection.find_one({"_id": "repo:1:branch@ns1"}) is not None
+    assert cache.get_many(["repo:1:branch", "repo:2:branch"]) == {"repo:1:branch": "c", "repo:2:branch": "b"}
+
+
+def test_other_processes_see_new_version_after_cache_ttl(make_backend):
+    cache = make_backend(NAMESPACES=["repo:"], NAMESPACE_CACHE_TTL=0)
+    cache.set("repo:1:x", "a")
+    namespaces = NamespaceVersions(["repo:"], cache_ttl=0)  # 另一进程的版本号缓存
+    namespaces.bump("repo:1", cache.namespace_collection)
+    assert cache.get("repo:1:x") is None
+
+
+def test_rules_match_on_logical_key(make_backend):
+    cache = make_backend(NAMESPACES=["repo:"], TTL_POLICIES={"repo:*:branch": 60})
+    cache.invalidate_namespace("repo:1")
+    cache.set("repo:1:branch", "c")
+    head = cache.collection.find_one({"_id": "repo:1:branch@ns1"})
+    assert head["expires_at"] is not None  # TTL 规则按去掉版本后缀的键匹配
+    assert head["expires_at"] - datetime.utcnow() <= timedelta(seconds=60)
+    assert cache.get("repo:1:branch") == "c"
+    assert list(cache.iter_keys()) == ["repo:1:branch"]  # 返回调用方使用的键，不带版本后缀
+    assert list(cache.iter_items(prefix="repo:1:")) == [("repo:1:branch", "c")]
+
+
+def test_rebuild_writes_versioned_keys(make_backend):
+    cache = make_backend(NAMESPACES=["repo:"], GENERATIONS=True, GENERATION_REFRESH=0)
+    cache.invalidate_namespace("repo:1")
+    with cache.rebuild() as rebuild:
+        rebuild.set_many({"repo:1:x": "a", "other": "b"})
+    assert cache.get_many(["repo:1:x", "other"]) == {"repo:1:x": "a", "other": "b"}
+    assert cache.collection.find_one({"_id": "repo:1:x@ns1"}) is not None
+
+
+class _Unreachable:
+    def __init__(self):
+        self.calls = 0
+
+    def find(self, *args, **kwargs):
+        self.calls += 1
+        raise AutoReconnect("down")
+
+    find_one = find
+
+
+def test_version_lookup_failure_reads_as_miss_and_trips_breaker(make_backend, monkeypatch):
+    cache = make_backend(NAMESPACES=["repo:"], NAMESPACE_CACHE_TTL=0, CIRCUIT_BREAKER_THRESHOLD=2,
+                         CIRCUIT_BREAKER_RESET=60)
+    cache.set("repo:1:x", "a")
+    unreachable = _Unreachable()
+    monkeypatch.setattr(MongoDBCacheBackend, "namespace_collection", property(lambda self: unreachable))
+    assert cache.get("repo:1:x", "default") == "default"
+    assert cache.get_many(["repo:1:x", "other"]) == {"repo:1:x": None, "other": None}
+    assert cache.get_view("repo:1:x") is None
+    assert unreachable.calls == 2  # 熔断后不再查询版本号
@@ -0,0 +1,142 @@
+import pytest
+from pymongo.errors import AutoReconnect
+
+from mongo_cache import MongoDBCacheBackend
+from mongo_cache.local_cache import ChangeStreamInvalidator
+from mongo_cache.negative_filter import NegativeLookupFilter, _BloomBits
+
+
+def test_bloom_bits_has_no_false_negatives():
+    bloom = _BloomBits(1000, 0.01)
+    keys = [f"key:{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"other:{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+    assert bloom.estimated_fp_rate() < 0.05
+
+
+def test_negative_filter_passes_everything_until_built():
+    negative_filter = NegativeLookupFilter(min_capacity=100)
+    assert negative_filter.might_contain("missing", "collection")
+    assert negative_filter.stats()["ready"] is False
+
+
+@pytest.fixture
+def filtered_backend(make_backend, monkeypatch):
+    monkeypatch.setattr(NegativeLookupFilter, "_run", lambda self: None)  # 只在测试中手动重建
+    cache = make_backend(NEGATIVE_FILTER=True, NEGATIVE_FILTER_MIN_CAPACITY=100)
+    cache.set("present", 1)
+    cache._negative_filter.attach(cache, cache.collection.name)
+    cache._negative_filter.rebuild()
+    return cache
+
+
+def test_known_absent_keys_skip_mongodb(filtered_backend, monkeypatch):
+    cache = filtered_backend
+    reads = []
+    read_value = MongoDBCacheBackend._read_value
+    monkeypatch.setattr(MongoDBCacheBackend, "_read_value",
+                        lambda self, key, *args, **kwargs: reads.append(key) or read_value(self, key, *args, **kwargs))
+
+    assert cache.get("absent") is None
+    assert cache.get_many(["absent", "present"]) == {"absent": None, "present": 1}
+    assert reads == ["present"]
+    assert cache._negative_filter.stats()["filtered"] == 2
+
+    cache.set("written", 2)  # 本进程写入的键立即加入过滤器
+    assert cache.get("written") == 2
+
+
+def test_filter_holds_versioned_namespace_keys(make_backend, monkeypatch):
+    monkeypatch.setattr(NegativeLookupFilter, "_run", lambda self: None)
+    cache = make_backend(NEGATIVE_FILTER=True, NEGATIVE_FILTER_MIN_CAPACITY=100, NAMESPACES=["repo:"])
+    cache.invalidate_namespace("repo:1")
+    cache.set("repo:1:x", "a")
+    cache._negative_filter.attach(cache, cache.collection.name)
+    cache._negative_filter._recent.clear()  # 只看扫描的结果
+    cache._negative_filter.rebuild()
+    assert cache.get("repo:1:x") == "a"
+
+
+def test_failed_generation_lookup_reads_as_miss(make_backend, monkeypatch):
+    monkeypatch.setattr(NegativeLookupFilter, "_run", lambda self: None)
+    cache = make_backend(NEGATIVE_FILTER=True, GENERATIONS=True, CIRCUIT_BREAKER_THRESHOLD=2, CIRCUIT_BREAKER_RESET=60)
+    cache.set("present", 1)
+    lookups = []
+
+    def unreachable(self, refresh=False):
+        lookups.append(refresh)
+        raise AutoReconnect("down")
+
+    monkeypatch.setattr(MongoDBCacheBackend, "_active_generation", unreachable)
+    assert cache.get("present", "default") == "default"
+    assert cache.get_many(["present"]) == {"present": None}
+    assert cache.get("present", "default") == "default"
+    assert len(lookups) == 2  # 熔断后不再查询当前代
+
+
+class _RecordingFilter:
+    def __init__(self):
+        self.added = []
+
+    def add(self, key):
+        self.added.append(key)
+
+
+def test_invalidator_adds_keys_written_by_other_processes():
+    class Stream:
+        resume_token = None
+        events = [{"operationType": "insert", "documentKey": {"_id": "new"}},
+                  {"operationType": "delete", "documentKey": {"_id": "gone"}}]
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            return False
+
+        def try_next(self):
+            if not self.events:
+                invalidator.stop()
+                return None
+            return self.events.pop(0)
+
+    class Collection:
+        def watch(self, pipeline, resume_after=None):
+            return Stream()
+
+    negative_filter = _RecordingFilter()
+    invalidator = ChangeStreamInvalidator(Collection(), None, negative_filter)
+    invalidator._run()
+    assert negative_filter.added == ["new"]  # 删除事件不加入
+
+
+def test_add_bypasses_stale_negative_filter(filtered_backend, make_backend):
+    cache = filtered_backend
+    other = make_backend()  # 另一个进程的写入，change stream 不可用时不会进入过滤器
+    other.set("k", 1)
+    assert cache.get("k") is None  # 过滤器过时，get 按未命中返回
+    assert cache.add("k", 2) is False
+    assert other.get("k") == 1
+    assert cache.get("k", durability="lock") == 1  # 读自己写入的档位不使用过滤器
+
+
+def test_rebuild_keeps_keys_written_during_the_scan(filtered_backend, monkeypatch):
+    cache = filtered_backend
+    negative_filter = cache._negative_filter
+    negative_filter.add("pending")  # 已加入过滤器，写入尚未落库
+    iter_head_batches = MongoDBCacheBackend._iter_head_batches
+
+    def scan_with_concurrent_write(self, *args, **kwargs):
+        yield from iter_head_batches(self, *args, **kwargs)
+        cache.set("during", 1)  # 扫描已经过了这个键的位置
+
+    monkeypatch.setattr(MongoDBCacheBackend, "_iter_head_batches", scan_with_concurrent_write)
+    negative_filter.rebuild()
+    name = cache.collection.name
+    assert negative_filter.might_contain("pending", name)
+    assert negative_filter.might_contain("during", name)
+    assert negative_filter.might_contain("present", name)
+    assert not negative_filter.might_contain("absent", name)
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+
+def test_pipeline_results_in_queue_order(make_backend):
+    cache = make_backend()
+    cache.set("old", "value")
+    with cache.pipeline() as pipeline:
+        pipeline.set("p", 1).incr("p").get("p").add("p", 5).add("q", 5).delete("old").get("missing")
+    assert pipeline.results == [True, 2, 2, False, True, True, None]
+    assert cache.get_many(["p", "q", "old"]) == {"p": 2, "q": 5, "old": None}
+
+
+def test_pipeline_touch_moves_expiry(make_backend):
+    cache = make_backend()
+    cache.set("k", "v", 60)
+    with cache.pipeline() as pipeline:
+        pipeline.touch("k", 7200).touch("missing", 60)
+    assert pipeline.results == [True, False]
+    head = cache.collection.find_one({"_id": "k"})
+    assert head["expires_at"] - datetime.utcnow() > timedelta(seconds=7000)
+
+
+def test_pipeline_is_not_executed_on_error(make_backend):
+    cache = make_backend()
+    try:
+        with cache.pipeline() as pipeline:
+            pipeline.set("k", 1)
+            raise ValueError
+    except ValueError:
+        pass
+    assert cache.get("k") is None
+
+
+def test_pipeline_writes_chunks_before_heads(make_backend, monkeypatch):
+    cache = make_backend(CHUNK_SIZE=100)
+    batches = []
+    bulk_write = mongomock.collection.Collection.bulk_write
+
+    def recording_bulk_write(self, requests, *args, **kwargs):
+        batches.append([request._filter["_id"] for request in requests])
+        return bulk_write(self, requests, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, "bulk_write", recording_bulk_write)
+    with cache.pipeline() as pipeline:
+        pipeline.set("big", "y" * 1000).set("small", 1)
+    assert pipeline.results == [True, True]
+    head_batch = next(batch for batch in batches if "big" in batch)
+    chunk_batch = next(batch for batch in batches if "big_chunk_0" in batch)
+    assert not any(_id.startswith("big_chunk_") for _id in head_batch)  # 无序写入中头文档单独一批
+    assert batches.index(chunk_batch) < batches.index(head_batch)
+    assert cache.get("big") == "y" * 1000
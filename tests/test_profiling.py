@@ -0,0 +1,80 @@
+import json
+import logging
+import time
+from itertools import count
+from types import SimpleNamespace
+
+from mongo_cache.profiling import CommandProfiler
+
+_request_ids = count()
+
+
+def run_command(profiler, name, command, reply, seconds=0.001, database="db"):
+    request_id = next(_request_ids)
+    profiler.started(SimpleNamespace(command_name=name, command=command, database_name=database,
+                                     connection_id=("host", 27017), request_id=request_id))
+    finished = SimpleNamespace(command_name=name, connection_id=("host", 27017), request_id=request_id,
+                               duration_micros=int(seconds * 1e6), reply=reply)
+    if reply is None:
+        profiler.failed(finished)
+    else:
+        profiler.succeeded(finished)
+
+
+def test_commands_are_aggregated_by_shape():
+    profiler = CommandProfiler(slow_threshold=1)
+    for key in ("a", "b"):
+        run_command(profiler, "find", {"find": "cache", "filter": {"_id": {"$in": [key, "x"]}}},
+                    {"cursor": {"firstBatch": [{"_id": key}]}, "ok": 1})
+    run_command(profiler, "delete", {"delete": "cache", "deletes": [{"q": {"_id": "a"}}, {"q": {"_id": "b"}}]},
+                {"n": 2, "ok": 1})
+    run_command(profiler, "find", {"find": "cache", "filter": {"_id": "a"}}, None)
+    run_command(profiler, "hello", {"hello": 1}, {"ok": 1})
+
+    stats = profiler.stats()
+    find_in = stats[("find", "db.cache", json.dumps({"_id": {"$in": ["?"]}}))]
+    assert (find_in["count"], find_in["failures"], find_in["docs_returned"]) == (2, 0, 2)
+    assert find_in["reply_bytes"] > 0
+    assert stats[("delete", "db.cache", json.dumps({"_id": "?"}))]["docs_returned"] == 2
+    assert stats[("find", "db.cache", json.dumps({"_id": "?"}))]["failures"] == 1
+    assert len(stats) == 3  # 握手等命令不统计
+
+    profiler.reset()
+    assert profiler.stats() == {}
+
+
+class _Client:
+    def __init__(self):
+        self.commands = []
+
+    def __getitem__(self, database):
+        return SimpleNamespace(command=self._command)
+
+    def _command(self, command):
+        self.commands.append(command)
+        return {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}},
+                "executionStats": {"totalDocsExamined": 1, "totalKeysExamined": 1, "nReturned": 1}}
+
+
+def test_slow_commands_are_explained_in_the_background(caplog):
+    caplog.set_level(logging.INFO, logger="mongo_cache.profiling")
+    profiler = CommandProfiler(slow_threshold=0.01, explain_sample_rate=1, explain_interval=300)
+    client = _Client()
+    profiler.bind(client)
+    command = {"find": "cache", "filter": {"_id": "a"}, "lsid": {"id": 1}, "$db": "db"}
+    run_command(profiler, "find", command, {"cursor": {"firstBatch": []}, "ok": 1}, seconds=0.5)
+    run_command(profiler, "find", command, {"cursor": {"firstBatch": []}, "ok": 1}, seconds=0.5)
+    run_command(profiler, "find", {"find": "cache", "filter": {"x": 1}}, {"cursor": {"firstBatch": []}, "ok": 1})
+
+    key = ("find", "db.cache", json.dumps({"_id": "?"}))
+    deadline = time.monotonic() + 2
+    while profiler.stats()[key]["explain"] is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert profiler.stats()[key]["explain"] == {"plan": "FETCH <- IXSCAN", "docs_examined": 1,
+                                                "keys_examined": 1, "returned": 1}
+    assert len(client.commands) == 1  # 同一形状在 explain_interval 内只 explain 一次，快命令不 explain
+    assert client.commands[0]["explain"] == {"find": "cache", "filter": {"_id": "a"}}
+    while len(caplog.records) < 3 and time.monotonic() < deadline:  # explain 结果在写入统计之后才记日志
+        time.sleep(0.01)
+    levels = [(record.levelno, record.getMessage().split()[0]) for record in caplog.records]
+    assert levels == [(logging.WARNING, "Slow"), (logging.WARNING, "Slow"), (logging.INFO, "Explain")]
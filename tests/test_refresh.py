@@ -0,0 +1,42 @@
+import threading
+from datetime import datetime, timedelta
+
+from mongo_cache import RefreshScheduler
+from mongo_cache.time_config import TimeConfig
+
+
+def test_scheduler_refreshes_only_keys_read_since_last_write(make_backend):
+    cache = make_backend()
+    calls = []
+    refreshed = threading.Event()
+
+    def load(keys):
+        calls.append(sorted(keys))
+        refreshed.set()
+        return {key: {"v": "new"} for key in keys}
+
+    scheduler = RefreshScheduler(cache, lead_time=TimeConfig(seconds=59))
+    scheduler.register_loader("branch:", load)
+    scheduler.start()
+    try:
+        cache.set_many({"branch:1": {"v": "old"}, "branch:2": {"v": "old"}, "other": {"v": "old"}}, 60)
+        assert cache.get("branch:1") == {"v": "old"}
+        assert refreshed.wait(5)
+        assert calls == [["branch:1"]]  # branch:2 无人读取，任其过期
+        assert cache.get("branch:1") == {"v": "new"}
+    finally:
+        scheduler.stop()
+    assert cache.refresh_scheduler is None
+
+
+def test_rescheduled_key_is_refreshed_once_at_its_new_time(make_backend):
+    scheduler = RefreshScheduler(make_backend(), lead_time=TimeConfig(seconds=10))
+    scheduler.register_loader("a", lambda keys: {})
+    now = datetime.utcnow()
+    scheduler.schedule("a", now + timedelta(seconds=10))
+    scheduler.schedule("a", now + timedelta(seconds=9))
+    scheduler.schedule("unregistered", now)
+    scheduler.mark_read("a")
+    scheduler.mark_read("unregistered")
+    assert scheduler._pop_due() == ["a"]
+    assert scheduler._heap == [] and scheduler._scheduled == {}  # 重新调度前的旧条目弹出时丢弃
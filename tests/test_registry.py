@@ -0,0 +1,15 @@
+from mongo_cache.registry import ProcessShared
+
+
+def test_process_shared_registry_is_per_subclass():
+    class First(ProcessShared):
+        def __init__(self, value=None):
+            self.value = value
+
+    class Second(ProcessShared):
+        pass
+
+    assert First.for_backend("x", value=1) is First.for_backend("x", value=2)
+    assert First.for_backend("x").value == 1
+    assert "x" not in Second._instances
+    assert First._instances is not ProcessShared._instances
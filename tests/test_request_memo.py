@@ -0,0 +1,90 @@
+import asyncio
+import uuid
+
+import pytest
+from django.test import override_settings
+
+from mongo_cache import MongoDBCacheBackend, request_memo, request_memo_middleware
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """记录实际访问 MongoDB 的键"""
+    keys = []
+    read_value = MongoDBCacheBackend._read_value
+
+    def recording(self, key, *args, **kwargs):
+        keys.append(key)
+        return read_value(self, key, *args, **kwargs)
+
+    monkeypatch.setattr(MongoDBCacheBackend, "_read_value", recording)
+    return keys
+
+
+def test_reads_are_memoized_within_scope(make_backend, reads):
+    cache = make_backend()
+    cache.set("a", "1")
+    with request_memo():
+        assert cache.get("a") == "1"
+        assert cache.get("a") == "1"
+        assert cache.get("missing") is None
+        assert cache.get("missing") is None  # 未命中同样记住
+        assert cache.get_many(["a", "b", "missing"]) == {"a": "1", "b": None, "missing": None}
+    assert reads == ["a", "missing", "b"]
+
+    assert cache.get("a") == "1"  # 作用域结束即丢弃
+    assert reads[-1] == "a"
+
+
+def test_local_writes_evict_memo(make_backend, reads):
+    cache = make_backend()
+    cache.set("a", "1")
+    with request_memo():
+        assert cache.get("a") == "1"
+        cache.set("a", "2")
+        assert cache.get("a") == "2"
+        cache.delete("a")
+        assert cache.get("a") is None
+    assert reads == ["a", "a", "a"]
+
+
+def test_prefetch_only_within_scope(make_backend, reads):
+    cache = make_backend()
+    cache.set_many({"a": "1", "b": "2"})
+    assert cache.prefetch(["a", "b"]) == 0
+    assert reads == []
+    with request_memo():
+        assert cache.prefetch(["a", "b", "c"]) == 2
+        assert cache.get_many(["a", "b", "c"]) == {"a": "1", "b": "2", "c": None}
+    assert reads == ["a", "b", "c"]
+
+
+@pytest.fixture
+def prefetch_settings(client):
+    caches = {"default": {
+        "BACKEND": "mongo_cache.MongoDBCacheBackend",
+        "LOCATION": "mongodb://localhost",
+        "options": {"COLLECTION_NAME": f"cache_{uuid.uuid4().hex}", "REQUEST_PREFETCH": ["a", "b"]},
+    }}
+    with override_settings(CACHES=caches):
+        from django.core.cache import caches
+        caches["default"].set("a", "1")
+        yield caches["default"]
+
+
+def test_middleware_prefetches_for_sync_views(prefetch_settings, reads):
+    cache = prefetch_settings
+
+    def view(request):
+        return cache.get("a"), cache.get("b"), len(reads)
+
+    assert request_memo_middleware(view)(object()) == ("1", None, 2)
+
+
+def test_middleware_prefetches_for_async_views(prefetch_settings, reads):
+    cache = prefetch_settings
+
+    async def view(request):
+        return cache.get("a"), cache.get("b"), len(reads)
+
+    assert asyncio.run(request_memo_middleware(view)(object())) == ("1", None, 2)
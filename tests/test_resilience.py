@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+from pymongo import ReadPreference
+from pymongo.errors import AutoReconnect
+
+import mongo_cache.factory
+from mongo_cache import MongoDBCacheBackend, MongoDBConnectionFactory
+from mongo_cache.resilience import CircuitBreaker, LatencyTracker
+
+
+def test_circuit_breaker_opens_and_probes_once():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()  # 半开，放行一个探测请求
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.allow()
+
+
+def test_circuit_breaker_release_frees_unfinished_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+
+    other = []
+    thread = threading.Thread(target=breaker.release)  # 其他线程不能释放本线程的探测名额
+    thread.start()
+    thread.join()
+    thread = threading.Thread(target=lambda: other.append(breaker.allow()))
+    thread.start()
+    thread.join()
+    assert other == [False]
+
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_latency_tracker_percentile():
+    tracker = LatencyTracker(window=100, refresh_every=10, min_samples=10)
+    for i in range(9):
+        tracker.record(i / 100)
+    assert tracker.percentile(0.5) is None
+    for i in range(9, 100):
+        tracker.record(i / 100)
+    assert tracker.percentile(0.95) == pytest.approx(0.95)
+
+
+def test_hedged_read_takes_the_first_result(make_backend):
+    cache = make_backend(HEDGED_READS=True, HEDGE_DELAY=0.02)
+    reads = []
+
+    def read(collection):
+        reads.append(collection.read_preference)
+        if collection.read_preference == ReadPreference.PRIMARY:
+            time.sleep(0.3)
+            return "primary"
+        return "secondary"
+
+    assert cache._hedged_read(read) == "secondary"
+    assert reads == [ReadPreference.PRIMARY, ReadPreference.SECONDARY_PREFERRED]
+
+    reads.clear()
+    assert cache._hedged_read(lambda collection: reads.append(1) or "primary") == "primary"
+    assert reads == [1]  # 主读在延迟内完成，不发对冲读
+
+
+def test_hedged_read_raises_only_when_both_reads_fail(make_backend):
+    cache = make_backend(HEDGED_READS=True, HEDGE_DELAY=0.01)
+
+    def read(collection):
+        time.sleep(0.05)
+        raise AutoReconnect("down")
+
+    with pytest.raises(AutoReconnect):
+        cache._hedged_read(read)
+
+
+def test_open_breaker_answers_reads_as_misses(make_backend, monkeypatch):
+    calls = []
+
+    def failing_read(self, *args, **kwargs):
+        calls.append(1)
+        raise AutoReconnect("down")
+
+    monkeypatch.setattr(MongoDBCacheBackend, "_read_value", failing_read)
+    cache = make_backend(CIRCUIT_BREAKER_THRESHOLD=2, CIRCUIT_BREAKER_RESET=60)
+    assert [cache.get("k", "default") for _ in range(4)] == ["default"] * 4
+    assert len(calls) == 2  # 熔断后不再访问 MongoDB
+
+
+def test_client_kwargs_override_pool_defaults(monkeypatch):
+    created = []
+
+    class _Client:
+        def __init__(self, uri, **kwargs):
+            created.append(kwargs)
+            self.admin = self
+
+        def command(self, name):
+            return {"ok": 1}
+
+    monkeypatch.setattr(mongo_cache.factory, "MongoClient", _Client)
+    monkeypatch.setattr(MongoDBConnectionFactory, "_pools", {})
+    factory = MongoDBConnectionFactory({"CLIENT_KWARGS": {"connectTimeoutMS": 5000, "READ_TIMEOUT": 0.5}})
+    factory.connect("mongodb://localhost")
+    assert created[0]["connectTimeoutMS"] == 5000  # 透传的参数优先于默认值
+    assert created[0]["serverSelectionTimeoutMS"] == 1000
+    assert "socketTimeoutMS" not in created[0]  # 读取预算只作用于读路径，不限制连接池上的写入
+    assert factory.read_timeout == 0.5
@@ -0,0 +1,81 @@
+import pickle
+
+import pytest
+from bson import BSON, Binary
+
+from mongo_cache.serializers import FastSerializer, JSONSerializer
+
+
+@pytest.mark.parametrize("value, code", [
+    (b"raw", FastSerializer.BYTES),
+    ("文本", FastSerializer.STR),
+    (-42, FastSerializer.INT),
+    (2 ** 70, FastSerializer.PICKLE),
+    (True, FastSerializer.PICKLE),
+    ({"a": [1, 2]}, FastSerializer.PICKLE),
+    (bytearray(b"x" * 1024), FastSerializer.PICKLE),
+])
+def test_fast_serializer_round_trip(value, code):
+    serializer = FastSerializer()
+    encoding, payload = serializer.dumps(value)
+    assert encoding == code
+    loaded = serializer.loads(encoding, payload)
+    assert loaded == value
+    assert type(loaded) is type(value)
+
+
+class _Buffered:
+    """按 pickle 协议 5 通过 PickleBuffer 导出缓冲区，与 numpy 数组相同"""
+
+    def __init__(self, data):
+        self.data = bytearray(data)
+
+    def __reduce_ex__(self, protocol):
+        return type(self)._rebuild, (pickle.PickleBuffer(self.data),)
+
+    @classmethod
+    def _rebuild(cls, buffer):
+        return cls(buffer)
+
+
+def test_fast_serializer_keeps_large_buffers_out_of_band():
+    serializer = FastSerializer()
+    value = [_Buffered(b"a" * 100), _Buffered(b"b" * 10)]
+    encoding, payload = serializer.dumps(value)
+    assert encoding == FastSerializer.PICKLE_OOB
+    assert payload.count(b"a" * 100) == 1
+    assert [item.data for item in serializer.loads(encoding, payload)] == [b"a" * 100, b"b" * 10]
+
+
+def test_fast_serializer_reads_legacy_encodings():
+    serializer = FastSerializer()
+    assert serializer.loads("raw", b"abc") == b"abc"
+    with pytest.raises(ValueError):
+        serializer.loads("unknown", b"")
+
+
+def test_json_serializer_encodes_objects_as_json():
+    serializer = JSONSerializer()
+    encoding, payload = serializer.dumps({"a": 1})
+    assert encoding == JSONSerializer.JSON
+    assert payload == b'{"a":1}'
+    assert serializer.loads(encoding, payload) == {"a": 1}
+    assert serializer.dumps("s") == (JSONSerializer.STR, b"s")
+
+
+@pytest.mark.parametrize("serializer", ["fast", "json"])
+def test_backend_round_trip_with_serializer(make_backend, serializer):
+    cache = make_backend(SERIALIZER=serializer)
+    values = {"str": "文本", "int": 7, "dict": {"a": [1, 2]}}
+    cache.set_many(values)
+    assert cache.get_many(list(values)) == values
+    assert cache.collection.find_one({"_id": "str"})["encoding"] == FastSerializer.STR
+
+
+def test_backend_reads_entries_written_before_serializers(make_backend):
+    cache = make_backend()
+    payload = BSON.encode({"a": 1})
+    cache.collection.insert_one({"_id": "old_chunk_0", "value": Binary(payload), "n": 0})
+    cache.collection.insert_one({"_id": "old", "length": len(payload), "chunks": 1, "chunk_size": len(payload),
+                                 "encoding": "bson", "expires_at": None})
+    assert cache.get("old") == {"a": 1}
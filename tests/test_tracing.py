@@ -0,0 +1,48 @@
+from mongo_cache import replay_trace
+from mongo_cache.tracing import TraceRecorder
+
+
+def test_recorder_samples_by_key_hash(tmp_path):
+    path = str(tmp_path / "trace")
+    everything = TraceRecorder(path, sample_rate=1, flush_interval=3600)
+    everything.record(TraceRecorder.SET, "a", 10)
+    everything.record(TraceRecorder.GET, "a", 10)
+    TraceRecorder(path, sample_rate=0, flush_interval=3600).record(TraceRecorder.GET, "b", 1)
+    everything.flush()
+
+    records = list(TraceRecorder.read(path))
+    assert [(op, key_hash, size) for _, op, key_hash, size in records] == [
+        (TraceRecorder.SET, TraceRecorder.hash_key("a"), 10), (TraceRecorder.GET, TraceRecorder.hash_key("a"), 10)]
+
+    with open(path, "ab") as f:
+        f.write(b"\0" * 5)  # 另一个进程写到一半的记录
+    assert len(list(TraceRecorder.read(path))) == 2
+
+
+def test_backend_records_accesses(make_backend, tmp_path):
+    path = str(tmp_path / "trace")
+    cache = make_backend(TRACE_FILE=path, TRACE_SAMPLE_RATE=1)
+    cache.set("k", b"12345")
+    cache.get("k")
+    cache.get("missing")
+    cache.delete("k")
+    cache._tracer.flush()
+    assert [(op, size) for _, op, _, size in TraceRecorder.read(path)] == [
+        (TraceRecorder.SET, 5), (TraceRecorder.GET, 5), (TraceRecorder.GET, 0), (TraceRecorder.DELETE, 0)]
+
+
+def test_replay_drives_backend_and_reports_hit_rate(make_backend, tmp_path):
+    path = str(tmp_path / "trace")
+    recorder = TraceRecorder(path, sample_rate=1, flush_interval=3600)
+    for op, key, size in [(TraceRecorder.GET, "warm", 100), (TraceRecorder.GET, "cold", 0),
+                          (TraceRecorder.SET, "cold", 10), (TraceRecorder.GET, "cold", 10),
+                          (TraceRecorder.DELETE, "warm", 0), (TraceRecorder.GET, "warm", 0)]:
+        recorder.record(op, key, size)
+    recorder.flush()
+
+    cache = make_backend()
+    report = replay_trace(cache, path, speed=None, workers=2)
+    assert report["operations"] == 6
+    assert report["errors"] == 0
+    assert report["hit_rate"] == 0.5  # warm 由 prefill 预先写入，cold 写入后命中，删除后未命中
+    assert report["latency"]["g"]["count"] == 4
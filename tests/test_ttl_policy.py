@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from mongo_cache.ttl_policy import TTLPolicy
+
+
+def test_ttl_policy_prefers_exact_then_longest_prefix_then_glob():
+    policy = TTLPolicy({
+        "session": 10,
+        "lock:*": "00:01:00",
+        "lock:branch:*": 30,
+        "*:tmp": 5,
+    })
+    assert policy.resolve("session") == 10
+    assert policy.resolve("lock:x") == 60
+    assert policy.resolve("lock:branch:main") == 30
+    assert policy.resolve("a:tmp") == 5
+    assert policy.resolve("other") is None
+
+
+def test_ttl_policy_prefers_the_most_specific_pattern():
+    assert TTLPolicy({"*": 60, "branch:*:meta": 10}).resolve("branch:1:meta") == 10
+    policy = TTLPolicy({"*:meta": 20, "branch:*:meta": 10, "branch:main:*": 5, "b*": 1})
+    assert policy.resolve("branch:1:meta") == 10
+    assert policy.resolve("branch:main:meta") == 5  # 字面一样长（12）时前缀优先
+    assert policy.resolve("tag:meta") == 20
+    assert policy.resolve("b") == 1
+
+
+def test_backend_applies_policy_when_no_timeout_is_given(make_backend):
+    cache = make_backend(TTL_POLICIES={"short:*": 60})
+    cache.set("short:1", b"v")
+    cache.set("short:2", b"v", 3600)  # 显式传入的 timeout 优先
+    cache.set("other", b"v")
+    heads = {head["_id"]: head["expires_at"] for head in cache.collection.find({"_id": {"$not": {"$regex": "_chunk_"}}})}
+    now = datetime.utcnow()
+    assert timedelta(seconds=50) < heads["short:1"] - now <= timedelta(seconds=60)
+    assert heads["short:2"] - now > timedelta(seconds=3000)
+    assert timedelta(seconds=250) < heads["other"] - now <= timedelta(seconds=300)  # Django 默认 300 秒
+
+
+def test_malformed_ttl_string_is_rejected():
+    with pytest.raises(ValueError):
+        TTLPolicy({"a:*": "soon"})
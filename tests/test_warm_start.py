@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from mongo_cache.local_cache import LocalMemoryCache
+from mongo_cache.warm_start import WarmStartSnapshot
+
+
+def test_warm_start_snapshot_round_trip(tmp_path):
+    local_cache = LocalMemoryCache(ttl=60, fallback_ttl=60)
+    expires_at = datetime.utcnow() + timedelta(minutes=5)
+    local_cache.set("a", (b"1", "b"), expires_at)
+    local_cache.set("b", (b"2", "s"), None)
+    path = str(tmp_path / "snapshot")
+    snapshot = WarmStartSnapshot(path, local_cache, values=True)
+    assert snapshot.save() == 0  # 预热完成前不写快照
+    snapshot._loaded.set()
+    assert snapshot.save() == 2
+
+    entries = {key: (value, at) for key, value, at in snapshot.read()}
+    assert entries["b"] == ((b"2", "s"), None)
+    assert entries["a"][0] == (b"1", "b")
+    assert abs(entries["a"][1] - expires_at) < timedelta(milliseconds=1)
+
+
+def test_warm_start_snapshot_ignores_corrupt_file(tmp_path):
+    path = tmp_path / "snapshot"
+    path.write_bytes(b"MCWS" + b"\0" * 8 + b"\1\0")
+    assert WarmStartSnapshot(str(path), LocalMemoryCache()).read() == []
+
+
+def test_warm_start_requires_local_cache(make_backend, tmp_path):
+    with pytest.raises(RuntimeError):
+        make_backend(WARM_START_FILE=str(tmp_path / "snapshot"))
+
+
+def test_warm_start_loads_only_entries_still_in_mongodb(make_backend, tmp_path):
+    cache = make_backend(LOCAL_CACHE_MAX_ENTRIES=100, WARM_START_FILE=str(tmp_path / "snapshot"),
+                         WARM_START_VALUES=True, WARM_START_INTERVAL=3600)
+    snapshot = cache._warm_start
+    assert snapshot._loaded.wait(5)
+    cache.set("a", "1", 60)
+    cache.set("b", "2", 60)
+    cache.set("c", "3", None)
+    assert cache.get_many(["a", "b", "c"]) == {"a": "1", "b": "2", "c": "3"}  # 读取后进入 L1
+    assert snapshot.save() == 3
+
+    # 快照之后 a（带过期时间，按头文档校验）和 c（永不过期，重新读取）被其他进程删除
+    cache.collection.delete_many({"_id": {"$in": ["a", "c"]}})
+    cache._l1.clear()
+    assert snapshot.load() == 1
+    assert cache._l1.get("b") is not None
+    assert cache._l1.get("a") is None
+    assert cache._l1.get("c") is None